@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The offline analysis of the captured locking_state of o2locktop
+A capture is a directory that has a sub directory of the dumps of every node,
+the dumps are the timestamped copies of the locking_state, and may be gzipped:
+
+    CAPTURE/node1/locking_state.20190101-080000
+    CAPTURE/node1/locking_state.20190101-080005.gz
+    CAPTURE/node2/locking_state.1546300800
+    ...
+
+The time of a dump is in its name, as "YYYYmmdd-HHMMSS", "YYYY-mm-dd_HH:MM:SS"
+or the seconds since the epoch, else it is the modification time of the file.
+The dumps are parsed by the parse processes on all the cores, and pushed to
+the Node(s) of an offline LockSpace in the order of time. The dumps are split
+to rounds, a round ends once a node has a dump again, so a round is an interval
+that pairs the consecutive dumps of every node, and it is reported the same as
+the LockSpace does. The ranking of the whole capture sums the deltas of every
+interval. A lock is hanged if it waits longer than the spacing between the dump
+and the previous dump of the node, so it was not granted in the interval, the
+live -i is not used
+"""
+import array
+import collections
+import datetime
+import gzip
+import heapq
+import math
+import multiprocessing
+import os
+import re
+import time
+from o2locktoplib import config
+from o2locktoplib import dlm
+from o2locktoplib import report
+from o2locktoplib import util
+try:
+    # numpy is optional, it is used to sum the deltas of all the locks at once
+    import numpy
+except ImportError:
+    numpy = None
+
+# The time in the name of a dump, YYYYmmdd-HHMMSS and the likes
+DATE_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[-_T. ]?(\d{2})[:-]?(\d{2})[:-]?(\d{2})")
+# The seconds since the epoch in the name of a dump
+EPOCH_PATTERN = re.compile(r"(?<!\d)\d{10}(\.\d+)?(?!\d)")
+# The dumps that are parsed ahead of the LockSpace for every parse process,
+# the parsed dumps wait in the memory
+PARSE_AHEAD = 2
+LEVELS = (dlm.LOCK_LEVEL_EX, dlm.LOCK_LEVEL_PR)
+
+
+def dump_time(path):
+    """
+    Return the time(seconds since the epoch) of the dump, see the module
+    """
+    name = os.path.basename(path)
+    match = DATE_PATTERN.search(name)
+    if match:
+        try:
+            return time.mktime(datetime.datetime(*[int(i) for i in match.groups()]).timetuple())
+        except ValueError:
+            pass
+    match = EPOCH_PATTERN.search(name)
+    if match:
+        return float(match.group(0))
+    return os.path.getmtime(path)
+
+
+def find_dumps(directory):
+    """
+    Return {node name: [(time, path)]} of the dumps of the capture in the order
+    of time, the directory that has no sub directory is the dumps of one node
+    Raises ValueError if there is no dump
+    """
+    if not os.path.isdir(directory):
+        raise ValueError("{0} is not a directory".format(directory))
+    entries = sorted(i for i in os.listdir(directory) if not i.startswith('.'))
+    node_dirs = [(i, os.path.join(directory, i)) for i in entries
+                 if os.path.isdir(os.path.join(directory, i))]
+    if not node_dirs:
+        node_dirs = [(os.path.basename(os.path.abspath(directory)), directory)]
+    dumps = {}
+    for node_name, node_dir in node_dirs:
+        paths = [os.path.join(node_dir, i) for i in os.listdir(node_dir) if not i.startswith('.')]
+        paths = [i for i in paths if os.path.isfile(i)]
+        if paths:
+            dumps[node_name] = sorted((dump_time(i), i) for i in paths)
+    if not dumps:
+        raise ValueError("{0} has no dump of the locking_state".format(directory))
+    return dumps
+
+
+def split_rounds(dumps):
+    """
+    Return the rounds of the dumps in the order of time, a round is the list of
+    (node name, time, path), it ends once a node has a dump again
+    Parameters:
+        dumps(dict): The result of find_dumps
+    """
+    merged = sorted((when, node_name, path)
+                    for node_name, node_dumps in dumps.items()
+                    for when, path in node_dumps)
+    rounds = []
+    current = []
+    for when, node_name, path in merged:
+        if any(i[0] == node_name for i in current):
+            rounds.append(current)
+            current = []
+        current.append((node_name, when, path))
+    if current:
+        rounds.append(current)
+    return rounds
+
+
+def min_hang_times(dumps):
+    """
+    Return {path: seconds} of the dumps, the lock of the dump is hanged if it
+    waits longer than the seconds since the previous dump of the node, but not
+    shorter than config.MIN_HANG_TIME, the first dump of a node uses the
+    spacing to the next one
+    Parameters:
+        dumps(dict): The result of find_dumps
+    """
+    ret = {}
+    for node_dumps in dumps.values():
+        times = [i[0] for i in node_dumps]
+        gaps = [j - i for i, j in zip(times, times[1:])]
+        gaps = gaps[:1] + gaps if gaps else [config.INTERVAL]
+        for (_, path), gap in zip(node_dumps, gaps):
+            ret[path] = max(gap, config.MIN_HANG_TIME)
+    return ret
+
+
+def read_dump(path):
+    """
+    Return the bytes of the dump, the gzipped dump is decompressed
+    """
+    if path.endswith(".gz"):
+        filp = gzip.open(path, 'rb')
+    else:
+        filp = open(path, 'rb')
+    try:
+        return filp.read()
+    finally:
+        filp.close()
+
+
+def parse_dump(dump):
+    """
+    Parse the dump in the parse process, the hang time is judged by the time
+    of the dump, see dlm.parse_chunk
+    Parameters:
+        dump(tuple): (path, time, min hang time) of the dump, see min_hang_times
+    """
+    path, time_stamp, min_hang_time = dump
+    return dlm.parse_chunk(read_dump(path), time_stamp, min_hang_time)
+
+
+def _imap(pool, func, items, ahead):
+    """
+    Yield func(item) of the items in the order, at most ahead items are
+    computed in the pool ahead of the caller, None means no pool
+    """
+    if pool is None:
+        for item in items:
+            yield func(item)
+        return
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (item,)))
+    while pending:
+        yield pending.popleft().get()
+
+
+class CaptureRanking(object):
+    """
+    The sums of the deltas of every Lock in the intervals of the capture, the
+    columns of a node are indexed by the lock ids of its ShotTable
+    """
+    def __init__(self):
+        # {Node: {lock level: (total time, total num, max hang key index)}}
+        self._totals = {}
+
+    def add(self, node):
+        """
+        Add the deltas of the latest sample of the node, it must be called
+        after every sample of the node
+        """
+        table = node.shot_table
+        totals = self._totals.get(node)
+        if totals is None:
+            totals = dict((level, tuple(array.array('d') for _ in range(3))) for level in LEVELS)
+            self._totals[node] = totals
+        for columns in totals.values():
+            for column in columns:
+                column.extend([0] * (len(table) - len(column)))
+        if table.deltas is not None:
+            # the deltas are computed by numpy, see ShotTable.compute_deltas
+            for level, columns in totals.items():
+                delta_time, delta_num, key_index = [numpy.frombuffer(i, dtype=numpy.float64)
+                                                    for i in table.deltas[level]]
+                total_time, total_num, hang = [numpy.frombuffer(i, dtype=numpy.float64)
+                                               for i in columns]
+                hanged = numpy.isinf(delta_time)
+                total_time += numpy.where(hanged, 0, delta_time)
+                total_num += delta_num
+                numpy.maximum(hang, numpy.where(hanged, key_index, 0), out=hang)
+            return
+        for lock in node.locks.values():
+            if not lock.has_delta():
+                continue
+            lock_id = lock.lock_id
+            for level, (total_time, total_num, hang) in totals.items():
+                delta_time, delta_num, key_index = lock.get_lock_level_info(level)
+                if math.isinf(delta_time):
+                    hang[lock_id] = max(hang[lock_id], key_index)
+                else:
+                    total_time[lock_id] += delta_time
+                total_num[lock_id] += delta_num
+
+    def _node_values(self, node, lock_id):
+        """
+        Return the report.VALUES of the lock on the node in the capture
+        """
+        values = []
+        for level in LEVELS:
+            total_time, total_num, hang = [i[lock_id] for i in self._totals[node][level]]
+            if hang:
+                values.extend((total_num, float('inf'), hang))
+            else:
+                values.extend((total_num, total_time,
+                               total_time//total_num if total_num else 0))
+        return tuple(values)
+
+    def report_record(self, top_n, time_stamp, debug=False, max_sys_inode_num=0):
+        """
+        Return the record of the top n lock resources of the whole capture, the
+        lock resources are ranked by the same key index as the intervals, the
+        sum of the average wait times on every node, see LockSet.get_key_index
+        Parameters:
+            time_stamp(str): The time of the record, the range of the capture
+        """
+        # {LockName: [(node name, values)]}
+        lock_sets = {}
+        for node in self._totals:
+            node_name = node.name if node.name else util.get_hostname()
+            for lock_name, lock in node.locks.items():
+                if not debug and lock_name.inode_num <= max_sys_inode_num:
+                    continue
+                values = self._node_values(node, lock.lock_id)
+                if values[0] or values[3] or math.isinf(values[1]) or math.isinf(values[4]):
+                    lock_sets.setdefault(lock_name, []).append((node_name, values))
+
+        def key_index(item):
+            return sum((values[2] + values[5]) / 2 for _, values in item[1])
+
+        top = heapq.nlargest(top_n, lock_sets.items(), key=key_index)
+        lock_types = {}
+        for lock_name in lock_sets:
+            lock_types[lock_name.lock_type] = lock_types.get(lock_name.lock_type, 0) + 1
+        record = report.new_record(time_stamp, False,
+                                   (sum(sum(v[0] for _, v in i[1]) for i in top),
+                                    sum(sum(v[3] for _, v in i[1]) for i in top)),
+                                   sorted(lock_types.items(), key=lambda x: x[1], reverse=True),
+                                   [])
+        for lock_name, nodes in top:
+            values = []
+            for level in range(len(LEVELS)):
+                total_num = sum(v[level*3] for _, v in nodes)
+                total_time = sum(v[level*3 + 1] for _, v in nodes)
+                if math.isinf(total_time):
+                    # the longest hang time, as LockSet.report_values
+                    avg = max(v[level*3 + 2] for _, v in nodes if math.isinf(v[level*3 + 1]))
+                else:
+                    avg = total_time//total_num if total_num else 0
+                values.extend((total_num, total_time, avg))
+            report.append_lock_set(record, lock_name.short_name, tuple(values), nodes)
+        return record
+
+
+def analyze(directory, out, top_n=10, debug=False, processes=0):
+    """
+    Analyze the capture, write the reports of every interval and the ranking of
+    the whole capture to out
+    Parameters:
+        directory(str): The directory of the capture, see the module
+        out(file): The file that the reports are written to
+        top_n(int): The count of the lock resources in a report
+        processes(int): The count of the parse processes, 0 means the cores,
+                        None means parsing in this process
+    Returns:
+        int: The count of the intervals
+    """
+    dumps = find_dumps(directory)
+    rounds = split_rounds(dumps)
+    hang_times = min_hang_times(dumps)
+    name = os.path.basename(os.path.abspath(directory))
+    # the system inodes are unknown without the file system
+    lock_space = dlm.LockSpace(sorted(dumps), name, 0, debug, display_len=top_n, offline=True)
+    nodes = dict((node.name, node) for node in lock_space.node_list)
+    ranking = CaptureRanking()
+    if processes == 0:
+        processes = multiprocessing.cpu_count()
+    pool = dlm.create_parse_pool(processes) if processes else None
+    out.write("{0} {1} lockspace: {2}\n".format(config.VERSION, directory, name))
+    intervals = 0
+    try:
+        parsed = _imap(pool, parse_dump,
+                       [(path, when, hang_times[path])
+                        for round_dumps in rounds for _, when, path in round_dumps],
+                       PARSE_AHEAD * (processes or 1))
+        for round_dumps in rounds:
+            finished = []
+            paired = False
+            for node_name, when, _ in round_dumps:
+                node = nodes[node_name]
+                paired = paired or bool(node.sample_times)
+                node.process_all_slot_worker(next(parsed), None, when)
+                ranking.add(node)
+                finished.append(node)
+            record = lock_space.report_once(finished, round_dumps[-1][1])
+            if config.DEBUG:
+                print("[DEBUG] {0} dumps are processed at {1}"
+                      .format(len(round_dumps), record["time"]))
+            # the first dump of a node has no delta
+            if not paired:
+                continue
+            out.write(report.format_report(record) + "\n\n\n")
+            intervals += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+    time_range = "{0} - {1}".format(*[str(datetime.datetime.fromtimestamp(i)).split('.')[0]
+                                      for i in (rounds[0][0][1], rounds[-1][-1][1])])
+    out.write("whole capture, {0} intervals\n".format(intervals))
+    out.write(report.format_report(ranking.report_record(top_n, time_range, debug),
+                                   detailed=True) + "\n")
+    return intervals
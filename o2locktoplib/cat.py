@@ -5,62 +5,518 @@ The library of o2locktop. The main fuction of this module is
 cat the file from remote node or local file.
 """
 
+import os
+import time
+import zlib
+import shutil
+import atexit
+import tempfile
+import threading
+import subprocess
 from o2locktoplib import util
+from o2locktoplib import config
+from o2locktoplib import shell
+
+# The directory keeping the ssh control sockets, created on the first use
+_CONTROL_DIR = None
+_SESSIONS = {}
+_SESSIONS_MUTEX = threading.Lock()
+
+# The marks of the snapshot frames in the remote streaming mode
+FRAME_BEGIN = b"@@O2LOCKTOP_BEGIN"
+FRAME_END = b"@@O2LOCKTOP_END"
+
+# The remote awk loop of the delta mode, it remembers the previous snapshot
+# and only prints the added(+), changed(=) and removed(-) lines, every lock
+# resource is identified by a number instead of its name
+_DELTA_LOOP = r"""BEGIN {
+    n = 0
+    while (1) {
+        cmd = "date +%s.%N"
+        cmd | getline ts
+        close(cmd)
+        print b, ts, "delta"
+        while ((getline l < f) > 0) {
+            split(l, a)
+            k = a[2]
+            if (!(k in id)) {
+                id[k] = ++n
+                print "+" n, l
+            } else if (last[k] != l) {
+                print "=" id[k], l
+            }
+            last[k] = l
+            seen[k] = 1
+        }
+        close(f)
+        for (k in last)
+            if (!(k in seen))
+                gone[k] = 1
+        for (k in gone) {
+            print "-" id[k]
+            delete last[k]
+            delete id[k]
+            delete gone[k]
+        }
+        for (k in seen)
+            delete seen[k]
+        print e
+        fflush()
+        # sleep to the next multiple of t, like the scheduler of o2locktop
+        cmd | getline ts
+        close(cmd)
+        system("sleep " (t - ts % t))
+    }
+}"""
+
+class SshSession(object):
+    """
+    A long-lived multiplexed ssh connection(ssh ControlMaster) to one node.
+    The first command opens the master connection, the following commands
+    reuse it and skip the ssh handshake. The master exits by itself after
+    being idle for the ControlPersist seconds.
+    """
+    def __init__(self, node_name, control_dir):
+        self._node_name = node_name
+        self._control_path = os.path.join(control_dir, "{0}.sock".format(node_name))
+        # How many times a new master connection is opened
+        self.connects = 0
+        # How many times a dead master connection is detected
+        self.reconnects = 0
+        # How many commands reuse the master connection
+        self.reuses = 0
+
+    @property
+    def node_name(self):
+        """
+        Return the node name of the session
+        """
+        return self._node_name
+
+    @property
+    def options(self):
+        """
+        Return the ssh options to run a command through the master connection
+        """
+        return "-oControlMaster=auto -oControlPath={0} -oControlPersist={1} "\
+               "-oServerAliveInterval={2} -oBatchMode=yes ".format(
+                   self._control_path,
+                   max(60, int(config.INTERVAL) * 4),
+                   max(5, int(config.INTERVAL)))
+
+    def acquire(self):
+        """
+        Count the connection usage before running a command on the node
+        """
+        if os.path.exists(self._control_path):
+            self.reuses += 1
+        else:
+            self.connects += 1
+
+    def check(self):
+        """
+        Check if the master connection is still alive, if not, remove the
+        stale control socket, so the next command opens a new connection
+        """
+        if not os.path.exists(self._control_path):
+            return False
+        shell_obj = shell.shell("ssh -oControlPath={0} -O check root@{1}".format(
+            self._control_path, self._node_name))
+        if shell_obj.code == 0:
+            return True
+        self.reconnects += 1
+        try:
+            os.remove(self._control_path)
+        except OSError:
+            pass
+        return False
+
+    def close(self):
+        """
+        Ask the master connection to exit
+        """
+        if os.path.exists(self._control_path):
+            shell.shell("ssh -oControlPath={0} -O exit root@{1}".format(
+                self._control_path, self._node_name))
+
+    def stats(self):
+        """
+        Return the connection counters of the session
+        """
+        return {"connects":self.connects,
+                "reconnects":self.reconnects,
+                "reuses":self.reuses}
+
+def _cleanup_sessions():
+    """
+    Close all the master connections and remove the control directory
+    """
+    with _SESSIONS_MUTEX:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+    if _CONTROL_DIR:
+        shutil.rmtree(_CONTROL_DIR, ignore_errors=True)
+
+def get_session(node_name):
+    """
+    Return the SshSession of the node, one node only has one session
+    in the process
+    """
+    global _CONTROL_DIR
+    with _SESSIONS_MUTEX:
+        if _CONTROL_DIR is None:
+            _CONTROL_DIR = tempfile.mkdtemp(prefix="o2locktop-")
+            atexit.register(_cleanup_sessions)
+        if node_name not in _SESSIONS:
+            _SESSIONS[node_name] = SshSession(node_name, _CONTROL_DIR)
+        return _SESSIONS[node_name]
+
+def session_stats():
+    """
+    Return the connection counters of all the nodes, e.g.
+    {'node1': {'connects': 1, 'reconnects': 0, 'reuses': 42}}
+    """
+    with _SESSIONS_MUTEX:
+        return dict((name, session.stats()) for name, session in _SESSIONS.items())
 
 class Cat(object):
     """
     The super class that have the required interfaces
     """
+    # If True, get() blocks until the next sample is due, the caller
+    # should not sleep between two calls
+    paced = False
+
     def __init__(self, lock_space):
         self._lock_space = lock_space
 
     def get(self):
         """
-        The interface that the child class should implement
+        The interface that the child class should implement, it returns
+        the locking_state as one bytes buffer
         """
         pass
 
 class LocalCat(Cat):
     """
-    The local mode class of Cat
+    The local mode class of Cat, it reads the locking_state in the process
+    into a reusable buffer instead of running cat
     """
+    # The initial size of the buffer, it is doubled when the file is bigger
+    BUFFER_SIZE = 1 << 20
+
     def  __init__(self, lock_space):
         if util.PY2:
             super(LocalCat, self).__init__(lock_space)
         else:
             super().__init__(lock_space)
+        self._path = util.get_locking_state_path(lock_space)
+        self._buffer = bytearray(LocalCat.BUFFER_SIZE)
 
+    def _read(self):
+        """
+        Read the whole locking_state into self._buffer, return the length
+        """
+        size = 0
+        # debugfs gives at most one page per read, so read until the end
+        with open(self._path, 'rb', 0) as filp:
+            while True:
+                if size == len(self._buffer):
+                    self._buffer.extend(bytearray(len(self._buffer)))
+                view = memoryview(self._buffer)
+                count = filp.readinto(view[size:])
+                del view
+                if not count:
+                    break
+                size += count
+        return size
 
     def get(self):
         """
         According  the lock_sapce to get the local node's locking_state
         """
-        return util.get_one_cat(self._lock_space, None)
+        try:
+            size = self._read()
+        except (IOError, OSError) as expt:
+            if config.DEBUG:
+                print("[DEBUG] read {0} failed: {1}".format(self._path, expt))
+            return b''
+        return bytes(self._buffer[:size])
 
 class SshCat(Cat):
     """
-    The remote mode class of Cat
+    The remote mode class of Cat, all the cat of the same node share
+    one multiplexed ssh connection. If compress is True, the locking_state
+    is compressed by gzip on the node and decompressed here, and it falls
+    back to the plain cat if there is no gzip on the node.
     """
-    def __init__(self, lock_space, node_name):
+    def __init__(self, lock_space, node_name, compress=False):
         self._node_name = node_name
+        self._session = get_session(node_name)
+        self._compress = compress
+        # The bytes received from the node, and the bytes after decompressed
+        self.wire_bytes = 0
+        self.raw_bytes = 0
+        # The seconds spent in decompressing
+        self.decompress_time = 0
         if util.PY2:
             super(SshCat, self).__init__(lock_space)
         else:
             super().__init__(lock_space)
 
+    @property
+    def session(self):
+        """
+        Return the SshSession used by this cat
+        """
+        return self._session
+
+    def _get_compressed(self):
+        """
+        Get the gzip compressed locking_state and decompress it, return None
+        if there is no gzip on the node
+        """
+        code, data = util.get_one_cat_compressed(self._lock_space,
+                                                 self._node_name,
+                                                 self._session.options)
+        if code == 127:
+            return None
+        start = time.time()
+        try:
+            text = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        except zlib.error:
+            text = b''
+        self.decompress_time += time.time() - start
+        self.wire_bytes += len(data)
+        self.raw_bytes += len(text)
+        return text
+
     def get(self):
         """
         According  the lock_sapce to get the remote node's locking_state
         """
-        return util.get_one_cat(self._lock_space, self._node_name)
+        self._session.acquire()
+        ret = None
+        if self._compress:
+            ret = self._get_compressed()
+            if ret is None:
+                if config.DEBUG:
+                    print("[DEBUG] no gzip on node {0}, use the plain cat".format(
+                        self._node_name))
+                self._compress = False
+        if ret is None:
+            ret = util.get_one_cat(self._lock_space, self._node_name,
+                                   self._session.options, raw=True)
+        if not ret:
+            # maybe the master connection is dead, reconnect in the next time
+            self._session.check()
+        if config.DEBUG:
+            print("[DEBUG] ssh session on node {0}: {1}".format(
+                self._node_name, self._session.stats()))
+            if self._compress:
+                print("[DEBUG] compressed cat on node {0}: {1} bytes on wire, "
+                      "{2} bytes decompressed, {3:.3f}s in decompressing".format(
+                          self._node_name, self.wire_bytes, self.raw_bytes,
+                          self.decompress_time))
+        return ret
+
+class StreamCat(SshCat):
+    """
+    The remote streaming mode class of Cat. Only one remote loop is started
+    on the node, it reads the locking_state by the remote timer and streams
+    the framed snapshots back over the stdout of the ssh command, the
+    frame is as follows
+    @@O2LOCKTOP_BEGIN 1546944000.123456789
+    <the lines of locking_state>
+    @@O2LOCKTOP_END
+    If compress is True, the stream is compressed by the ssh connection.
+    If delta is True, the remote loop is an awk program which remembers
+    the previous snapshot and only sends the changed lines, the frame is
+    @@O2LOCKTOP_BEGIN 1546944000.123456789 delta
+    +1 <added line>
+    =2 <changed line>
+    -3
+    @@O2LOCKTOP_END
+    The frames are read by a reader thread as they arrive, the delta frames
+    are applied in the order, and get returns the latest complete snapshot,
+    so a late reader skips the old frames instead of lagging behind
+    """
+    paced = True
+
+    def __init__(self, lock_space, node_name, interval=None, delta=False, compress=False):
+        if util.PY2:
+            super(StreamCat, self).__init__(lock_space, node_name, compress)
+        else:
+            super().__init__(lock_space, node_name, compress)
+        self._interval = interval if interval else config.INTERVAL
+        self._delta = delta
+        self._popen = None
+        # The thread that reads the frames of the stream
+        self._reader = None
+        # The latest frame that is not got yet, (timestamp, locking_state),
+        # and whether the stream is broken, guarded by _cond
+        self._cond = threading.Condition()
+        self._latest = None
+        self._eof = False
+        # The remote timestamp of the latest frame
+        self.timestamp = None
+        # The lines count in the frames since the last get
+        self.frame_lines = 0
+        self._pending_lines = 0
+        # The count of the frames that are replaced by a newer one
+        self.skipped_frames = 0
+
+    def _remote_loop(self):
+        """
+        Return the shell loop that runs on the remote node
+        """
+        if self._delta:
+            return "awk -v f={path} -v t={interval} -v b={begin} -v e={end} {loop}".format(
+                path=util.get_locking_state_path(self._lock_space),
+                interval=self._interval,
+                begin=FRAME_BEGIN.decode(),
+                end=FRAME_END.decode(),
+                loop=util.quote(_DELTA_LOOP))
+        # sleep to the next multiple of the interval, like the scheduler of o2locktop
+        return 'while :; do echo "{begin} $(date +%s.%N)"; cat {path}; '\
+               'echo "{end}"; sleep $(date +%s.%N | '\
+               'awk -v t={interval} \'{{print t - $1 % t}}\'); done'.format(
+                   begin=FRAME_BEGIN.decode(),
+                   end=FRAME_END.decode(),
+                   path=util.get_locking_state_path(self._lock_space),
+                   interval=self._interval)
+
+    def _start(self):
+        """
+        Start the remote loop through the multiplexed ssh connection
+        """
+        self._session.acquire()
+        cmd = "ssh {0}{1}root@{2} {3}".format(
+            self._session.options,
+            "-oCompression=yes " if self._compress else "",
+            self._node_name,
+            util.quote(self._remote_loop()))
+        with open(os.devnull, 'w') as devnull:
+            self._popen = subprocess.Popen(cmd,
+                                           shell=True,
+                                           stdout=subprocess.PIPE,
+                                           stderr=devnull)
+        self._start_reader()
+
+    def _start_reader(self):
+        """
+        Start the reader thread of the stdout of the remote loop
+        """
+        self._latest = None
+        self._eof = False
+        self._pending_lines = 0
+        self._reader = threading.Thread(target=self._read_frames, args=(self._popen.stdout,))
+        self._reader.daemon = True
+        self._reader.start()
+
+    def stop(self):
+        """
+        Stop the remote loop, the remote shell exits on SIGPIPE
+        """
+        if self._popen is not None:
+            if self._popen.poll() is None:
+                self._popen.kill()
+            self._popen.wait()
+            self._popen = None
+        # the reader of the stopped stream exits at the end of the stream,
+        # it is not waited for and its frames are ignored
+        self._reader = None
+
+    def _apply_patch(self, patch, snapshot):
+        """
+        Apply the lines of a delta frame to the snapshot, and return the
+        complete locking_state
+        Parameters:
+            snapshot(dict): The full snapshot rebuilt from the delta frames,
+                            id : line
+        """
+        for line in patch:
+            if line[:1] == b'-':
+                snapshot.pop(line[1:], None)
+            else:
+                lock_id, raw = line[1:].split(b' ', 1)
+                snapshot[lock_id] = raw
+        if config.DEBUG:
+            print("[DEBUG] delta frame on node {0}: {1} of {2} lines are sent".format(
+                self._node_name, len(patch), len(snapshot)))
+        return b'\n'.join(snapshot.values())
+
+    def _read_frames(self, stream):
+        """
+        The reader thread, read the frames until the stream is broken, and
+        keep the latest one for get
+        """
+        lines = None
+        delta = False
+        timestamp = None
+        snapshot = {}
+        reader = threading.current_thread()
+        for line in iter(stream.readline, b''):
+            line = line.rstrip(b'\n')
+            if line.startswith(FRAME_BEGIN):
+                lines = []
+                fields = line.split()
+                timestamp = float(fields[1])
+                delta = len(fields) > 2 and fields[2] == b"delta"
+            elif line == FRAME_END:
+                if lines is not None:
+                    if delta:
+                        locking_state = self._apply_patch(lines, snapshot)
+                    else:
+                        locking_state = b'\n'.join(lines)
+                    with self._cond:
+                        if self._reader is not reader:
+                            return
+                        if self._latest is not None:
+                            self.skipped_frames += 1
+                        self._latest = (timestamp, locking_state)
+                        self._pending_lines += len(lines)
+                        self._cond.notify()
+                lines = None
+            elif lines is not None and line:
+                lines.append(line)
+        with self._cond:
+            if self._reader is reader:
+                self._eof = True
+                self._cond.notify()
+
+    def get(self):
+        """
+        Wait for a frame of the remote loop that is newer than the last one
+        got, and return the locking_state in the latest frame
+        """
+        if self._reader is None:
+            self._start()
+        with self._cond:
+            while self._latest is None and not self._eof:
+                self._cond.wait()
+            latest, self._latest = self._latest, None
+            self.frame_lines, self._pending_lines = self._pending_lines, 0
+        if latest is not None:
+            self.timestamp, locking_state = latest
+            return locking_state
+        # the stream is broken, restart the remote loop in the next time
+        self.stop()
+        self._session.check()
+        if config.DEBUG:
+            print("[DEBUG] the stream on node {0} is broken".format(self._node_name))
+        return b''
 
 def gen_cat(which, lock_space, *args):
     """According 'which' parameter to generate different Cat object
     Parameters:
-        which(str): The mode of Cat, it can be 'local' or 'ssh'
+        which(str): The mode of Cat, it can be 'local', 'ssh' or 'stream'
     """
     if which == 'local':
         return LocalCat(lock_space)
     elif which == 'ssh':
         return SshCat(lock_space, *args)
+    elif which == 'stream':
+        return StreamCat(lock_space, *args)
     return None
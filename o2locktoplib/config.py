@@ -3,7 +3,6 @@ The config file of o2locktop
 """
 VERSION = "o2locktop 1.0.10"
 VERSION_SETUP = "1.0.10"
-ROWS = 0
 COLUMNS = 93
 CMDS = ["uname", "grep", "cat", "lsblk", "dlm_tool", "o2info", "blkid", "mount", "debugfs.ocfs2"]
 
@@ -13,6 +12,45 @@ if DEBUG:
 else:
     CLEAR = True
 INTERVAL = 5
+# The shortest interval of the high-frequency sampling
+MIN_INTERVAL = 0.1
+# A lock that waits longer than the interval is hanged, but never shorter than
+# it(seconds), a lock storm in the sub-second intervals is not a hang
+MIN_HANG_TIME = 5
+# The remote nodes are always streamed if the interval is shorter than it,
+# running ssh in every sub-second interval costs too much
+STREAM_INTERVAL = 1
+# Use one long-running remote loop per node to stream the locking_state
+STREAM = False
+# Only send the changed lines from the remote loop, implies STREAM
+DELTA = False
+# Compress the locking_state on the remote node before sending it
+COMPRESS = False
+# The max count of the threads that process the locking_state of the nodes
+WORKERS = 4
+# The path of the binary recording of the samples, None means not recording
+RECORD = None
+# Rotate the recording once it is bigger than it(bytes), 0 means never
+RECORD_SIZE = 0
+# Compress the frames of the recording
+RECORD_COMPRESS = False
+# The path of the recording that is replayed instead of the cluster, None
+# means no replay
+REPLAY = None
+# The times of the real time that the recording is replayed, 0 means as fast
+# as possible
+SPEED = 1
+# The reports of the replay before the time(seconds since the epoch) are
+# skipped, None means no seek
+SEEK = None
+# The directory of the captured locking_state that is analyzed offline, None
+# means no analysis
+ANALYZE = None
+# The count of the processes that parse the locking_state, 0 means parsing in
+# the threads of the lockspace process
+PARSE_PROCESSES = 0
+# Show the NUM and TIME as the per-second rates of the sample window
+RATE = False
 pr_locks = 0
 ex_locks = 0
 UUID = ""
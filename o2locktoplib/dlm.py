@@ -7,18 +7,35 @@ classify and statistics the locks of the cluster
 """
 
 import threading
+import multiprocessing
+import datetime
+import signal
 import time
 import os
-import decimal
+import io
+import array
+import heapq
 import math
+import zlib
 from o2locktoplib import util
 from o2locktoplib import config
 from o2locktoplib import cat
+from o2locktoplib import pool
+from o2locktoplib import scheduler
+from o2locktoplib import report
+from o2locktoplib import terminal
+from o2locktoplib import recording
+try:
+    # numpy is optional, it is used to compute the deltas of all the locks at once
+    import numpy
+except ImportError:
+    numpy = None
 
 # cat  -----  output of one time execution of "cat locking_stat"
                 # one cat contains multiple Shot(es)
 # Shot -----  lockinfo for one lockres at one time of cat
-# Lock   ---- a list of Shot for a typical lockres
+# ShotTable - the columnar storage of the latest Shot(es) of all the locks on one node
+# Lock   ---- a list of Shot for a typical lockres, the Shot(es) are kept in the ShotTable
 # Node --- LockSpace on one node, which contains multiple Lock(s)
 # LockSpace ---- A Lock should only belongs to one LockSpace
 #
@@ -29,8 +46,29 @@ LOCK_LEVEL_PR = 0
 LOCK_LEVEL_EX = 1
 KEEP_HISTORY_CNT = 2
 
-
-class LockName:
+# The counters of a Shot that are kept in the ShotTable
+COUNTER_FIELDS = (
+    "lock_num_prmode",
+    "lock_num_exmode",
+    "lock_total_prmode", #unit ns
+    "lock_total_exmode", #unit ns
+)
+# The hang time(unit s) of the lock, 0 means the lock is not hanged
+HANG_FIELDS = (
+    "lock_prmode_hang_time",
+    "lock_exmode_hang_time",
+)
+TABLE_FIELDS = COUNTER_FIELDS + HANG_FIELDS
+# The 64-bit typecode of array for the counters, python2 has no 'q',
+# but its 'l' is 64-bit on the 64-bit linux
+COUNTER_TYPECODE = 'l' if util.PY2 else 'q'
+# The (total_time, total_num, hang_time) fields of every lock level
+LEVEL_FIELDS = {
+    LOCK_LEVEL_PR: ("lock_total_prmode", "lock_num_prmode", "lock_prmode_hang_time"),
+    LOCK_LEVEL_EX: ("lock_total_exmode", "lock_num_exmode", "lock_exmode_hang_time"),
+}
+
+class LockName(object):
     """
     The Lock format is as follows
     M    000000 0000000000000005        6434f530
@@ -38,6 +76,8 @@ class LockName:
     [0:1][1:1+6][1+6:1+6+16]            [1+6+16:]
     not for dentry
     """
+    # there is a LockName for every lock on every node, keep it small
+    __slots__ = ("_name",)
 
     def __init__(self, lock_name):
         self._name = lock_name
@@ -93,11 +133,147 @@ class LockName:
     def __hash__(self):
         return hash(self._name)
 
+def get_hang_time(lock_wait, l_requested, now=None, min_hang_time=None):
+    """
+    According current timestamp to judge if the lock is hanged
+    Parameters:
+        lock_wait(int): The timestamp(unit us) since the lock is waited, 0 means not waiting
+        l_requested(int): The requested lock level, 3 is PR and 5 is EX
+        now(float): The time that the locking_state is read, now by default
+        min_hang_time(float): The lock is hanged if it waits longer than it(unit s),
+                              max(config.INTERVAL, config.MIN_HANG_TIME) by default
+    Returns:
+        (prmode_hang_time, exmode_hang_time): unit s, 0 means not hanged
+    """
+    if not lock_wait:
+        return 0, 0
+    hang_time = (time.time() if now is None else now) - lock_wait/1000000.0
+    if min_hang_time is None:
+        min_hang_time = max(config.INTERVAL, config.MIN_HANG_TIME)
+    if hang_time > min_hang_time:
+        if l_requested == 3:
+            return hang_time, 0
+        if l_requested == 5:
+            return 0, hang_time
+    return 0, 0
+
+def _line_digest(line):
+    """
+    The crc32 of the line, it is independent of hash(line), the unchanged line
+    is checked by both of them, so a collision of the hash doesn't repeat the
+    Lock of another line
+    """
+    if not util.PY2 and not isinstance(line, bytes):
+        line = line.encode()
+    return zlib.crc32(line)
+
+
+def _parse_shot(source, now=None, min_hang_time=None):
+    """
+    The implement of parse_shot, it also returns the lock_wait of the line,
+    0 if the debug version has no lock_wait
+    """
+    head = source.split(None, Shot.lvb_index)
+    debug_ver = int(head[0], 16)
+    if debug_ver == 4:
+        tail = head[-1].rsplit(None, Shot.tail_len_v4)
+        lock_wait = int(tail[12])
+        pr_hang_time, ex_hang_time = get_hang_time(lock_wait, int(head[8]), now,
+                                                   min_hang_time)
+    else:
+        tail = head[-1].rsplit(None, Shot.tail_len_v3)
+        lock_wait = 0
+        pr_hang_time, ex_hang_time = 0, 0
+    name = head[1]
+    if not util.PY2 and isinstance(name, bytes):
+        name = name.decode()
+    name = LockName(name)
+    if name.inode_num == 0:
+        return None, None, 0
+    # lock_num_prmode, lock_num_exmode, lock_total_prmode, lock_total_exmode
+    return name, (int(tail[1]), int(tail[2]), int(tail[5]), int(tail[6]),
+                  pr_hang_time, ex_hang_time), lock_wait
+
+def parse_shot(source, now=None, min_hang_time=None):
+    """
+    Parse one line of locking_state to the lock name and the values of
+    TABLE_FIELDS, it is the fast path of Shot used by Node, only the
+    required fields are converted
+    parameters:
+        source: is a line form file locking_state, str or bytes
+        now(float): The time that the locking_state is read, now by default
+        min_hang_time(float): See get_hang_time
+    Returns:
+        (LockName, tuple): (None, None) if the line is illegal
+    """
+    return _parse_shot(source, now, min_hang_time)[:2]
+
+def split_chunks(raw_slot_strs, count):
+    """
+    Split the bytes buffer of a locking_state to about count chunks at the line
+    boundaries, so every chunk can be parsed in a different process
+    """
+    size = len(raw_slot_strs)
+    chunks = []
+    start = 0
+    for i in range(1, count + 1):
+        end = size if i == count else raw_slot_strs.find(b'\n', size * i // count)
+        if end < 0:
+            end = size
+        if end > start:
+            chunks.append(raw_slot_strs[start:end])
+        start = end
+        if start >= size:
+            break
+    return chunks
+
+def parse_chunk(chunk, now=None, min_hang_time=None):
+    """
+    Parse a chunk of the locking_state in the parse process, the result is
+    compact, it is pickled back to the lockspace process
+    Parameters:
+        now(float): The time that the locking_state is read, now by default
+        min_hang_time(float): See get_hang_time
+    Returns:
+        (names, counters, hang_times): names is the lock names joined by '\n',
+        counters is the bytes of array(COUNTER_TYPECODE) of COUNTER_FIELDS for every lock,
+        hang_times is the bytes of array('d') of HANG_FIELDS for every lock
+    """
+    names = []
+    counters = array.array(COUNTER_TYPECODE)
+    hang_times = array.array('d')
+    for line in chunk.splitlines():
+        if not line.strip():
+            continue
+        name, values = parse_shot(line, now, min_hang_time)
+        if name is None:
+            continue
+        names.append(str(name))
+        counters.extend(values[:len(COUNTER_FIELDS)])
+        hang_times.extend(values[len(COUNTER_FIELDS):])
+    return "\n".join(names), counters.tostring() if util.PY2 else counters.tobytes(), \
+           hang_times.tostring() if util.PY2 else hang_times.tobytes()
+
+def _init_parse_process(interval):
+    """
+    The initializer of the parse process, the hang time is judged by the interval
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config.INTERVAL = interval
+
+def create_parse_pool(processes):
+    """
+    Return the process pool which parses the locking_state on multiple cores
+    """
+    return multiprocessing.Pool(processes, initializer=_init_parse_process,
+                                initargs=(config.INTERVAL,))
+
 class Shot:
     """
     The Shot class represent a complete line in the locking_stat file
     The line includes all the information of the lock
     Support the ocfs2 debug info version3 and version4
+    The fields after lvb_64B are counters and converted to int
     """
     debug_format_v3 = (
         ("debug_ver", 1),
@@ -128,40 +304,58 @@ class Shot:
         ("lock_wait", 1),
     )
 
+    # The index of lvb_64B in the debug format, the fields before it are
+    # split from the head of the line, and the fields after it from the tail
+    lvb_index = 10
+    tail_len_v3 = len(debug_format_v3) - lvb_index - 1
+    tail_len_v4 = len(debug_format_v4) - lvb_index - 1
+
     def __init__(self, source_str):
+        """
+        The source_str can be str or bytes, the 64 tokens of lvb_64B are
+        never split, they are joined only when lvb_64B is accessed
+        """
+        if not util.PY2 and isinstance(source_str, bytes):
+            source_str = source_str.decode()
         self.source = source_str.strip()
-        strings = source_str.strip().split()
-        self.debug_ver = int(strings[0].lstrip("0x"))
+        head = self.source.split(None, Shot.lvb_index)
+        self.debug_ver = int(head[0], 16)
         assert(self.debug_ver == 3 or self.debug_ver == 4)
         self.debug_format = Shot.debug_format_v3 if self.debug_ver == 3 else Shot.debug_format_v4
-        i = 0
-        for item in self.debug_format:
-            # key, value = item[0], item[1]
-            var_name = item[0]
-            var_len = item[1]
-            value = "".join(strings[i: i + var_len])
-            setattr(self, var_name, value)
-            i += var_len
+        tail_format = self.debug_format[Shot.lvb_index+1:]
+        tail = head.pop().rsplit(None, len(tail_format))
+        for item, value in zip(self.debug_format[1:Shot.lvb_index], head[1:]):
+            setattr(self, item[0], value)
+        for item, value in zip(tail_format, tail[1:]):
+            setattr(self, item[0], int(value))
         self.name = LockName(self.name)
-        self.debug_ver = int(strings[0].lstrip("0x"))
+        self.lock_prmode_hang_time = 0
+        self.lock_exmode_hang_time = 0
         if self.debug_ver == 4:
             self.check_hang()
 
+    @property
+    def lvb_64B(self):
+        """
+        Return the lvb_64B field, which is not used by o2locktop
+        """
+        lvb = self.source.split()[Shot.lvb_index : Shot.lvb_index+64]
+        return "".join(lvb)
+
+    @property
+    def values(self):
+        """
+        Return the values of TABLE_FIELDS, which are kept in the ShotTable
+        """
+        return tuple(getattr(self, field) for field in TABLE_FIELDS)
+
     def check_hang(self):
         """
         According current timestamp to judge if the lock is hanged
-        If hanged, set the lock_total_prmode and lock_total_exmode to inf
+        If hanged, set the lock_prmode_hang_time or lock_exmode_hang_time
         """
-        if self.lock_wait == '0':
-            return
-        hang_time = int(time.time()) - int(self.lock_wait)/1000000
-        if hang_time > config.INTERVAL:
-            if self.l_requested == '3':
-                self.lock_total_prmode = float('inf')
-                self.lock_prmode_hang_time = hang_time
-            if self.l_requested == '5':
-                self.lock_total_exmode = float('inf')
-                self.lock_exmode_hang_time = hang_time
+        self.lock_prmode_hang_time, self.lock_exmode_hang_time = \
+            get_hang_time(self.lock_wait, int(self.l_requested))
 
     def __str__(self):
         """
@@ -196,18 +390,318 @@ class Shot:
         """
         return self.name.lock_type
 
-class Lock():
+class ShotTable(object):
+    """
+    The columnar storage of the Shot(es) of all the locks on one node.
+    Every field of TABLE_FIELDS is kept in a fixed-width array, and every
+    lock id owns KEEP_HISTORY_CNT slots in each array, the slots of the
+    lock id i are [i*KEEP_HISTORY_CNT, (i+1)*KEEP_HISTORY_CNT), the older
+    Shot first.
+    """
+    def __init__(self):
+        self.columns = {}
+        for field in COUNTER_FIELDS:
+            self.columns[field] = array.array(COUNTER_TYPECODE)
+        for field in HANG_FIELDS:
+            self.columns[field] = array.array('d')
+        self._column_list = [self.columns[field] for field in TABLE_FIELDS]
+        # The count of the Shot(es) kept for every lock id
+        self.counts = bytearray()
+        # If the lock id is unchanged since the latest Shot
+        self.unchanged = bytearray()
+        # The result of compute_deltas, it is dropped once the table is changed
+        self.deltas = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    def alloc(self):
+        """
+        Return a new lock id
+        """
+        self.deltas = None
+        for column in self._column_list:
+            column.extend([0] * KEEP_HISTORY_CNT)
+        self.counts.append(0)
+        self.unchanged.append(0)
+        return len(self.counts) - 1
+
+    def clear(self, lock_id):
+        """
+        Drop all the Shot(es) of the lock id
+        """
+        self.deltas = None
+        self.counts[lock_id] = 0
+        self.unchanged[lock_id] = 0
+
+    def push(self, lock_id, values):
+        """
+        Append the values of TABLE_FIELDS as the latest Shot of the lock id,
+        the oldest Shot is dropped if there are already KEEP_HISTORY_CNT Shot(es)
+        """
+        self.deltas = None
+        self.unchanged[lock_id] = 0
+        base = lock_id * KEEP_HISTORY_CNT
+        count = self.counts[lock_id]
+        if count < KEEP_HISTORY_CNT:
+            slot = base + count
+            self.counts[lock_id] = count + 1
+        else:
+            slot = base + KEEP_HISTORY_CNT - 1
+            for column in self._column_list:
+                for i in range(base, slot):
+                    column[i] = column[i + 1]
+        for column, value in zip(self._column_list, values):
+            column[slot] = value
+
+    def push_many(self, lock_ids, indexes, counters, hang_times):
+        """
+        Push the Shot(es) of many lock ids at once, by numpy if it is installed
+        Parameters:
+            lock_ids(list): The lock ids, every lock id appears once
+            indexes(list): The values of lock_ids[i] are the indexes[i]th values
+                           in counters and hang_times
+            counters(array): The values of COUNTER_FIELDS of every lock
+            hang_times(array): The values of HANG_FIELDS of every lock
+        """
+        counter_len = len(COUNTER_FIELDS)
+        hang_len = len(HANG_FIELDS)
+        if numpy is None or not len(lock_ids):
+            for lock_id, i in zip(lock_ids, indexes):
+                self.push(lock_id, counters[i*counter_len : (i+1)*counter_len].tolist() +
+                          hang_times[i*hang_len : (i+1)*hang_len].tolist())
+            return
+        self.deltas = None
+        ids = numpy.array(lock_ids, dtype=numpy.int64)
+        rows = numpy.array(indexes, dtype=numpy.int64)
+        new_values = numpy.frombuffer(counters, dtype=numpy.int64).reshape(-1, counter_len)[rows]
+        new_hang_times = numpy.frombuffer(hang_times, dtype=numpy.float64).reshape(-1, hang_len)[rows]
+        numpy.frombuffer(self.unchanged, dtype=numpy.uint8)[ids] = 0
+        counts = numpy.frombuffer(self.counts, dtype=numpy.uint8)
+        count = counts[ids]
+        # the lock ids that already have KEEP_HISTORY_CNT Shot(es) drop the oldest
+        full_base = ids[count >= KEEP_HISTORY_CNT] * KEEP_HISTORY_CNT
+        slot = ids * KEEP_HISTORY_CNT + numpy.minimum(count, KEEP_HISTORY_CNT - 1)
+        counts[ids] = numpy.minimum(count + 1, KEEP_HISTORY_CNT)
+        columns = [(self.columns[field], numpy.int64, new_values[:, i])
+                   for i, field in enumerate(COUNTER_FIELDS)]
+        columns += [(self.columns[field], numpy.float64, new_hang_times[:, i])
+                    for i, field in enumerate(HANG_FIELDS)]
+        for column, dtype, new in columns:
+            view = numpy.frombuffer(column, dtype=dtype)
+            for i in range(KEEP_HISTORY_CNT - 1):
+                view[full_base + i] = view[full_base + i + 1]
+            view[slot] = new
+
+    def latest(self, lock_ids, deltas=False):
+        """
+        Return the values of the latest Shot of the lock ids, the lock id that
+        has no Shot has the zeros
+        Parameters:
+            lock_ids(list): The lock ids
+            deltas(bool): Return the deltas of the counters from the previous
+                          Shot, every lock id must have KEEP_HISTORY_CNT Shot(es)
+        Returns:
+            (counters, hang_times): The arrays of the values of COUNTER_FIELDS
+                                    and HANG_FIELDS of every lock id
+        """
+        counter_columns = [self.columns[field] for field in COUNTER_FIELDS]
+        hang_columns = [self.columns[field] for field in HANG_FIELDS]
+        if numpy is not None and len(lock_ids):
+            ids = numpy.array(lock_ids, dtype=numpy.int64)
+            count = numpy.frombuffer(self.counts, dtype=numpy.uint8)[ids].astype(numpy.int64)
+            slot = ids * KEEP_HISTORY_CNT + numpy.maximum(count - 1, 0)
+            has_shot = count > 0
+            counters = []
+            for column in counter_columns:
+                view = numpy.frombuffer(column, dtype=numpy.int64)
+                values = view[slot] - view[slot - 1] if deltas else view[slot]
+                counters.append(numpy.where(has_shot, values, 0))
+            hang_times = [numpy.where(has_shot, numpy.frombuffer(column, dtype=numpy.float64)[slot], 0)
+                          for column in hang_columns]
+            # the values of a lock id are adjacent
+            return (array.array(COUNTER_TYPECODE, numpy.stack(counters, axis=1)
+                                .astype(numpy.int64).tobytes()),
+                    array.array('d', numpy.stack(hang_times, axis=1).tobytes()))
+        counters = array.array(COUNTER_TYPECODE)
+        hang_times = array.array('d')
+        for lock_id in lock_ids:
+            count = self.counts[lock_id]
+            if not count:
+                counters.extend([0] * len(counter_columns))
+                hang_times.extend([0] * len(hang_columns))
+                continue
+            slot = lock_id * KEEP_HISTORY_CNT + count - 1
+            for column in counter_columns:
+                counters.append(column[slot] - column[slot - 1] if deltas else column[slot])
+            for column in hang_columns:
+                hang_times.append(column[slot])
+        return counters, hang_times
+
+    def push_deltas(self, lock_ids, counter_deltas, hang_times):
+        """
+        Push the Shot(es) of many lock ids at once, the counters are the deltas
+        from their latest Shot(es), see ShotTable.latest
+        Parameters:
+            lock_ids(list): The lock ids, every lock id has KEEP_HISTORY_CNT Shot(es)
+            counter_deltas(array): The deltas of COUNTER_FIELDS of every lock id
+            hang_times(array): The values of HANG_FIELDS of every lock id
+        """
+        if not len(lock_ids):
+            return
+        counters, _ = self.latest(lock_ids)
+        if numpy is not None:
+            counters = array.array(COUNTER_TYPECODE,
+                                   (numpy.frombuffer(counters, dtype=numpy.int64) +
+                                    numpy.frombuffer(counter_deltas, dtype=numpy.int64)).tobytes())
+        else:
+            counters = array.array(COUNTER_TYPECODE,
+                                   [i + j for i, j in zip(counters, counter_deltas)])
+        self.push_many(lock_ids, range(len(lock_ids)), counters, hang_times)
+
+    def repeat_all(self):
+        """
+        Mark all the lock ids unchanged since the latest Shot, see repeat
+        """
+        self.deltas = None
+        self.unchanged[:] = b"\x01" * len(self.unchanged)
+
+    def changed(self, lock_ids, indexes, counters, hang_times):
+        """
+        Return which of the lock ids have the values different from their
+        latest Shot, or have no Shot, see push_many for the parameters
+        Returns:
+            The boolean numpy array of the lock ids, None if numpy is not installed
+        """
+        if numpy is None:
+            return None
+        counter_len = len(COUNTER_FIELDS)
+        hang_len = len(HANG_FIELDS)
+        ids = numpy.array(lock_ids, dtype=numpy.int64)
+        rows = numpy.array(indexes, dtype=numpy.int64)
+        latest_counters, latest_hang_times = self.latest(lock_ids)
+        latest_counters = numpy.frombuffer(latest_counters, dtype=numpy.int64)
+        latest_hang_times = numpy.frombuffer(latest_hang_times, dtype=numpy.float64)
+        new_values = numpy.frombuffer(counters, dtype=numpy.int64).reshape(-1, counter_len)[rows]
+        new_hang_times = \
+            numpy.frombuffer(hang_times, dtype=numpy.float64).reshape(-1, hang_len)[rows]
+        return (numpy.frombuffer(self.counts, dtype=numpy.uint8)[ids] == 0) | \
+               (new_values != latest_counters.reshape(-1, counter_len)).any(axis=1) | \
+               (new_hang_times != latest_hang_times.reshape(-1, hang_len)).any(axis=1)
+
+    def repeat_many(self, lock_ids):
+        """
+        Mark many lock ids unchanged at once, see repeat
+        """
+        self.deltas = None
+        if numpy is None:
+            for lock_id in lock_ids:
+                self.unchanged[lock_id] = 1
+            return
+        ids = numpy.array(lock_ids, dtype=numpy.int64)
+        numpy.frombuffer(self.unchanged, dtype=numpy.uint8)[ids] = 1
+
+    def repeat(self, lock_id):
+        """
+        Mark the lock id unchanged since the latest Shot, the lock id has
+        no delta until the next push, the counters are not touched
+        """
+        self.deltas = None
+        self.unchanged[lock_id] = 1
+
+    def get(self, field, lock_id, index=-1):
+        """
+        Return the field of the Shot at index of the lock id, like the
+        indexing of a list of KEEP_HISTORY_CNT Shot(es), if there is no
+        such Shot or field, return None
+        """
+        column = self.columns.get(field)
+        if column is None:
+            return None
+        if index < 0:
+            index += KEEP_HISTORY_CNT
+        if index < 0 or index >= self.counts[lock_id]:
+            return None
+        return column[lock_id * KEEP_HISTORY_CNT + index]
+
+    def compute_deltas(self):
+        """
+        Compute the delta_time, delta_num and key_index of both lock levels
+        for all the lock ids by numpy, the result is the same as
+        Lock.get_lock_level_info(unit='ns') and kept in self.deltas until the
+        table is changed.
+        Returns:
+            False if numpy is not installed, the Lock(s) compute by themselves
+        """
+        if numpy is None:
+            return False
+        # numpy can not compute the views of the empty arrays
+        if not self.counts:
+            self.deltas = {LOCK_LEVEL_PR: ([], [], []), LOCK_LEVEL_EX: ([], [], [])}
+            return True
+        has_delta = (numpy.frombuffer(self.counts, dtype=numpy.uint8) >= KEEP_HISTORY_CNT) & \
+                    (numpy.frombuffer(self.unchanged, dtype=numpy.uint8) == 0)
+        deltas = {}
+        for level, (time_field, num_field, hang_field) in LEVEL_FIELDS.items():
+            total_time = numpy.frombuffer(self.columns[time_field], dtype=numpy.int64)
+            total_num = numpy.frombuffer(self.columns[num_field], dtype=numpy.int64)
+            hang_time = numpy.frombuffer(self.columns[hang_field], dtype=numpy.float64)
+            # the older Shot is in the even slots, the latest in the odd slots
+            latest_time = total_time[1::2].astype(numpy.float64)
+            latest_num = total_num[1::2].astype(numpy.float64)
+            delta_time = latest_time - total_time[0::2]
+            delta_num = latest_num - total_num[0::2]
+            # the counters are reset, use the latest values
+            reset = (delta_time < 0) | (delta_num < 0)
+            delta_time = numpy.where(reset, latest_time, delta_time)
+            delta_num = numpy.where(reset, latest_num, delta_num)
+            moved = has_delta & (delta_time != 0) & (delta_num != 0)
+            # only the latest Shot tells whether the lock is still waiting
+            hang = has_delta & (hang_time[1::2] != 0)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                key_index = numpy.where(moved, delta_time // numpy.where(moved, delta_num, 1), 0)
+            key_index = numpy.where(hang, hang_time[1::2] * 1000000, key_index)
+            delta_time = numpy.where(hang, numpy.inf, numpy.where(moved, delta_time, 0))
+            delta_num = numpy.where(hang | moved, delta_num, 0)
+            # keep the results in the fixed-width arrays too, reading them
+            # returns the python float
+            deltas[level] = tuple(array.array('d', result.astype(numpy.float64).tobytes())
+                                  for result in (delta_time, delta_num, key_index))
+        self.deltas = deltas
+        return True
+
+class Lock(object):
+    """
+    The Shot(es) of a lock resource on one node, the Shot(es) are kept
+    in the ShotTable of the node
+    """
+    __slots__ = ("_node", "_table", "_id", "_name", "_fresh", "refresh_flag")
+
     def __init__(self, node):
         self._node = node
-        self._shots = [None, None]
+        self._table = node.shot_table
+        self._id = self._table.alloc()
         # In the ocfs2 debug v4, if the lock is nit fresh, we shoule delete it
         self._fresh = 1
-        self.keep_history_cnt = KEEP_HISTORY_CNT
         self.refresh_flag = False
 
+    @property
+    def keep_history_cnt(self):
+        """
+        Return how many Shot(es) are kept for the lock
+        """
+        return KEEP_HISTORY_CNT
+
     @property
     def shot_count(self):
-        return len(self._shots)
+        return KEEP_HISTORY_CNT
+
+    @property
+    def lock_id(self):
+        """
+        Return the id of the lock in the ShotTable
+        """
+        return self._id
 
     @property
     def name(self):
@@ -272,11 +766,18 @@ class Lock():
             return False
         return True
 
-    def get_lock_level_info(self, lock_level, unit='ns'):
+    def get_lock_level_info(self, lock_level, unit='ns', deltas=None):
         """
         return delta_time, delta_num and key_index
+        Parameters:
+            deltas(dict): The result of compute_deltas to read, see _deltas by default
         """
         #pdb.set_trace()
+        if deltas is None:
+            deltas = self._deltas()
+        if deltas is not None and unit == 'ns':
+            delta_time, delta_num, key_index = deltas[lock_level]
+            return delta_time[self._id], delta_num[self._id], key_index[self._id]
         if not self.has_delta():
             return 0, 0, 0
 
@@ -296,45 +797,60 @@ class Lock():
         if delta_time < 0 or delta_num < 0:
             delta_time = self._get_latest_data_field_delta_abs(total_time_field)//ratio
             delta_num = self._get_latest_data_field_delta_abs(total_num_field)
-        if math.isnan(delta_time):
-            hang_type = self._lock_level_2_hang_field(lock_level)
-            hang_time = self._get_data_field_indexed(hang_type, -1)
-            if hang_time:
-                return float('inf'), delta_num, float(hang_time*1000000)
-            return float('inf'), delta_num, 0
+        hang_type = self._lock_level_2_hang_field(lock_level)
+        hang_time = self._get_data_field_indexed(hang_type, -1)
+        if hang_time:
+            return float('inf'), delta_num, float(hang_time*1000000)
         if delta_time and delta_num:
             return delta_time, delta_num, delta_time//delta_num
         return 0, 0, 0
 
+    def _deltas(self):
+        """
+        Return the result of compute_deltas that the Lock reads, the snapshot
+        of the node if its worker is busy, None if the Lock computes by itself
+        """
+        busy_snapshot = self._node.busy_snapshot
+        if busy_snapshot is not None:
+            return busy_snapshot[0]
+        return self._table.deltas
+
+    def has_shot(self):
+        """
+        If there is no Shot of the lock, then return False
+        """
+        return self._table.counts[self._id] > 0
+
     def has_delta(self):
         """
-        If one of the slot in self._slots is None, then return False
+        If there are less than two Shot(es) of the lock, or the lock is
+        unchanged since the latest shot, then return False
         """
-        return self._shots[0] != None and self._shots[1] != None
+        return self._table.counts[self._id] >= KEEP_HISTORY_CNT and \
+               not self._table.unchanged[self._id]
 
     def append(self, shot):
         """
         Append a shot to the lock, if the para is None, it plant to set the lock invalid
         """
         if shot == None:
-            self._shots[0] = None
-            self._shots[1] = None
+            self._table.clear(self._id)
             return
+        self.push(shot.name, shot.values)
+
+    def push(self, name, values):
+        """
+        Append the values of TABLE_FIELDS as the latest shot of the lock
+        """
         if not hasattr(self, "_name"):
-            self._name = shot.name
+            self._name = name
         else:
-            assert self._name == shot.name
+            assert self._name == name
 
         self.fresh_lock()
-        if not self._shots[0]:
-            self._shots[0] = shot
+        self._table.push(self._id, values)
+        if not self.has_delta():
             return
-        if not self._shots[1]:
-            self._shots[1] = shot
-        else:
-            #del self._shots[0]
-            self._shots[0] = self._shots[1]
-            self._shots[1] = shot
         self.refresh_flag = True
 
         if not _DEBUG:
@@ -352,11 +868,19 @@ class Lock():
             print("total num line")
             print(num_line)
 
+    def repeat(self):
+        """
+        The lock is not changed since the latest shot, mark it without
+        parsing the line, the lock has no delta until the next shot
+        """
+        self._fresh = 1
+        self._table.repeat(self._id)
+
     def get_line(self, data_field, delta=False):
         """
         Get the the two latest shot according to para data_field
         """
-        data_list = [int(getattr(i, data_field)) for i in self._shots]
+        data_list = [self._table.get(data_field, self._id, i) for i in range(KEEP_HISTORY_CNT)]
         if not delta:
             return data_list
 
@@ -367,16 +891,21 @@ class Lock():
 
         return None
 
-    def get_key_index(self):
+    def get_key_index(self, deltas=None):
         """
         We will accoring the return of this function to sort all the lock
+        Parameters:
+            deltas(dict): The result of compute_deltas to read, see _deltas by default
         """
-        if not self.has_delta():
+        if deltas is None:
+            deltas = self._deltas()
+        # the computed deltas of the Lock(s) that have no delta are 0
+        if deltas is None and not self.has_delta():
             return 0
         avg_key_index = 0
         for level in [LOCK_LEVEL_PR, LOCK_LEVEL_EX]:
             # could use unit='us' to match the output and make the output more significant
-            key_index = self.get_lock_level_info(level, unit='ns')[-1]
+            key_index = self.get_lock_level_info(level, unit='ns', deltas=deltas)[-1]
             #*_, key_index= self.get_lock_level_info(level)
             avg_key_index += key_index
         return avg_key_index/2
@@ -387,11 +916,8 @@ class Lock():
         Get the shot info according to para data_field and index
         """
         try:
-            ret = getattr(self._shots[index], data_field)
-            if ret != None:
-                return ret
-            return 0
-        except:
+            return self._table.get(data_field, self._id, index)
+        except IndexError:
             return None
 
     def _get_latest_data_field_delta(self, data_field):
@@ -399,13 +925,9 @@ class Lock():
         Get the subtraction of the two latest shot according to para data_field
         """
         if not self.has_delta():
-            if self._shots[0] != None:
-                return self._shots[0]
             return 0
         latter = self._get_data_field_indexed(data_field, -1)
         former = self._get_data_field_indexed(data_field, -2)
-        if math.isinf(float(latter)) or math.isinf(float(former)):
-            return float('inf')
         return float(latter) - float(former)
 
     def _get_latest_data_field_delta_abs(self, data_field):
@@ -491,6 +1013,12 @@ class LockSet():
         return self.get_key_index()
     '''
 
+    def __lt__(self, other):
+        """
+        Compare the LockSet(s) by key_index, it is used by the heap of LockSetGroup
+        """
+        return self.key_index < other.key_index
+
     def append(self, lock):
         """
         Add the lock that has same name but on the diff node to the set
@@ -503,121 +1031,76 @@ class LockSet():
         assert lock.node not in self.node_to_lock_dict
         self.node_to_lock_dict[lock.node] = lock
 
-    def _change_float_to_str(self, total_time, total_num, key_index, inf_str):
-        """
-        This function is to change the three mian number that will be showed on screen
-        to int type str, and if some of the three number is inf, it represent there is
-        a hang in the lock, then chang the inf to the inf_str string.
-        """
-        if math.isinf(total_time):
-            total_time_str = str(decimal.Decimal(key_index/1000000).quantize(decimal.Decimal('0.')))+'s'+inf_str
-            total_num_str = str(decimal.Decimal(total_num).quantize(decimal.Decimal('0.')))
-            key_index_str = '--'
-        else:
-            total_time_str = str(decimal.Decimal(str(total_time)).quantize(decimal.Decimal('0.')))
-            total_num_str = str(decimal.Decimal(str(total_num)).quantize(decimal.Decimal('0.')))
-            key_index_str = str(decimal.Decimal(str(key_index)).quantize(decimal.Decimal('0.')))
-        return total_time_str, total_num_str, key_index_str
-
-    def report_once(self):
+    def report_values(self):
         """
-        According to self.node_to_lock_dict splice the simple and detailed string
+        Return the numbers of the lock resource on the cluster and on every node
+        that has the numbers, the lock acquisitions are counted to config
+        Returns:
+            (values, [(node name, values)]), values are the report.VALUES
         """
-        if not self.node_to_lock_dict:
-            return None
-
         res_ex = {"total_time":0, "total_num":0, "key_index":0}
         res_pr = {"total_time":0, "total_num":0, "key_index":0}
-        body = ""
-
-        node_to_lock_dict_len = len(self.node_to_lock_dict)
-        #temp_index = 0
-        hang_time = 0
+        nodes = []
+        # the key_index of a hanged lock is its hang time in ns
+        hang_index = 0
         pr_hang_flag = False
         ex_hang_flag = False
         for _node, _lock in self.node_to_lock_dict.items():
+            # the deltas cover the sample window of the node, which varies
+            # with the collecting time, the rates are comparable
+            window = _node.sample_window() if config.RATE else None
 
             ex_total_time, ex_total_num, ex_key_index = \
                     _lock.get_lock_level_info(LOCK_LEVEL_EX, unit='ns')
-            ex_total_time_str, ex_total_num_str, ex_key_index_str = \
-                self._change_float_to_str(ex_total_time, ex_total_num, ex_key_index, '(hang)')
+            if window:
+                ex_total_time, ex_total_num = ex_total_time/window, ex_total_num/window
 
             if math.isinf(ex_total_time):
-                hang_type = _lock._lock_level_2_hang_field(LOCK_LEVEL_EX)
-                node_hang_time = _lock._get_data_field_indexed(hang_type, -1)
-                hang_time = node_hang_time if node_hang_time > hang_time else hang_time
+                hang_index = max(hang_index, ex_key_index)
                 ex_hang_flag = True
             res_ex["total_time"] += ex_total_time
             res_ex["total_num"] += ex_total_num
             config.ex_locks += ex_total_num
 
-
             pr_total_time, pr_total_num, pr_key_index = \
                     _lock.get_lock_level_info(LOCK_LEVEL_PR, unit='ns')
-            pr_total_time_str, pr_total_num_str, pr_key_index_str = \
-                self._change_float_to_str(pr_total_time, pr_total_num, pr_key_index, '(hang)')
+            if window:
+                pr_total_time, pr_total_num = pr_total_time/window, pr_total_num/window
 
             if math.isinf(pr_total_time):
-                hang_type = _lock._lock_level_2_hang_field(LOCK_LEVEL_PR)
-                node_hang_time = _lock._get_data_field_indexed(hang_type, -1)
-                hang_time = node_hang_time if node_hang_time > hang_time else hang_time
+                hang_index = max(hang_index, pr_key_index)
                 pr_hang_flag = True
             res_pr["total_time"] += pr_total_time
             res_pr["total_num"] += pr_total_num
             config.pr_locks += pr_total_num
             node_name = util.get_hostname() if not _node.name else _node.name
 
-            if util.PY2:
-                node_detail_format = "{0:25}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
-            else:
-                node_detail_format = "{0:21}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
-            #temp_index += 1
-            node_detail_str = ""
             if ex_total_num != 0 or pr_total_num != 0 or pr_total_time != 0 or ex_total_time:
-                node_detail_str = node_detail_format.format(
-                    "├─"+node_name,
-                    ex_total_num_str, ex_total_time_str, ex_key_index_str,
-                    pr_total_num_str, pr_total_time_str, pr_key_index_str)
-                '''
-                node_detail_str = node_detail_format.format(
-                    "└─"+node_name,
-                    ex_total_num, ex_total_time, ex_key_index,
-                    pr_total_num, pr_total_time, pr_key_index)
-                '''
-
-            if node_detail_str != "":
-                if body == "":
-                    body = node_detail_str
-                else:
-                    body = "\n".join([body, node_detail_str])
-
-        tmp_index = body.rfind("├─")
-        body = body[:tmp_index] + "└─" + body[tmp_index+len("└─"):]
+                nodes.append((node_name,
+                              (ex_total_num, ex_total_time, ex_key_index,
+                               pr_total_num, pr_total_time, pr_key_index)))
 
         if res_ex["total_num"] != 0:
             res_ex["key_index"] = res_ex["total_time"]//res_ex["total_num"]
         if res_pr["total_num"] != 0:
             res_pr["key_index"] = res_pr["total_time"]//res_pr["total_num"]
 
+        values = (res_ex["total_num"], res_ex["total_time"],
+                  hang_index if ex_hang_flag else res_ex["key_index"],
+                  res_pr["total_num"], res_pr["total_time"],
+                  hang_index if pr_hang_flag else res_pr["key_index"])
+        return values, nodes
 
-
-        title_format = LockSetGroup.DATA_FORMAT
-        ex_total_time_str, ex_total_num_str, ex_key_index_str = \
-            self._change_float_to_str(res_ex["total_time"], res_ex["total_num"],
-                                      hang_time*1000000 if ex_hang_flag else res_ex["key_index"], '(hang)')
-        pr_total_time_str, pr_total_num_str, pr_key_index_str = \
-            self._change_float_to_str(res_pr["total_time"] , res_pr["total_num"],
-                                      hang_time*1000000 if pr_hang_flag else res_pr["key_index"], '(hang)')
-        title = title_format.format(
-            self.name.short_name,
-            ex_total_num_str, ex_total_time_str, ex_key_index_str,
-            pr_total_num_str, pr_total_time_str, pr_key_index_str)
-        if body != "":
-            lock_set_summary = '\n'.join([title, body])
-        else:
-            lock_set_summary = title
-
-        return {'simple':title, "detailed":lock_set_summary}
+    def report_once(self):
+        """
+        According to self.node_to_lock_dict splice the simple and detailed string
+        """
+        if not self.node_to_lock_dict:
+            return None
+        values, nodes = self.report_values()
+        short_name = self.name.short_name
+        return {'simple': report.format_lock_set(short_name, values, rate=config.RATE),
+                "detailed": report.format_lock_set(short_name, values, nodes, config.RATE)}
 
     def get_key_index(self):
         """
@@ -639,65 +1122,28 @@ class LockSetGroup():
     """
     The group of LockSet, It contains all the infomation that get form all the nodes
     """
-    TITLE_FORMAT = "{0:21}{1:12}{2:12}{3:12}{4:12}{5:12}{6:12}"
-    DATA_FORMAT = "{0:21}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
+    TITLE_FORMAT = report.TITLE_FORMAT
+    DATA_FORMAT = report.DATA_FORMAT
 
     def __init__(self, max_sys_inode_num, lock_space, max_length=600):
+        # the min-heap of the LockSet(s) that have the biggest key_index
         self.lock_set_list = []
         self._max_sys_inode_num = max_sys_inode_num
         self.lock_space = lock_space
         self._debug = self.lock_space._debug
-        self._sort_flag = False
         self._max_length = max_length
 
     def append(self, lock_set):
         """
-        Append lockset to this group, If the length of self.lock_set_list is more than self._max_length,
-        We use a elimination algorithm to eliminate the smallest lock_set in self.lock_set_list,
-        and keep the length of self.lock_set_list always self._max_length
+        Append lockset to this group, the group keeps at most self._max_length
+        LockSet(s) in a min-heap, if the group is full, the new lock_set replaces
+        the smallest one when its key_index is bigger, O(log(self._max_length))
         """
         lock_set.get_key_index()
-        if len(self.lock_set_list) >= self._max_length:
-            new_key_index = lock_set.key_index
-            if new_key_index == 0:
-                return
-            if not self._sort_flag:
-                self.lock_set_list.sort(key=lambda x: x.key_index, reverse=True)
-                self._sort_flag = True
-            begin = 0
-            end = len(self.lock_set_list) - 1
-            while begin <= end:
-                middle = (begin + end)//2
-                if self.lock_set_list[middle].key_index == new_key_index:
-                    self.lock_set_list.insert(middle, lock_set)
-                    del self.lock_set_list[-1]
-                    break
-                elif end - begin == 1:
-                    if begin == 0 and self.lock_set_list[begin].key_index < new_key_index:
-                        self.lock_set_list.insert(begin, lock_set)
-                    elif end == len(self.lock_set_list) - 1 \
-                         and self.lock_set_list[end].key_index > new_key_index:
-                        break
-                    else:
-                        self.lock_set_list.insert(end, lock_set)
-                    del self.lock_set_list[-1]
-                    break
-                elif self.lock_set_list[middle].key_index > new_key_index:
-                    if begin == end and begin != len(self.lock_set_list)-1:
-                        self.lock_set_list.insert(middle+1, lock_set)
-                        del self.lock_set_list[-1]
-                        break
-                    else:
-                        begin = middle
-                elif self.lock_set_list[middle].key_index < new_key_index:
-                    if begin == end:
-                        self.lock_set_list.insert(begin, lock_set)
-                        del self.lock_set_list[-1]
-                        break
-                    else:
-                        end = middle
-        else:
-            self.lock_set_list.append(lock_set)
+        if len(self.lock_set_list) < self._max_length:
+            heapq.heappush(self.lock_set_list, lock_set)
+        elif self.lock_set_list[0].key_index < lock_set.key_index:
+            heapq.heapreplace(self.lock_set_list, lock_set)
 
     def filter_zero(self, index_list):
         """
@@ -717,83 +1163,94 @@ class LockSetGroup():
     def get_top_n_key_index(self, top_n, debug=False):
         """
         According LockSet method get_key_index to sort the group,
-        and return the top n lock set
+        and return the top n lock set, the system inodes are filtered
+        before the ranking if not debug
         """
-        if not top_n:
-            rows, cols = os.popen('stty size', 'r').read().split()
-            if int(cols) < config.COLUMNS:
-                top_n = (int(rows)//2 - 4)
-            else:
-                top_n = (int(rows) - 6)
-            config.ROWS = top_n
-        if not self._sort_flag:
-            self.lock_set_list.sort(key=lambda x: x.key_index, reverse=True)
-        if debug:
-            if len(self.lock_set_list) > top_n:
-                return self.filter_zero(self.lock_set_list[:top_n])
-            return self.filter_zero(self.lock_set_list)
-        ret = []
-        for i in self.lock_set_list:
-            if int(i.inode_num) > self._max_sys_inode_num:
-                ret.append(i)
-                if len(ret) == top_n:
-                    return self.filter_zero(ret)
-        return self.filter_zero(ret)
+        lock_sets = self.lock_set_list
+        if not debug:
+            lock_sets = [i for i in lock_sets if int(i.inode_num) > self._max_sys_inode_num]
+        return self.filter_zero(heapq.nlargest(top_n, lock_sets, key=lambda x: x.key_index))
 
-    def report_once(self, top_n):
+    def report_record(self, top_n, report_time=None):
         """
-        Accordng the para top_n, splice the "simple" and "detailed" format string
+        Accordng the para top_n, return the record of the report, which has the
+        numbers of the top n lock resources, see report.new_record
+        Parameters:
+            report_time(float): The time of the report, now by default
         """
-        self.sort_flag = False
-        time_stamp = str(util.now())
+        if report_time is None:
+            time_stamp = str(util.now())
+        else:
+            time_stamp = str(datetime.datetime.fromtimestamp(report_time))
         if '.' in time_stamp:
             time_stamp = time_stamp.split('.')[0]
         top_n_lock_set = self.get_top_n_key_index(top_n, debug=self._debug)
-        what = LockSetGroup.TITLE_FORMAT.format(
-            "TYPE INO  ", "EX NUM", "EX TIME(ns)", "EX AVG(ns)",
-            "PR NUM", "PR TIME(ns)", "PR AVG(ns)")
-        lsg_report_simple = ""
-        lsg_report_simple += time_stamp + " lock acquisitions: total {0}, EX {1}, PR {2}\n"
-        lsg_report_simple += "lock resources: {3}\n\n"
-        lsg_report_simple += what + "\n"
-
-        lsg_report_detailed = lsg_report_simple
-
-        for lock_set in top_n_lock_set:
-            lock_set_report = lock_set.report_once()
-            lsg_report_simple += lock_set_report['simple'] + '\n'
-            lsg_report_detailed += lock_set_report['detailed'] + '\n'
-        types = ""
-        lsg_report_simple = lsg_report_simple[:-1]
-        lsg_report_detailed = lsg_report_detailed[:-1]
-        total_value = 0
-        for key, value in sorted(self.lock_space._lock_types.items(),
-                                 key=lambda x: x[1],
-                                 reverse=True):
-            types += "{0} {1}, ".format(key, value)
-            total_value += value
-        types = "total {0}, ".format(total_value) + types
-        types = types[:-2]
-        lsg_report_simple = lsg_report_simple.format(config.ex_locks + config.pr_locks,
-                                                     config.ex_locks,
-                                                     config.pr_locks,
-                                                     types)
-        lsg_report_detailed = lsg_report_detailed.format(config.ex_locks + config.pr_locks,
-                                                         config.ex_locks,
-                                                         config.pr_locks,
-                                                         types)
+        lock_set_values = [lock_set.report_values() for lock_set in top_n_lock_set]
+        record = report.new_record(time_stamp, config.RATE,
+                                   (config.ex_locks, config.pr_locks),
+                                   sorted(self.lock_space._lock_types.items(),
+                                          key=lambda x: x[1],
+                                          reverse=True),
+                                   self.lock_space.stale_nodes)
+        for lock_set, (values, nodes) in zip(top_n_lock_set, lock_set_values):
+            report.append_lock_set(record, lock_set.name.short_name, values, nodes)
         self.lock_space._lock_types = {}
         config.ex_locks = 0
         config.pr_locks = 0
+        return record
 
-        return {"simple": lsg_report_simple, "detailed": lsg_report_detailed}
+    def report_once(self, top_n):
+        """
+        Accordng the para top_n, splice the "simple" and "detailed" format string
+        """
+        record = self.report_record(top_n)
+        return {"simple": report.format_report(record),
+                "detailed": report.format_report(record, detailed=True)}
 
 class Node:
     def __init__(self, lock_space, node_name=None):
         self._lock_space = lock_space
         self._locks = {}
-        self.major, self.minor, self.mount_point = \
-            util.lockspace_to_device(self._lock_space.name, node_name)
+        self._shot_table = ShotTable()
+        # The lines of the previous locking_state that are not waiting, and
+        # the lines of the current one, {hash(raw_string): (Lock, crc32)}, the
+        # hash instead of the line is kept, so the locking_state is not copied,
+        # and the crc32 is checked on a hit, so a collision is parsed again
+        self._last_lines = {}
+        self._lines = {}
+        self._unchanged_cnt = 0
+        # The names of the last result of parse_chunk and their Lock(s)
+        self._parsed_names = None
+        self._parsed_locks = []
+        # The accounting of the interval, only the node worker updates them,
+        # and the LockSpace merges them at the report barrier
+        self._new_locks = []
+        self._changed_lock_names = []
+        self._lock_types = {}
+        # The worker holds the mutex when processing, the report of a late
+        # node that is processing doesn't wait for it, see busy_snapshot
+        self.mutex = threading.Lock()
+        # The (ShotTable.deltas, sample window) when the worker finished the
+        # last locking_state, the deltas are None without numpy or any data
+        self.snapshot = (None, None)
+        # The snapshot that the report reads instead of the ShotTable while
+        # the worker is processing, None means the ShotTable is read; without
+        # numpy the Lock(s) of a busy node are still read from the ShotTable
+        self.busy_snapshot = None
+        # The time that the last locking_state is processed, None means no data
+        self.update_time = None
+        # The sample times of the last KEEP_HISTORY_CNT locking_state, the
+        # time that the locking_state is read, in seconds since the epoch
+        self.sample_times = []
+        # The Lock(s) in the order of their ids, only for the replay
+        self._replay_locks = []
+        # The cat of the node, created by the first collect and then reused
+        self._cat = None
+        if lock_space.offline:
+            self.major, self.minor, self.mount_point = 0, 0, None
+        else:
+            self.major, self.minor, self.mount_point = \
+                util.lockspace_to_device(self._lock_space.name, node_name)
         self._node_name = node_name
 
 
@@ -808,6 +1265,10 @@ class Node:
     def locks(self):
         return self._locks
 
+    @property
+    def shot_table(self):
+        return self._shot_table
+
     def __str__(self):
         ret = "lock space: {0}\n mount point: {1}".format(
             self._lock_space.name, self.mount_point)
@@ -817,104 +1278,368 @@ class Node:
     def lock_space(self):
         return self._lock_space
 
+    def sample_window(self):
+        """
+        Return the seconds between the two latest samples, which the deltas of
+        the Lock(s) cover, or None if there are less than two samples
+        """
+        if self.busy_snapshot is not None:
+            return self.busy_snapshot[1]
+        return self._sample_window()
+
+    def _sample_window(self):
+        """
+        The implement of sample_window, it reads the sample times
+        """
+        if len(self.sample_times) < KEEP_HISTORY_CNT:
+            return None
+        window = self.sample_times[-1] - self.sample_times[-2]
+        return window if window > 0 else None
+
     def process_one_shot(self, raw_string):
         """
-        Trun the raw_string to a Shot object
+        Parse the raw_string and push the values to the ShotTable of the node
         parameters:
             raw_string: is a line form file locking_state
-        """
-        shot = Shot(raw_string)
-        if not shot.legal():
-            return
-        shot_name = shot.name
-        if shot_name not in self._locks:
+        Returns:
+            The Lock that got a new shot and may has the delta, or None
+        """
+        line_hash = hash(raw_string)
+        digest = _line_digest(raw_string)
+        last_line = self._last_lines.get(line_hash)
+        if last_line is not None and last_line[0].has_shot() and last_line[1] == digest:
+            # the line is same as the previous one, the lock has no delta
+            last_line[0].repeat()
+            self._unchanged_cnt += 1
+            self._lines[line_hash] = last_line
+            return None
+        shot_name, values, lock_wait = _parse_shot(raw_string)
+        if shot_name is None:
+            return None
+        lock = self._locks.get(shot_name)
+        if lock is None:
             lock_tmp = Lock(self)
-            lock_tmp.append(shot)
+            lock_tmp.push(shot_name, values)
             self._locks[shot_name] = lock_tmp
+            self._new_locks.append(lock_tmp)
         else:
-            self._locks[shot_name].append(shot)
-            if self._locks[shot_name].get_key_index() > 0:
-                self._lock_space.add_lock_type(shot_name)
-        self._lock_space.add_lock_name(shot_name)
-        # self._lock_space.add_lock_type(shot_name)
-
-    def del_unfreshed_node(self):
-        for key in self._locks.keys():
-            if self._locks[key].refresh_flag == False:
-                self._locks.pop(key)
-            else:
-                self._locks[key].refresh_flag = False
+            lock.push(shot_name, values)
+        if not lock_wait:
+            # the hang time of a waiting lock changes even if the line doesn't
+            self._lines[line_hash] = (self._locks[shot_name], digest)
+        return lock
 
-    def add_last_slot_to_unfreshed_node(self):
-        for key in self._locks.keys():
-            if not self._locks[key].refresh_flag:
-                if self._locks[key]._shots:
-                    self._locks[key].append(self._locks[key]._shots[-1])
+    def process_parsed(self, parsed):
+        """
+        Push the values that parsed by parse_chunk to the ShotTable of the node
+        parameters:
+            parsed: the result of parse_chunk
+        Returns:
+            The list of the Lock(s) that got a new shot and may has the delta
+        """
+        names, counters, hang_times = parsed
+        if not names:
+            return []
+        counter_len = len(COUNTER_FIELDS)
+        hang_len = len(HANG_FIELDS)
+        counters = array.array(COUNTER_TYPECODE, counters)
+        hang_times = array.array('d', hang_times)
+        if names == self._parsed_names:
+            # the same locks in the same order as the last time, which is the
+            # most of the dumps of a node, the names are not looked up
+            pushed_locks = list(self._parsed_locks)
+            for lock in pushed_locks:
+                lock.fresh_lock()
+            lock_ids = [lock.lock_id for lock in pushed_locks]
+            indexes = range(len(pushed_locks))
+        else:
+            pushed_locks = []
+            lock_ids = []
+            indexes = []
+            parsed_locks = []
+            for i, name in enumerate(names.split("\n")):
+                # LockName is hashed and compared as its str
+                lock = self._locks.get(name)
+                if lock is None:
+                    shot_name = LockName(name)
+                    lock = Lock(self)
+                    lock.push(shot_name, counters[i*counter_len : (i+1)*counter_len].tolist() +
+                              hang_times[i*hang_len : (i+1)*hang_len].tolist())
+                    self._locks[shot_name] = lock
+                    self._new_locks.append(lock)
                 else:
-                    self._locks.pop(key)
-            self._locks[key].refresh_flag = False
-
-    def process_all_slot_worker(self, raw_slot_strs, run_once_finished_semaphore):
+                    lock.fresh_lock()
+                    pushed_locks.append(lock)
+                    lock_ids.append(lock.lock_id)
+                    indexes.append(i)
+                parsed_locks.append(lock)
+            self._parsed_names = names
+            self._parsed_locks = parsed_locks
+        if not lock_ids:
+            return pushed_locks
+        # the locks that are the same as their latest shot are repeated, like
+        # the unchanged lines, so only the changed ones are pushed and ranked
+        changed = self._shot_table.changed(lock_ids, indexes, counters, hang_times)
+        if changed is not None:
+            lock_ids = numpy.array(lock_ids, dtype=numpy.int64)
+            self._shot_table.repeat_many(lock_ids[~changed])
+            keep = numpy.nonzero(changed)[0]
+            pushed_locks = [pushed_locks[i] for i in keep]
+            lock_ids = lock_ids[keep]
+            indexes = numpy.array(indexes, dtype=numpy.int64)[keep]
+        # push the shots of the existing locks at once
+        self._shot_table.push_many(lock_ids, indexes, counters, hang_times)
+        return pushed_locks
+
+    def process_all_slot_worker(self, raw_slot_strs, run_once_finished_semaphore,
+                                sample_time=None):
         """
         The worker that process the file locking state, the method will be use as a thread method
+        parameters:
+            raw_slot_strs: the bytes buffer of one locking_state, or the list of lines,
+                           or the tuple that parsed by parse_chunk
+            run_once_finished_semaphore: released when it is finished, even if it
+                                         fails, None means no one waits
+            sample_time(float): the time that the locking_state is read, now by default
         """
+        try:
+            with self.mutex:
+                changes = self._process_all_slot(raw_slot_strs)
+                self.update_time = time.time()
+                self.sample_times.append(sample_time if sample_time else self.update_time)
+                if self._lock_space.offline:
+                    # the ages of the stale nodes are in the time of the samples
+                    self.update_time = self.sample_times[-1]
+                del self.sample_times[:-KEEP_HISTORY_CNT]
+                self.snapshot = (self._shot_table.deltas, self._sample_window())
+                recorder = self._lock_space.recorder
+                if recorder is not None:
+                    recorder.record_sample(self.record_sample(recorder, self.sample_times[-1],
+                                                              *changes))
+        finally:
+            # a malformed line or an error of the recorder doesn't make the
+            # node late forever, it is collected again in the next interval
+            if run_once_finished_semaphore is not None:
+                run_once_finished_semaphore.release()
+
+    def _process_all_slot(self, raw_slot_strs):
+        """
+        Process the file locking state, see process_all_slot_worker
+        Returns:
+            (new_locks, pushed_locks, cleared_ids): The Lock(s) that are created,
+            the other Lock(s) that got a new shot, and the lock ids that are
+            cleared in this sample
+        """
+        parse_pool = self._lock_space.parse_pool
+        pushed_locks = []
+        new_start = len(self._new_locks)
+        cleared_ids = []
+        if isinstance(raw_slot_strs, tuple):
+            # the locking_state is already parsed, e.g. a captured dump
+            pushed_locks.extend(self.process_parsed(raw_slot_strs))
+            raw_slot_strs = []
+        elif parse_pool is not None and isinstance(raw_slot_strs, bytes):
+            # parse the line ranges in the parse processes, the lines are
+            # not kept, so every line is pushed
+            chunks = split_chunks(raw_slot_strs, self._lock_space.parse_processes)
+            for parsed in parse_pool.map(parse_chunk, chunks):
+                pushed_locks.extend(self.process_parsed(parsed))
+            raw_slot_strs = []
+        elif isinstance(raw_slot_strs, bytes):
+            # iterate the lines of the buffer one by one, without splitting
+            # the whole buffer into a list
+            raw_slot_strs = io.BytesIO(raw_slot_strs)
+        last_lines = self._last_lines
+        lines = self._lines
         for i in raw_slot_strs:
-            self.process_one_shot(i)
+            # the same check as process_one_shot, inlined for the unchanged
+            # lines, which are the most in the short interval
+            line_hash = hash(i)
+            last_line = last_lines.get(line_hash)
+            if last_line is not None and last_line[0].has_shot() and \
+                    last_line[1] == _line_digest(i):
+                last_line[0].repeat()
+                self._unchanged_cnt += 1
+                lines[line_hash] = last_line
+            elif i.strip():
+                lock = self.process_one_shot(i)
+                if lock is not None:
+                    pushed_locks.append(lock)
+        if config.DEBUG:
+            print("[DEBUG] {0} lines are unchanged on node {1}".format(
+                self._unchanged_cnt, self._node_name))
+        self._unchanged_cnt = 0
+        self._last_lines = self._lines
+        self._lines = {}
         for lock_name, lock_obj in self._locks.items():
             lock_obj.un_fresh_lock()
             if not lock_obj.is_fresh_lock():
+                    if lock_obj.has_shot():
+                        cleared_ids.append(lock_obj.lock_id)
                     lock_obj.append(None)
                 #del self._locks[lock_name]
-        run_once_finished_semaphore.release()
+        self._account(pushed_locks)
+        return self._new_locks[new_start:], pushed_locks, cleared_ids
+
+    def _account(self, pushed_locks):
+        """
+        Compute the deltas of the node once all the shots are pushed, and count
+        the pushed Lock(s) that have the delta in the accounting of the interval
+        """
+        self._shot_table.compute_deltas()
+        # the worker reads its own ShotTable, even if the report reads the snapshot
+        deltas = self._shot_table.deltas
+        lock_types = self._lock_types
+        for lock in pushed_locks:
+            if lock.get_key_index(deltas) > 0:
+                self._changed_lock_names.append(lock.name)
+                lock_type = lock.lock_type
+                lock_types[lock_type] = lock_types.get(lock_type, 0) + 1
+
+    def replay_sample(self, sample, keyframe=False):
+        """
+        Push the recording.Sample of the node to the ShotTable, the same as
+        processing the locking_state of the sample
+        Parameters:
+            keyframe(bool): The sample is the whole ShotTable, which starts a
+                            rotated file, it is skipped if the node has Lock(s)
+        """
+        with self.mutex:
+            table = self._shot_table
+            if keyframe and len(table):
+                return
+            # the locks that are not in the sample are unchanged
+            table.repeat_all()
+            counter_len = len(COUNTER_FIELDS)
+            hang_len = len(HANG_FIELDS)
+            for i, name in enumerate(sample.names):
+                lock_name = LockName(name)
+                lock = Lock(self)
+                assert lock.lock_id == sample.first_new_id + i
+                lock.push(lock_name,
+                          sample.new_counters[i*counter_len : (i+1)*counter_len].tolist() +
+                          sample.new_hangs[i*hang_len : (i+1)*hang_len].tolist())
+                self._locks[lock_name] = lock
+                self._new_locks.append(lock)
+                self._replay_locks.append(lock)
+            table.push_many(sample.abs_ids, range(len(sample.abs_ids)),
+                            sample.abs_counters, sample.abs_hangs)
+            table.push_deltas(sample.delta_ids, sample.delta_counters, sample.delta_hangs)
+            for lock_id in sample.cleared_ids:
+                self._replay_locks[lock_id].append(None)
+            pushed_locks = [self._replay_locks[i] for i in sample.abs_ids]
+            pushed_locks += [self._replay_locks[i] for i in sample.delta_ids]
+            self._account(pushed_locks)
+            # the ages and the rates are in the time of the recording
+            self.update_time = sample.time
+            self.sample_times.append(sample.time)
+            del self.sample_times[:-KEEP_HISTORY_CNT]
+            self.snapshot = (table.deltas, self._sample_window())
+
+    def record_sample(self, recorder, sample_time, new_locks, pushed_locks, cleared_ids):
+        """
+        Return the recording.Sample of the changes of the ShotTable in a sample,
+        see _process_all_slot
+        """
+        table = self._shot_table
+        sample = recording.Sample(recorder.node_ids[self._node_name], sample_time)
+        if new_locks:
+            # the ids of the new locks are allocated one by one
+            sample.first_new_id = new_locks[0].lock_id
+            sample.names = [str(i.name) for i in new_locks]
+            sample.new_counters, sample.new_hangs = table.latest([i.lock_id for i in new_locks])
+        abs_ids = []
+        delta_ids = []
+        for lock in pushed_locks:
+            if table.counts[lock.lock_id] >= KEEP_HISTORY_CNT:
+                delta_ids.append(lock.lock_id)
+            else:
+                abs_ids.append(lock.lock_id)
+        sample.abs_ids = array.array(recording.ID_TYPECODE, abs_ids)
+        sample.abs_counters, sample.abs_hangs = table.latest(abs_ids)
+        sample.delta_ids = array.array(recording.ID_TYPECODE, delta_ids)
+        sample.delta_counters, sample.delta_hangs = table.latest(delta_ids, deltas=True)
+        sample.cleared_ids = array.array(recording.ID_TYPECODE, cleared_ids)
+        return sample
+
+    def keyframe(self, recorder):
+        """
+        Return the recording.Sample of the whole ShotTable, the latest values
+        of all the locks, the locks that have no shot are cleared
+        """
+        table = self._shot_table
+        names = [None] * len(table)
+        for lock in self._locks.values():
+            names[lock.lock_id] = str(lock.name)
+        sample = recording.Sample(recorder.node_ids[self._node_name],
+                                  self.sample_times[-1] if self.sample_times else 0,
+                                  0, names)
+        sample.new_counters, sample.new_hangs = table.latest(range(len(table)))
+        sample.cleared_ids = array.array(recording.ID_TYPECODE,
+                                         [i for i in range(len(table)) if not table.counts[i]])
+        return sample
+
+    def pop_accounting(self):
+        """
+        Return the accounting of the interval and reset it, it must be called
+        when the node worker is finished
+        Returns:
+            (new_locks, changed_lock_names, lock_types)
+        """
+        ret = (self._new_locks, self._changed_lock_names, self._lock_types)
+        self._new_locks = []
+        self._changed_lock_names = []
+        self._lock_types = {}
+        return ret
 
-    def run_once_consumer(self, sort_finished_semaphore, run_once_finished_semaphore):
+    def get_cat(self):
         """
-        The concumer of the productor-consumer module, it get the raw_date form productor
-        and use a thread to process the raw string.
+        Return the cat of the node, it is created once, so the remote node's
+        ssh connection and the stream of the remote loop can be reused
         """
-        while True:
-            # the next line must before semaphore,
-            (raw_slot_strs, sleep_time) = yield ''
-            sort_finished_semaphore.acquire()
-            if not raw_slot_strs:
-                run_once_finished_semaphore.release()
-                continue
-            if config.DEBUG:
-                print("[DEBUG] got the data on node {0}".format(self._node_name))
-            consumer_process = threading.Thread(target=self.process_all_slot_worker,
-                                                args=(raw_slot_strs, run_once_finished_semaphore))
-            consumer_process.daemon = True
-            consumer_process.start()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-
+        if self._cat is None:
+            if self.is_local_node():
+                self._cat = cat.gen_cat('local', self.lock_space.name)
+            elif config.STREAM:
+                self._cat = cat.gen_cat('stream', self.lock_space.name, self.name,
+                                        config.INTERVAL, config.DELTA, config.COMPRESS)
+            else:
+                self._cat = cat.gen_cat('ssh', self.lock_space.name, self.name,
+                                        config.COMPRESS)
+        return self._cat
 
-    def run_once(self, consumer):
+    def collect(self, run_once_finished_semaphore):
         """
-        The productor of the productor and consumer module, it get the raw string by _cat,
-        and sent the raw string to consumer
+        Collect the node once, the task that the LockSpace submits to the worker
+        pool on the tick of the sampling, it gets the raw string by the cat of
+        the node and processes it in the same worker
+        Parameters:
+            run_once_finished_semaphore: Released once the raw string is processed,
+                                         or the cat gets nothing or fails
         """
-        if util.PY2:
-            consumer.next()
-        else:
-            consumer.__next__()
-        while True:
+        try:
+            _cat = self.get_cat()
             start = time.time()
-            if self.is_local_node():
-                _cat = cat.gen_cat('local', self.lock_space.name)
-            else:
-                _cat = cat.gen_cat('ssh', self.lock_space.name, self.name)
             raw_slot_strs = _cat.get()
-            cat_time = time.time() - start
+        except Exception:
+            run_once_finished_semaphore.release()
+            raise
+        if config.DEBUG:
+            print("[DEBUG] cat takes {0}s on node {1}".format(time.time() - start,
+                                                              self._node_name))
+        if not raw_slot_strs:
+            run_once_finished_semaphore.release()
+            return
+        if _cat.paced:
+            # the remote loop reads the locking_state on the boundary by itself,
+            # the cat returns its latest frame, the older ones are skipped
+            start = _cat.timestamp
             if config.DEBUG:
-                print("[DEBUG] cat takes {0}s on node {1}".format(cat_time, self._node_name))
-            if self._lock_space.first_run:
-                consumer.send((raw_slot_strs, 1-cat_time-cat_time))
-            else:
-                #consumer.send((raw_slot_strs, config.INTERVAL-cat_time-cat_time))
-                consumer.send((raw_slot_strs, config.INTERVAL-cat_time-cat_time))
-        consumer.close()
-
+                print("[DEBUG] {0} frames are skipped on node {1}".format(
+                    _cat.skipped_frames, self._node_name))
+        if config.DEBUG:
+            print("[DEBUG] got the data on node {0}".format(self._node_name))
+        self.process_all_slot_worker(raw_slot_strs, run_once_finished_semaphore, start)
 
     def __contains__(self, item):
         return item in self._locks
@@ -929,18 +1654,43 @@ class LockSpace:
     """
     One lock space on multiple node
     """
-    def __init__(self, node_name_list, lock_space, max_sys_inode_num, debug, display_len=10):
+    def __init__(self, node_name_list, lock_space, max_sys_inode_num, debug, display_len=10,
+                 geometry=None, offline=False):
         #pdb.set_trace()
-        self._mutex = threading.Lock()
         self._max_sys_inode_num = max_sys_inode_num
         self._debug = debug
         self._display_len = display_len
+        # The terminal.Geometry that is updated by the keyboard process, the
+        # lock resources that fit the terminal are reported if no display_len
+        self.geometry = geometry
+        # The recording.Recorder of the samples and the reports, None means
+        # not recording
+        self.recorder = None
+        # The Node(s) don't read the locking_state of the cluster, they are
+        # replayed from a recording
+        self.offline = offline
         self._name = lock_space
         self._nodes = {} #node_list[i] : Node
-        self._lock_names = []
+        # The LockSet of every lock name on the lockspace, it is kept
+        # across the intervals and updated once a new lock is found
+        self._lock_sets = {}
+        # The names of the locks that have the delta in this interval
+        self._changed_lock_names = set()
         self._lock_types = {}
+        # The accounting of the last interval that merged of every node,
+        # {node name: (changed_lock_names, lock_types)}, a stale node's last
+        # data is reported again
+        self._last_accounting = {}
+        # The [(node name, age of the data)] of the nodes that missed the
+        # deadline of the report, the age is None if the node has no data
+        self.stale_nodes = []
+        # The process pool that parses the locking_state, None means parsing
+        # in the threads of the worker pool
+        self.parse_pool = None
+        self.parse_processes = 0
         self.should_stop = False
-        self._thread_list = []
+        # The (cpu time, time) of the process when the pool stats are printed
+        self._cpu_sample = None
         self.first_run = True
         if node_name_list is None:
             # node name None means this is a local node
@@ -956,55 +1706,193 @@ class LockSpace:
         """
         self.should_stop = True
 
+    def terminate_parse_pool(self):
+        """
+        Terminate the parse processes if there are
+        """
+        if self.parse_pool is not None:
+            self.parse_pool.terminate()
+            self.parse_pool = None
+
     def run(self, printer_queue, interval=5, ):
         """
         The main code of o2locktop
         """
-        self._lock_names = []
-        self._thread_list = []
         self.run_once_finished_semaphore = []
-        self.sort_finished_semaphore = []
+        # the nodes are collected and processed by the fixed count of workers,
+        # a worker runs the cat of a node and then processes its locking_state,
+        # so the count of the threads doesn't grow with the nodes
+        self._worker_pool = pool.WorkerPool(min(config.WORKERS, len(self._nodes)))
+        if config.PARSE_PROCESSES:
+            self.parse_processes = config.PARSE_PROCESSES
+            self.parse_pool = create_parse_pool(self.parse_processes)
+        barrier = []
         for _, node in self._nodes.items():
             temp_run_once_finished_semaphore = threading.Semaphore(0)
             self.run_once_finished_semaphore.append(temp_run_once_finished_semaphore)
-            temp_sort_finished_semaphore = threading.Semaphore(1)
-            self.sort_finished_semaphore.append(temp_sort_finished_semaphore)
-            thread = threading.Thread(
-                target=node.run_once,
-                args=(node.run_once_consumer(temp_sort_finished_semaphore,
-                                             temp_run_once_finished_semaphore),))
-            self._thread_list.append(thread)
-        for thread in self._thread_list:
-            thread.start()
+            barrier.append((node, temp_run_once_finished_semaphore))
         if config.DEBUG:
-            print("[DEBUG] the length of thread list is {0}".format(len(self._thread_list)))
+            print("[DEBUG] {0} workers collect {1} nodes".format(self._worker_pool.workers,
+                                                                 len(barrier)))
+        if self.recorder is not None:
+            self.recorder.start({"version": config.VERSION,
+                                 "lockspace": self._name,
+                                 "max_sys_inode_num": self._max_sys_inode_num,
+                                 "debug": self._debug,
+                                 "interval": interval,
+                                 "hostname": util.get_hostname()},
+                                [node.name for node in self.node_list])
+        # all the nodes are sampled on the ticks of the same scheduler
+        self._scheduler = scheduler.Scheduler(interval)
+        ready = barrier
         while not self.should_stop:
-            start = time.time()
+            self._scheduler.wait()
+            for node, run_once_finished in ready:
+                self._worker_pool.submit(node.name, node.collect, run_once_finished)
             if config.DEBUG:
-                print("[DEBUG] the length of semaphore list is {0}"
-                      .format(len(self.run_once_finished_semaphore)))
-            for semaphore in self.run_once_finished_semaphore:
-                semaphore.acquire()
-            lock_space_report = self.report_once()
-            printer_queue.put({'msg_type':'new_content',
-                               'simple':lock_space_report['simple'],
-                               'detailed':lock_space_report['detailed'],
-                               'rows':config.ROWS})
+                print("[DEBUG] the length of semaphore list is {0}, {1} ticks are missed"
+                      .format(len(self.run_once_finished_semaphore), self._scheduler.missed))
+            # wait for every node until the next tick, a slow or hung node
+            # doesn't stall the report of the others, it is reported with its
+            # last data, and its data is merged at the barrier it arrives
+            deadline = self._scheduler.next_tick()
+            finished = []
+            late = []
+            for node, run_once_finished in barrier:
+                if util.acquire(run_once_finished, deadline - util.monotonic()):
+                    finished.append((node, run_once_finished))
+                else:
+                    late.append(node)
             if config.DEBUG:
-                num_of_len = len(self._nodes)
-                print("[DEBUG] the num of locke to release is {0}".format(num_of_len))
-            for semaphore in self.sort_finished_semaphore:
-                semaphore.release()
-            end = time.time()
-            if not self.first_run:
-                new_interval = interval - (end - start)
-                if new_interval > 0:
-                    util.sleep(new_interval)
-            else:
-                new_interval = 1 - (end - start)
-                if new_interval > 0:
-                    util.sleep(new_interval)
-                self.first_run = False
+                self.print_pool_stats()
+                for node in late:
+                    print("[DEBUG] node {0} missed the deadline".format(node.name))
+            # a late node may be processing, the report doesn't wait for it, the
+            # Lock(s) of a busy node are read from the snapshot that its worker
+            # took at the end of the last locking_state
+            idle = []
+            busy = []
+            for node in late:
+                if util.acquire(node.mutex, deadline - util.monotonic()):
+                    idle.append(node)
+                else:
+                    node.busy_snapshot = node.snapshot
+                    busy.append(node)
+            try:
+                lock_space_report = self.report_once([i[0] for i in finished])
+                if self.recorder is not None:
+                    # the keyframes are consistent only if all the nodes are
+                    # idle, the rotation waits for the next report otherwise
+                    self.recorder.record_report(
+                        time.time(),
+                        [self.recorder.node_ids[i[0].name] for i in finished],
+                        self.keyframes, rotate=not busy)
+            finally:
+                for node in idle:
+                    node.mutex.release()
+                for node in busy:
+                    node.busy_snapshot = None
+            if config.DEBUG:
+                for node in busy:
+                    print("[DEBUG] node {0} is reported from its snapshot".format(node.name))
+            printer_queue.put({'msg_type':'new_report',
+                               'report':lock_space_report,
+                               'rows':0 if self._display_len else self.top_n()})
+            # only the finished nodes are collected on the next tick, a late
+            # node is still working on the current one
+            ready = finished
+            self.first_run = False
+
+    def replay(self, printer_queue, frames, speed=1, seek=None):
+        """
+        Replay the frames of a recording through the LockSpace, the samples are
+        pushed to the Node(s) and the reports are ranked the same as run, in
+        the time of the recording
+        Parameters:
+            frames(iterable): The (frame type, payload) of recording.read_frames
+            speed(float): The times of the real time, 0 means as fast as possible
+            seek(float): The reports before the time are skipped, their samples
+                         are still pushed, so the first report has the deltas
+        Returns:
+            (reports, samples): The count of the reports and the samples replayed
+        """
+        nodes = list(self.node_list)
+        # (the time of the first report, the monotonic time it is put)
+        start = None
+        reports = 0
+        samples = 0
+        for frame_type, payload in frames:
+            if self.should_stop:
+                break
+            if frame_type in (recording.FRAME_SAMPLE, recording.FRAME_KEYFRAME):
+                sample = recording.Sample.decode(payload)
+                nodes[sample.node_id].replay_sample(sample,
+                                                    frame_type == recording.FRAME_KEYFRAME)
+                samples += 1
+                continue
+            if frame_type != recording.FRAME_REPORT:
+                continue
+            report_time, node_ids = recording.decode_report(payload)
+            finished = [nodes[i] for i in node_ids]
+            if seek is not None and report_time < seek:
+                # keep the LockSet(s) only, the interval is not reported
+                self.merge_nodes(finished)
+                self._changed_lock_names = set()
+                self._lock_types = {}
+                continue
+            if speed:
+                if start is None:
+                    start = (report_time, util.monotonic())
+                delay = start[1] + (report_time - start[0]) / speed - util.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            lock_space_report = self.report_once(finished, report_time)
+            if printer_queue is not None:
+                printer_queue.put({'msg_type':'new_report',
+                                   'report':lock_space_report,
+                                   'rows':0 if self._display_len else self.top_n()})
+            reports += 1
+        if config.DEBUG:
+            print("[DEBUG] {0} reports and {1} samples are replayed".format(reports, samples))
+        return reports, samples
+
+    def keyframes(self):
+        """
+        Return the recording.Sample(s) of the whole ShotTable of every node,
+        they start a rotated file of the recording
+        """
+        return [node.keyframe(self.recorder) for node in self.node_list]
+
+    def top_n(self):
+        """
+        Return the count of the lock resources in the report, the display_len
+        if it is given, else the rows that fit the terminal
+        """
+        if self._display_len:
+            return self._display_len
+        if self.geometry is not None:
+            return self.geometry.top_n
+        return terminal.top_n(terminal.DEFAULT_SIZE)
+
+    def print_pool_stats(self):
+        """
+        Print the queue depth of the worker pool, the processing time of every node
+        and the cpu usage of the lockspace process since the last time
+        """
+        cpu_time = sum(os.times()[:2])
+        now = time.time()
+        if self._cpu_sample is not None:
+            print("[DEBUG] the lockspace process uses {0:.1%} cpu"
+                  .format((cpu_time - self._cpu_sample[0]) / (now - self._cpu_sample[1])))
+        self._cpu_sample = (cpu_time, now)
+        stats = self._worker_pool.stats()
+        print("[DEBUG] worker pool: {0} workers, queue depth {1}, max queue depth {2}"
+              .format(stats["workers"], stats["depth"], stats["max_depth"]))
+        for key, value in stats["keys"].items():
+            print("[DEBUG] node {0} processed {1} times, last {2:.3f}s, avg {3:.3f}s, "
+                  "max {4:.3f}s, avg wait in queue {5:.3f}s"
+                  .format(key, value["count"], value["last"], value["total"]/value["count"],
+                          value["max"], value["wait"]/value["count"]))
 
     @property
     def name(self):
@@ -1031,63 +1919,88 @@ class LockSpace:
 
     def lock_name_to_lock_set(self, lock_name):
         """
-        According the lock_name generate a LockSet object,
-        collect the lock with para lock_name on different nodes,
-        and push them in a LockSet object. 
+        Return the LockSet of the lock_name, which collects the lock with
+        para lock_name on different nodes
         """
-        lock_set = LockSet()
-        for node in self.node_list:
-            lock = node[lock_name]
-            if lock is not None:
-                lock_set.append(lock)
+        lock_set = self._lock_sets.get(lock_name)
+        if lock_set is None:
+            return LockSet()
         return lock_set
 
-    def add_lock_name(self, lock_name):
-        """
-        self._lock_names contains all the lock name on the lockspace(all the node),
-        This function update self._lock_names
-        """
-        with self._mutex:
-            self._lock_names.append(lock_name)
-
-    def reduce_lock_name(self):
-        """
-        Delete duplicate locks in self._lock_names
-        """
-        self._lock_names = list(set(self._lock_names))
-
-    def add_lock_type(self, lock_name):
-        """
-        self._lock_types contains all the lock types and the number of each type on the lockspace(all the node),
-        This function update self._lock_types
-        """
-        with self._mutex:
-            if lock_name.lock_type in self._lock_types.keys():
-                self._lock_types[lock_name.lock_type] += 1
-            else:
-                self._lock_types[lock_name.lock_type] = 1
-
-
-    def report_once(self):
-        if config.DEBUG:
-            print("[DEBUG] in LockSpace.report_once, befor reduce_lock_name, "
-                  "the length of lock_name is {0}"
-                  .format(len(self._lock_names)))
-        self.reduce_lock_name()
+    def merge_nodes(self, nodes=None):
+        """
+        Merge the accounting of the interval of the nodes: add the new locks
+        to the LockSet(s) of their names, collect the names of the locks that have
+        the delta and the number of each lock type.
+        It is called at the report barrier, when the node workers of nodes are
+        finished, so no lock is required
+        Parameters:
+            nodes(list): The finished nodes, all the nodes if it is None
+        """
+        if nodes is None:
+            nodes = self.node_list
+        for node in nodes:
+            new_locks, changed_lock_names, lock_types = node.pop_accounting()
+            for lock in new_locks:
+                lock_set = self._lock_sets.get(lock.name)
+                if lock_set is None:
+                    lock_set = LockSet()
+                    self._lock_sets[lock.name] = lock_set
+                lock_set.append(lock)
+            self._last_accounting[node.name] = (changed_lock_names, lock_types)
+            self._changed_lock_names.update(changed_lock_names)
+            for lock_type, count in lock_types.items():
+                self._lock_types[lock_type] = self._lock_types.get(lock_type, 0) + count
+
+    def merge_stale_nodes(self, nodes, now=None):
+        """
+        Merge the last accounting of the nodes that missed the deadline again,
+        so the report keeps their last data, and record their ages in stale_nodes
+        Parameters:
+            nodes(list): The nodes that missed the deadline
+            now(float): The time of the report, now by default
+        """
+        self.stale_nodes = []
+        if now is None:
+            now = time.time()
+        for node in nodes:
+            changed_lock_names, lock_types = self._last_accounting.get(node.name, ([], {}))
+            self._changed_lock_names.update(changed_lock_names)
+            for lock_type, count in lock_types.items():
+                self._lock_types[lock_type] = self._lock_types.get(lock_type, 0) + count
+            age = None if node.update_time is None else now - node.update_time
+            self.stale_nodes.append((node.name, age))
+
+    def report_once(self, nodes=None, report_time=None):
+        """
+        Rank the LockSet(s) that have the delta in this interval, the LockSet(s)
+        are already aggregated, so the time scales with the changed locks, and
+        return the record of the report, see report.new_record
+        Parameters:
+            nodes(list): The nodes that are finished in this interval, all the
+                         nodes if it is None, the others are reported as stale
+            report_time(float): The time of the report, now by default
+        """
+        if nodes is None:
+            nodes = list(self.node_list)
+        self.merge_nodes(nodes)
+        self.merge_stale_nodes([i for i in self.node_list if i not in nodes], report_time)
+        lock_names = self._changed_lock_names
+        self._changed_lock_names = set()
         if config.DEBUG:
-            print("[DEBUG] in LockSpace.report_once, after reduce_lock_name, "
-                  "the length of lock_name is {0}"
-                  .format(len(self._lock_names)))
-        lock_names = self._lock_names
+            print("[DEBUG] in LockSpace.report_once, {0} of {1} lock names are changed"
+                  .format(len(lock_names), len(self._lock_sets)))
         lsg = LockSetGroup(self._max_sys_inode_num, self)
         for lock_name in lock_names:
-            lock_set = self.lock_name_to_lock_set(lock_name)
-            # change append method
-            lsg.append(lock_set)
+            # the system inodes are not displayed, don't rank them
+            if not self._debug and lock_name.inode_num <= self._max_sys_inode_num:
+                continue
+            lsg.append(self._lock_sets[lock_name])
 
-        return lsg.report_once(self._display_len)
+        return lsg.report_record(self.top_n(), report_time)
 
-def worker(lock_space_str, max_sys_inode_num, debug, display_len, nodes, printer_queue):
+def worker(lock_space_str, max_sys_inode_num, debug, display_len, nodes, printer_queue,
+           geometry=None):
     # nodes == None : local mode
     # else remote mode
     try:
@@ -1095,7 +2008,19 @@ def worker(lock_space_str, max_sys_inode_num, debug, display_len, nodes, printer
                                lock_space_str,
                                max_sys_inode_num,
                                debug,
-                               display_len=display_len)
+                               display_len=display_len,
+                               geometry=geometry)
+        if config.RECORD:
+            lock_space.recorder = recording.Recorder(config.RECORD, config.RECORD_SIZE,
+                                                     config.RECORD_COMPRESS)
+        def sigterm_handler(signum, frame):
+            """
+            The lockspace process is terminated, the parse processes must be
+            terminated too, they are not killed with their parent
+            """
+            lock_space.terminate_parse_pool()
+            os._exit(0)
+        signal.signal(signal.SIGTERM, sigterm_handler)
         lock_space.run(printer_queue, interval=config.INTERVAL)
     except KeyboardInterrupt:
         #keyboard.reset_terminal()
@@ -1104,3 +2029,35 @@ def worker(lock_space_str, max_sys_inode_num, debug, display_len, nodes, printer
         import traceback
         print(traceback.format_exc())
         exit(0)
+
+def replay_worker(path, info, debug, display_len, printer_queue, geometry=None):
+    """
+    The lockspace process of the replay, see LockSpace.replay
+    Parameters:
+        path(str): The path of the recording
+        info(dict): The info of the recording, see recording.read_info
+        debug(bool): Report the system inodes too, all the locks are recorded
+    """
+    try:
+        # the local node is named by the host that recorded it
+        nodes = [i if i else info.get("hostname", "local") for i in info["nodes"]]
+        lock_space = LockSpace(nodes,
+                               info["lockspace"],
+                               info["max_sys_inode_num"],
+                               debug,
+                               display_len=display_len,
+                               geometry=geometry,
+                               offline=True)
+        index = 0
+        if config.SEEK is not None:
+            index = recording.seek_index(path, config.SEEK)
+        lock_space.replay(printer_queue, recording.read_frames(path, index),
+                          speed=config.SPEED, seek=config.SEEK)
+        # the last report may still wait for the printer
+        printer_queue.flush()
+    except KeyboardInterrupt:
+        pass
+    except:
+        import traceback
+        print(traceback.format_exc())
+        exit(0)
@@ -11,10 +11,11 @@ import os
 import termios
 import fcntl
 import select
+import signal
 import time
 from o2locktoplib.retry import retry
-from o2locktoplib import config
 from o2locktoplib import util
+from o2locktoplib import terminal
 
 OLDTERM = None
 OLDFLAG = None
@@ -42,22 +43,56 @@ class Keyboard():
     The main class of this file
     """
     def __init__(self):
-        pass
+        # The pipe that the SIGWINCH handler wakes up the select by
+        self._resize_pipe = None
+
+    def _watch_resize(self):
+        """
+        Wake up the select on SIGWINCH, the size is read in the loop of run,
+        not in the signal handler
+        """
+        self._resize_pipe = os.pipe()
+        for file_dec in self._resize_pipe:
+            flags = fcntl.fcntl(file_dec, fcntl.F_GETFL)
+            fcntl.fcntl(file_dec, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        def sigwinch_handler(signum, frame):
+            try:
+                os.write(self._resize_pipe[1], b"w")
+            except OSError:
+                # the pipe is full, a wakeup is already pending
+                pass
+        signal.signal(signal.SIGWINCH, sigwinch_handler)
 
     @retry(10, delay=False)
     def _getchar(self):
         """
-        Get the input character from input by select
+        Get the input character from input by select, return None if the
+        terminal is resized
         """
-        _, _, _ = select.select([sys.stdin], [], [])
+        inputs = [sys.stdin]
+        if self._resize_pipe is not None:
+            inputs.append(self._resize_pipe[0])
+        readable, _, _ = select.select(inputs, [], [])
+        if self._resize_pipe is not None and self._resize_pipe[0] in readable:
+            try:
+                while os.read(self._resize_pipe[0], 64):
+                    pass
+            except OSError:
+                pass
+            return None
         character = sys.stdin.read()
         return character
 
-    def run(self, printer_queue):
+    def run(self, printer_queue, geometry=None):
         """
         The main method that will run in o2locktop and wait for the user's input
+        Parameters:
+            geometry(terminal.Geometry): The size of the terminal that is
+                                         updated on SIGWINCH
         """
         set_terminal()
+        if geometry is not None:
+            self._watch_resize()
         while True:
             try:
                 character = self._getchar()
@@ -67,17 +102,24 @@ class Keyboard():
                 print(expt)
                 break
 
+            if character is None:
+                if geometry.update(sys.stdout.fileno()):
+                    printer_queue.put({'msg_type':'kb_hit',
+                                       'what':'resize',
+                                       'rows':geometry.top_n})
+                continue
+
             if character == 'q':
                 printer_queue.put({'msg_type':'quit',
                                    'what':'1'})
                 break
 
             if character == 'd':
-                rows, cols = os.popen('stty size', 'r').read().split()
-                if int(cols) < config.COLUMNS:
-                    rows = (int(rows)//2 - 4)
+                if geometry is not None:
+                    rows = geometry.top_n
                 else:
-                    rows = (int(rows) - 6)
+                    rows = terminal.top_n(terminal.get_size(sys.stdout.fileno())
+                                          or terminal.DEFAULT_SIZE)
                 printer_queue.put({'msg_type':'kb_hit',
                                    'what':'detial',
                                    'rows':rows})
@@ -103,12 +145,12 @@ def reset_terminal():
         os.system('setterm -cursor on')
 
 
-def worker(printer_queue):
+def worker(printer_queue, geometry=None):
     """
     The method that will be called in o2locktop
     """
     keyboard = Keyboard()
-    keyboard.run(printer_queue)
+    keyboard.run(printer_queue, geometry)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The worker pool of o2locktop
+A fixed number of threads process the tasks that the LockSpace puts to a queue
+on every tick, so the count of the threads doesn't depend on the count of the nodes
+"""
+from __future__ import print_function
+import threading
+import time
+from o2locktoplib import util
+if util.PY2:
+    import Queue as queue
+else:
+    import queue
+
+
+class WorkerPool(object):
+    """
+    The reusable worker threads, and the instrumentation of the queue depth
+    and the processing time of every key(node)
+    """
+    def __init__(self, workers):
+        """
+        Parameters:
+            workers(int): The count of the worker threads, at least 1
+        """
+        self._queue = queue.Queue()
+        self._mutex = threading.Lock()
+        self._stats = {}
+        self._max_depth = 0
+        self._threads = []
+        for _ in range(max(1, workers)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def workers(self):
+        """
+        Return the count of the worker threads
+        """
+        return len(self._threads)
+
+    def depth(self):
+        """
+        Return the count of the tasks that are waiting in the queue
+        """
+        return self._queue.qsize()
+
+    def submit(self, key, func, *args):
+        """
+        Put a task to the queue, one of the worker threads will run func(*args)
+        Parameters:
+            key: The key of the processing time stats, e.g. the node name
+            func: The function of the task
+        """
+        self._queue.put((key, func, args, time.time()))
+        depth = self._queue.qsize()
+        with self._mutex:
+            if depth > self._max_depth:
+                self._max_depth = depth
+
+    def _work(self):
+        """
+        The loop of the worker thread, a None task stops the thread
+        """
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            key, func, args, submit_time = task
+            start = time.time()
+            try:
+                func(*args)
+            except Exception:
+                import traceback
+                print(traceback.format_exc())
+            self._record(key, start - submit_time, time.time() - start)
+
+    def _record(self, key, wait_time, process_time):
+        """
+        Add the waiting and processing time of a task to the stats of key
+        """
+        with self._mutex:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = {"count": 0, "wait": 0.0, "total": 0.0, "last": 0.0, "max": 0.0}
+                self._stats[key] = stats
+            stats["count"] += 1
+            stats["wait"] += wait_time
+            stats["total"] += process_time
+            stats["last"] = process_time
+            if process_time > stats["max"]:
+                stats["max"] = process_time
+
+    def stats(self):
+        """
+        Return the instrumentation of the pool
+        Returns:
+            dict: {"depth", "max_depth", "workers", "keys": {key: stats of the key}}
+        """
+        with self._mutex:
+            keys = dict((key, dict(value)) for key, value in self._stats.items())
+            max_depth = self._max_depth
+        return {"depth": self.depth(), "max_depth": max_depth,
+                "workers": self.workers, "keys": keys}
+
+    def stop(self):
+        """
+        Stop all the worker threads after the waiting tasks are finished
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -3,49 +3,247 @@
 
 from __future__ import print_function
 import multiprocessing
+import threading
 import os, sys
 from o2locktoplib import util
 from o2locktoplib import config
+from o2locktoplib import report
+from o2locktoplib import screen
+from o2locktoplib import terminal
 from o2locktoplib.retry import retry
 
 SIMPLE_DISPLAY=0
 DETAILED_DISPLAY=1
+if util.PY2:
+    import Queue as queue
+else:
+    import queue
+
+# The messages of the report, only the latest one is worth to show
+REPORT_TYPES = ('new_report', 'new_content')
+
+
+class PrinterQueue(object):
+    """
+    The queue of the messages to the printer process, the keyboard events keep
+    their order, and at most backlog reports wait in the queue. If it is full,
+    the report waits in the single pending slot of the process that puts it,
+    a newer report replaces it, and a feeder thread puts the pending report
+    once the printer process takes one, so the latest report is always
+    delivered. The printer process shows the latest one of the reports it takes
+    """
+    def __init__(self, backlog=2):
+        """
+        Parameters:
+            backlog(int): The max count of the reports in the queue
+        """
+        self._queue = multiprocessing.Queue()
+        self._reports = multiprocessing.Semaphore(backlog)
+        # The count of the reports that are never shown, and of the ones that
+        # are replaced in the pending slot, which are not delivered at all
+        self._dropped = multiprocessing.Value('i', 0)
+        self._replaced = multiprocessing.Value('i', 0)
+        # The pending slot and the feeder thread of the process that puts the
+        # reports, they are created by its first report
+        self._pid = None
+        self._cond = None
+        self._pending = None
+
+    @property
+    def dropped(self):
+        """
+        Return the count of the reports that are not shown for the newer ones
+        """
+        return self._dropped.value
+
+    @property
+    def replaced(self):
+        """
+        Return the count of the reports that are replaced before the printer
+        process takes them
+        """
+        return self._replaced.value
+
+    @staticmethod
+    def _count(value):
+        with value.get_lock():
+            value.value += 1
+
+    def put(self, obj):
+        """
+        Put a message to the printer process
+        """
+        if obj['msg_type'] not in REPORT_TYPES:
+            self._queue.put(obj)
+            return
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._cond = threading.Condition()
+            self._pending = None
+            feeder = threading.Thread(target=self._feed)
+            feeder.daemon = True
+            feeder.start()
+        with self._cond:
+            if self._pending is None and self._reports.acquire(False):
+                self._queue.put(obj)
+                return
+            if self._pending is not None:
+                self._count(self._dropped)
+                self._count(self._replaced)
+            self._pending = obj
+            self._cond.notify_all()
+
+    def _feed(self):
+        """
+        The feeder thread, put the pending report to the queue once the
+        printer process takes a report
+        """
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+            self._reports.acquire()
+            with self._cond:
+                # the pending report may be replaced when waiting
+                self._queue.put(self._pending)
+                self._pending = None
+                self._cond.notify_all()
+
+    def flush(self):
+        """
+        Wait until the pending report is put to the queue, the process that
+        puts the reports calls it before it exits
+        """
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            while self._pending is not None:
+                self._cond.wait()
+
+    def get(self):
+        """
+        Wait for a message
+        """
+        obj = self._queue.get()
+        if obj['msg_type'] in REPORT_TYPES:
+            self._reports.release()
+        return obj
+
+    def get_messages(self):
+        """
+        Wait for the messages, and return (message, shown) of all the messages
+        in the queue, shown is False for the reports except the latest one
+        """
+        messages = [self._queue.get()]
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        latest = None
+        for i, obj in enumerate(messages):
+            if obj['msg_type'] in REPORT_TYPES:
+                latest = i
+                # the pending report is put once the queue is drained
+                self._reports.release()
+        ret = []
+        for i, obj in enumerate(messages):
+            shown = obj['msg_type'] not in REPORT_TYPES or i == latest
+            if not shown:
+                self._count(self._dropped)
+            ret.append((obj, shown))
+        return ret
+
 
 class Printer():
     def __init__(self, log):
         self.content = None
+        # The record of the latest report, the content of a display mode is
+        # formatted from it when the mode is shown
+        self.report = None
         self.display_mode = SIMPLE_DISPLAY
         self.should_stop = False
         self.log = None
         if log is not None:
             self.log = open(log, 'w')
         self.prelude = None
-    @retry(10)
+        self.printer_queue = None
+        # The differential screen of the terminal, None if the stdout is not
+        # a terminal, then the whole report is printed every time
+        self.screen = None
+        # The count of the bytes written of the last frame
+        self.frame_bytes = 0
+        # The terminal.Geometry that is updated by the keyboard process
+        self.geometry = None
+        # The rows of the latest report, 0 means all the rows are shown
+        self.rows = 0
+        # The count of the replaced reports that are noted in the log
+        self.replaced = 0
+
+    def _terminal_size(self):
+        """
+        Return (rows, columns) of the terminal, None if it is unknown
+        """
+        if self.geometry is not None:
+            return self.geometry.size
+        return terminal.get_size(sys.stdout.fileno())
+
     def _refresh(self,rows):
         # if the stdout not point to the tty
         if util.LINUX and os.major(os.fstat(sys.stdout.fileno()).st_dev) != 0:
             print("unknow line in test case")
             print("unknow line in test case")
         if self.content:
-            if(config.CLEAR):
-                util.clear_screen()
+            lines = []
             if self.prelude:
-                print(self.prelude)
+                prelude = self.prelude
+                if config.DEBUG and self.printer_queue is not None:
+                    prelude += " dropped frames: {0}".format(self.printer_queue.dropped)
+                if config.DEBUG:
+                    # the bytes written of the previous frame
+                    prelude += " frame bytes: {0}".format(self.frame_bytes)
+                lines.append(prelude)
             if rows == 0:
-                print(self.content[self.display_mode])
+                lines.extend(self.get_content().split('\n'))
             else:
-                for i in self.content[self.display_mode].split('\n')[:rows+4]:
-                    print(i)
+                lines.extend(self.get_content().split('\n')[:rows+4])
+            if self.screen is not None:
+                # only write the changes of the screen to the terminal
+                self.frame_bytes = self.screen.render(lines, self._terminal_size())
+                return
+            text = '\n'.join(lines) + '\n'
+            self.frame_bytes = len(text) if util.PY2 else len(text.encode('utf-8'))
+            sys.stdout.write(text)
             # Because in some case(such as unix output redirect), the stdout device is not
             # the screen, it maybe a file or other process, so we must flush the output in 
             # that case
             sys.stdout.flush()
 
-                
-
     def activate(self, simple_content, detailed_content):
         #self.content = (copy.deepcopy(simple_content), copy.deepcopy(detailed_content))
         self.content = (simple_content, detailed_content)
+        self.report = None
+
+    def activate_report(self, record):
+        """
+        Show the record of a report, the display modes are formatted when
+        they are shown, see get_content
+        """
+        self.report = record
+        self.content = [None, None]
+
+    def get_content(self):
+        """
+        Return the content of the display mode, format it from the record
+        of the report if it is not formatted yet
+        """
+        content = self.content[self.display_mode]
+        if content is None:
+            content = report.format_report(self.report,
+                                           detailed=self.display_mode == DETAILED_DISPLAY)
+            self.content[self.display_mode] = content
+        return content
+
     def toggle_display_mode(self):
         if self.display_mode == SIMPLE_DISPLAY:
             self.set_display_mode(DETAILED_DISPLAY)
@@ -58,31 +256,84 @@ class Printer():
 
     @retry(10)
     def run(self, printer_queue, **kargs):
+        """
+        Show the messages of printer_queue(PrinterQueue) until the quit message
+        """
         self.prelude = "{0} {1} lockspace: {2}".format(config.VERSION, kargs['mount_info'], config.UUID)
 
         if self.log:
             self.log.write(self.prelude+"\n")
+        self.printer_queue = printer_queue
+        self.geometry = kargs.get('geometry')
+        if config.CLEAR and sys.stdout.isatty():
+            sys.stdout.flush()
+            self.screen = screen.Screen(sys.stdout.fileno())
         while not self.should_stop:
-            obj = printer_queue.get()
-            msg_type = obj['msg_type']
-            if msg_type == 'kb_hit':
-                what = obj['what']
-                if what == 'detial':
-                    self.toggle_display_mode()
-                    self._refresh(obj['rows'])
-                # TODO
-                if what == 'debug':
-                    pass
-                    
-            elif msg_type == 'new_content':
-                self.activate(obj['simple'], obj["detailed"])
+            for obj, shown in printer_queue.get_messages():
+                if not self._handle(obj, shown):
+                    return
+
+    def _log_replaced(self):
+        """
+        Note the reports that are replaced before the printer takes them in the
+        log, the log has every report that the printer takes, but not them
+        """
+        if self.log and self.printer_queue is not None:
+            replaced = self.printer_queue.replaced
+            if replaced > self.replaced:
+                self.log.write("{0} reports are replaced by the newer ones\n\n\n"
+                               .format(replaced - self.replaced))
+                self.replaced = replaced
+
+    def _log_content(self, content):
+        if self.log:
+            self.log.write(content)
+            self.log.write('\n\n\n')
+            self.log.flush()
+
+    def _handle(self, obj, shown=True):
+        """
+        Handle a message of the printer queue, return False on the quit message
+        Parameters:
+            shown(bool): False if the report is replaced by a newer one, it is
+                         only written to the log
+        """
+        msg_type = obj['msg_type']
+        if msg_type == 'kb_hit':
+            what = obj['what']
+            if what == 'detial':
+                self.toggle_display_mode()
                 self._refresh(obj['rows'])
+            if what == 'resize':
+                # the report fits the resized terminal if -l is not given
+                self._refresh(obj['rows'] if self.rows else 0)
+            # TODO
+            if what == 'debug':
+                pass
+                
+        elif msg_type == 'new_content':
+            self._log_replaced()
+            if not shown:
+                self._log_content((obj['simple'], obj['detailed'])[self.display_mode])
+                return True
+            self.rows = obj['rows']
+            self.activate(obj['simple'], obj["detailed"])
+            self._refresh(obj['rows'])
+            self._log_content(self.get_content())
+        elif msg_type == 'new_report':
+            self._log_replaced()
+            if not shown:
                 if self.log:
-                    self.log.write(self.content[self.display_mode])
-                    self.log.write('\n\n\n')
-                    self.log.flush()
-            elif msg_type == 'quit':
-                break
+                    self._log_content(report.format_report(
+                        obj['report'], detailed=self.display_mode == DETAILED_DISPLAY))
+                return True
+            self.rows = obj['rows']
+            self.activate_report(obj['report'])
+            self._refresh(obj['rows'])
+            self._log_content(self.get_content())
+        elif msg_type == 'quit':
+            return False
+        return True
 
 def worker(printer_queue, log, **kargs):
     printer = Printer(log)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The binary recording of o2locktop
+The recording keeps the per-lock counters of every sample of every node,
+instead of the formatted top N of the reports, so it can be replayed through
+the same LockSpace later. The file is a sequence of length-prefixed frames:
+
+    MAGIC
+    frame: FRAME_HEADER(payload length, flags) + payload
+
+The payload is compressed by zlib if the flags has FLAG_ZLIB, and starts with
+its type:
+
+    FRAME_INFO      the json of the lockspace and the names of the nodes
+    FRAME_SAMPLE    the changes of the ShotTable of a node in a sample: the
+                    names and the values of the new locks, the values of the
+                    locks that are pushed again after they are cleared, the
+                    counter deltas of the other pushed locks, and the ids of
+                    the cleared locks
+    FRAME_KEYFRAME  the whole ShotTable of a node, in the same layout as
+                    FRAME_SAMPLE, it starts every rotated file, so every file
+                    can be replayed by itself
+    FRAME_REPORT    the time of a report, and the ids of the nodes that are
+                    finished before it
+
+The file is rotated once it is bigger than the max size, the rotated files are
+the path, path.1, path.2 and so on
+"""
+import array
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from o2locktoplib import util
+
+MAGIC = b"O2LTREC1"
+# (payload length, flags)
+FRAME_HEADER = struct.Struct("<IB")
+FLAG_ZLIB = 1
+
+FRAME_INFO = 1
+FRAME_SAMPLE = 2
+FRAME_KEYFRAME = 3
+FRAME_REPORT = 4
+
+FRAME_TYPE = struct.Struct("<B")
+# (node id, sample time, first new lock id, new count, absolute count,
+#  delta count, cleared count)
+SAMPLE_HEADER = struct.Struct("<HdIIIII")
+# (report time, finished node count)
+REPORT_HEADER = struct.Struct("<dH")
+NAMES_LENGTH = struct.Struct("<I")
+
+# The layout of dlm.COUNTER_FIELDS and dlm.HANG_FIELDS
+COUNTER_LEN = 4
+HANG_LEN = 2
+# The same 64-bit typecode as dlm.COUNTER_TYPECODE
+COUNTER_TYPECODE = 'l' if util.PY2 else 'q'
+ID_TYPECODE = 'I'
+NODE_ID_TYPECODE = 'H'
+
+
+def _tobytes(values):
+    """
+    Return the little-endian bytes of the array
+    """
+    if sys.byteorder == 'big':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    if util.PY2:
+        return values.tostring()
+    return values.tobytes()
+
+
+def _frombytes(typecode, data, offset, count):
+    """
+    Return the array of count items of typecode at offset of data, and the
+    offset after it
+    """
+    values = array.array(typecode)
+    end = offset + values.itemsize * count
+    if util.PY2:
+        values.fromstring(data[offset:end])
+    else:
+        values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def rotated_path(path, index):
+    """
+    Return the path of the index-th file of the recording
+    """
+    if index == 0:
+        return path
+    return "{0}.{1}".format(path, index)
+
+
+class Sample(object):
+    """
+    The changes of the ShotTable of a node in a sample
+    """
+    __slots__ = ("node_id", "time", "first_new_id", "names", "new_counters",
+                 "new_hangs", "abs_ids", "abs_counters", "abs_hangs",
+                 "delta_ids", "delta_counters", "delta_hangs", "cleared_ids")
+
+    def __init__(self, node_id, sample_time, first_new_id=0, names=None):
+        """
+        Parameters:
+            node_id(int): The index of the node in the names of the nodes
+            sample_time(float): The time that the locking_state is read
+            first_new_id(int): The lock id of the first new lock, the ids
+                               of the new locks are consecutive
+            names(list): The names of the new locks
+        The values are set by the caller:
+            new_counters, new_hangs: The COUNTER_LEN counters and the HANG_LEN
+                                     hang times of every new lock
+            abs_ids: The ids of the locks that are pushed again after they
+                     are cleared, abs_counters and abs_hangs are absolute
+            delta_ids: The ids of the locks that have the previous values,
+                       delta_counters are the deltas from the previous values,
+                       delta_hangs are absolute
+            cleared_ids: The ids of the locks that are cleared
+        """
+        self.node_id = node_id
+        self.time = sample_time
+        self.first_new_id = first_new_id
+        self.names = names if names is not None else []
+        self.new_counters = array.array(COUNTER_TYPECODE)
+        self.new_hangs = array.array('d')
+        self.abs_ids = array.array(ID_TYPECODE)
+        self.abs_counters = array.array(COUNTER_TYPECODE)
+        self.abs_hangs = array.array('d')
+        self.delta_ids = array.array(ID_TYPECODE)
+        self.delta_counters = array.array(COUNTER_TYPECODE)
+        self.delta_hangs = array.array('d')
+        self.cleared_ids = array.array(ID_TYPECODE)
+
+    def encode(self, frame_type=FRAME_SAMPLE):
+        """
+        Return the payload of the sample
+        """
+        names = "\n".join(self.names).encode('utf-8')
+        parts = [FRAME_TYPE.pack(frame_type),
+                 SAMPLE_HEADER.pack(self.node_id, self.time, self.first_new_id,
+                                    len(self.names), len(self.abs_ids),
+                                    len(self.delta_ids), len(self.cleared_ids)),
+                 NAMES_LENGTH.pack(len(names)), names]
+        for values in (self.new_counters, self.new_hangs,
+                       self.abs_ids, self.abs_counters, self.abs_hangs,
+                       self.delta_ids, self.delta_counters, self.delta_hangs,
+                       self.cleared_ids):
+            parts.append(_tobytes(values))
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, payload):
+        """
+        Return the Sample of the payload of FRAME_SAMPLE or FRAME_KEYFRAME
+        """
+        offset = FRAME_TYPE.size
+        node_id, sample_time, first_new_id, new_cnt, abs_cnt, delta_cnt, cleared_cnt = \
+            SAMPLE_HEADER.unpack_from(payload, offset)
+        offset += SAMPLE_HEADER.size
+        names_len, = NAMES_LENGTH.unpack_from(payload, offset)
+        offset += NAMES_LENGTH.size
+        names = payload[offset:offset+names_len].decode('utf-8')
+        names = names.split("\n") if new_cnt else []
+        offset += names_len
+        sample = cls(node_id, sample_time, first_new_id, names)
+        layout = (("new_counters", COUNTER_TYPECODE, new_cnt * COUNTER_LEN),
+                  ("new_hangs", 'd', new_cnt * HANG_LEN),
+                  ("abs_ids", ID_TYPECODE, abs_cnt),
+                  ("abs_counters", COUNTER_TYPECODE, abs_cnt * COUNTER_LEN),
+                  ("abs_hangs", 'd', abs_cnt * HANG_LEN),
+                  ("delta_ids", ID_TYPECODE, delta_cnt),
+                  ("delta_counters", COUNTER_TYPECODE, delta_cnt * COUNTER_LEN),
+                  ("delta_hangs", 'd', delta_cnt * HANG_LEN),
+                  ("cleared_ids", ID_TYPECODE, cleared_cnt))
+        for name, typecode, count in layout:
+            values, offset = _frombytes(typecode, payload, offset, count)
+            setattr(sample, name, values)
+        return sample
+
+
+class Recorder(object):
+    """
+    Write the samples and the reports of a LockSpace to the recording, the
+    samples are written by the workers of the nodes, so the writing is locked
+    """
+    def __init__(self, path, max_size=0, compress=False):
+        """
+        Parameters:
+            path(str): The path of the recording
+            max_size(int): Rotate the file once it is bigger than it(bytes),
+                           0 means never
+            compress(bool): Compress the frames by zlib
+        """
+        self._path = path
+        self._max_size = max_size
+        self._compress = compress
+        self._mutex = threading.Lock()
+        self._index = 0
+        self._file = None
+        self._info = None
+        # {node name: node id}
+        self.node_ids = {}
+        # The bytes of the payloads and the bytes written to the files
+        self.payload_bytes = 0
+        self.written_bytes = 0
+
+    @property
+    def path(self):
+        """
+        Return the path of the file that is written now
+        """
+        return rotated_path(self._path, self._index)
+
+    def start(self, info, node_names):
+        """
+        Open the recording and write the info
+        Parameters:
+            info(dict): The description of the lockspace
+            node_names(list): The names of the nodes, None is the local node
+        """
+        self._info = dict(info)
+        self._info["nodes"] = [i if i is not None else "" for i in node_names]
+        self.node_ids = dict((name, i) for i, name in enumerate(node_names))
+        # the rotated files of an old recording of the same path would be
+        # read after this one
+        directory, name = os.path.split(os.path.abspath(self._path))
+        for i in os.listdir(directory):
+            if i.startswith(name + ".") and i[len(name)+1:].isdigit():
+                os.remove(os.path.join(directory, i))
+        with self._mutex:
+            self._open()
+
+    def _open(self):
+        """
+        Open the next file and write the info, the mutex must be held
+        """
+        self._file = open(self.path, 'wb')
+        self._file.write(MAGIC)
+        self.written_bytes += len(MAGIC)
+        self._write(self._frame(FRAME_TYPE.pack(FRAME_INFO) +
+                                json.dumps(self._info, sort_keys=True).encode('utf-8')))
+
+    def _frame(self, payload):
+        """
+        Return (the frame of the payload, the length of the payload)
+        """
+        flags = 0
+        length = len(payload)
+        if self._compress:
+            payload = zlib.compress(payload, 1)
+            flags |= FLAG_ZLIB
+        return FRAME_HEADER.pack(len(payload), flags) + payload, length
+
+    def _write(self, frame):
+        """
+        Write the frame that is returned by _frame, the mutex must be held
+        """
+        data, length = frame
+        self._file.write(data)
+        self.payload_bytes += length
+        self.written_bytes += len(data)
+
+    def record_sample(self, sample):
+        """
+        Write the Sample of a node
+        """
+        # encode and compress out of the mutex, the nodes record in parallel
+        frame = self._frame(sample.encode())
+        with self._mutex:
+            self._write(frame)
+
+    def record_report(self, report_time, node_ids, keyframes=None, rotate=True):
+        """
+        Write the report, and rotate the file if it is too big
+        Parameters:
+            report_time(float): The time of the report
+            node_ids(list): The ids of the nodes that are finished
+            keyframes(function): Return the Sample(s) of the whole ShotTable
+                                 of every node, they start the rotated file
+            rotate(bool): False to postpone the rotation to a later report,
+                          e.g. a node is processing and its ShotTable changes
+        """
+        frame = self._frame(FRAME_TYPE.pack(FRAME_REPORT) +
+                            REPORT_HEADER.pack(report_time, len(node_ids)) +
+                            _tobytes(array.array(NODE_ID_TYPECODE, node_ids)))
+        with self._mutex:
+            self._write(frame)
+            self._file.flush()
+            if not rotate or not self._max_size or self._file.tell() < self._max_size:
+                return
+            self._file.close()
+            self._index += 1
+            self._open()
+            if keyframes is not None:
+                for sample in keyframes():
+                    self._write(self._frame(sample.encode(FRAME_KEYFRAME)))
+            self._file.flush()
+
+    def close(self):
+        """
+        Close the recording
+        """
+        with self._mutex:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _raw_frames(path):
+    """
+    Yield (flags, payload) of a file of the recording, the payload is not
+    decompressed, a truncated frame at the end is dropped
+    """
+    with open(path, 'rb') as filp:
+        if filp.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{0} is not a recording of o2locktop".format(path))
+        while True:
+            header = filp.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            length, flags = FRAME_HEADER.unpack(header)
+            payload = filp.read(length)
+            if len(payload) < length:
+                break
+            yield flags, payload
+
+
+def read_frames(path, index=0):
+    """
+    Yield (frame type, payload) of the recording, the rotated files follow
+    the path, a truncated frame at the end is dropped
+    Parameters:
+        index(int): Start from the index-th file, see seek_index
+    """
+    while os.path.exists(rotated_path(path, index)):
+        for flags, payload in _raw_frames(rotated_path(path, index)):
+            if flags & FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+            frame_type, = FRAME_TYPE.unpack_from(payload)
+            yield frame_type, payload
+        index += 1
+
+
+def first_report_time(path):
+    """
+    Return the time of the first report of a file of the recording, None if
+    the file has no report
+    """
+    for flags, payload in _raw_frames(path):
+        if flags & FLAG_ZLIB:
+            # only the head of the payload is needed, the keyframes are big
+            payload = zlib.decompressobj().decompress(payload,
+                                                      FRAME_TYPE.size + REPORT_HEADER.size)
+        if FRAME_TYPE.unpack_from(payload)[0] == FRAME_REPORT:
+            return REPORT_HEADER.unpack_from(payload, FRAME_TYPE.size)[0]
+    return None
+
+
+def seek_index(path, seek_time):
+    """
+    Return the index of the last file of the recording whose first report is
+    not after seek_time, the keyframes at its start rebuild the ShotTable(s),
+    so the replay that seeks doesn't read the files before it
+    """
+    index = 0
+    while os.path.exists(rotated_path(path, index + 1)):
+        report_time = first_report_time(rotated_path(path, index + 1))
+        if report_time is None or report_time > seek_time:
+            break
+        index += 1
+    return index
+
+
+def decode_info(payload):
+    """
+    Return the dict of the payload of FRAME_INFO
+    """
+    return json.loads(payload[FRAME_TYPE.size:].decode('utf-8'))
+
+
+def read_info(path):
+    """
+    Return the dict of the info of the recording, ValueError is raised if the
+    recording has no info
+    """
+    for flags, payload in _raw_frames(path):
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        if FRAME_TYPE.unpack_from(payload)[0] == FRAME_INFO:
+            return decode_info(payload)
+        break
+    raise ValueError("{0} has no info".format(path))
+
+
+def decode_report(payload):
+    """
+    Return (report time, node ids) of the payload of FRAME_REPORT
+    """
+    report_time, count = REPORT_HEADER.unpack_from(payload, FRAME_TYPE.size)
+    node_ids, _ = _frombytes(NODE_ID_TYPECODE, payload,
+                             FRAME_TYPE.size + REPORT_HEADER.size, count)
+    return report_time, list(node_ids)
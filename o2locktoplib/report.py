@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The report of o2locktop
+The lockspace process puts the numbers of the top N lock resources to the
+printer queue as a compact record, the printer process formats the record
+only for the display mode that is shown
+"""
+import array
+import decimal
+import math
+from o2locktoplib import util
+
+TITLE_FORMAT = "{0:21}{1:12}{2:12}{3:12}{4:12}{5:12}{6:12}"
+DATA_FORMAT = "{0:21}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
+if util.PY2:
+    NODE_FORMAT = "{0:25}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
+else:
+    NODE_FORMAT = "{0:21}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
+
+# The numbers of a lock resource on a node or on the cluster, the TIME is inf
+# if the lock is hanged, then the AVG is the hang time(ns)
+VALUES = ("ex_num", "ex_time", "ex_avg", "pr_num", "pr_time", "pr_avg")
+
+
+def new_record(time_stamp, rate, acquisitions, lock_types, stale_nodes):
+    """
+    Return an empty record of the report
+    Parameters:
+        time_stamp(str): The time of the report
+        rate(bool): The NUM and TIME are per-second rates
+        acquisitions(tuple): The lock acquisitions of (EX, PR)
+        lock_types(list): [(lock type, count)] sorted by the count
+        stale_nodes(list): [(node name, age)] of the nodes missed the deadline
+    """
+    return {"time": time_stamp,
+            "rate": rate,
+            "acquisitions": acquisitions,
+            "lock_types": lock_types,
+            "stale_nodes": stale_nodes,
+            # the short names of the lock resources, and len(VALUES) values
+            # of every lock resource in the counters
+            "names": [],
+            "counters": array.array('d'),
+            # the node names of every lock resource, and len(VALUES) values
+            # of every node in the node_counters
+            "node_names": [],
+            "node_counters": array.array('d')}
+
+
+def append_lock_set(record, short_name, values, nodes):
+    """
+    Append the numbers of a lock resource to the record
+    Parameters:
+        short_name(str): The short name of the lock resource
+        values(tuple): The VALUES of the lock resource on the cluster
+        nodes(list): [(node name, VALUES of the lock on the node)]
+    """
+    record["names"].append(short_name)
+    record["counters"].extend(values)
+    record["node_names"].append([i[0] for i in nodes])
+    for _, node_values in nodes:
+        record["node_counters"].extend(node_values)
+
+
+def change_float_to_str(total_time, total_num, key_index, inf_str, rate=False):
+    """
+    This function is to change the three mian number that will be showed on screen
+    to int type str, and if some of the three number is inf, it represent there is
+    a hang in the lock, then chang the inf to the inf_str string.
+    The per-second rate of the number keeps one decimal.
+    """
+    num_exp = decimal.Decimal('0.1') if rate else decimal.Decimal('0.')
+    if math.isinf(total_time):
+        total_time_str = str(decimal.Decimal(key_index/1000000).quantize(decimal.Decimal('0.')))+'s'+inf_str
+        total_num_str = str(decimal.Decimal(total_num).quantize(num_exp))
+        key_index_str = '--'
+    else:
+        total_time_str = str(decimal.Decimal(str(total_time)).quantize(decimal.Decimal('0.')))
+        total_num_str = str(decimal.Decimal(str(total_num)).quantize(num_exp))
+        key_index_str = str(decimal.Decimal(str(key_index)).quantize(decimal.Decimal('0.')))
+    return total_time_str, total_num_str, key_index_str
+
+
+def _values_to_str(values, rate):
+    """
+    Return the strings of the VALUES in the order of the columns
+    """
+    ex_time_str, ex_num_str, ex_avg_str = \
+        change_float_to_str(values[1], values[0], values[2], '(hang)', rate)
+    pr_time_str, pr_num_str, pr_avg_str = \
+        change_float_to_str(values[4], values[3], values[5], '(hang)', rate)
+    return ex_num_str, ex_time_str, ex_avg_str, pr_num_str, pr_time_str, pr_avg_str
+
+
+def format_lock_set(short_name, values, nodes=None, rate=False):
+    """
+    Return the row of a lock resource, and the rows of its nodes if nodes is given
+    Parameters:
+        short_name(str): The short name of the lock resource
+        values: The VALUES of the lock resource on the cluster
+        nodes(list): [(node name, VALUES of the lock on the node)]
+    """
+    rows = [DATA_FORMAT.format(short_name, *_values_to_str(values, rate))]
+    if nodes:
+        for node_name, node_values in nodes:
+            rows.append(NODE_FORMAT.format("├─"+node_name, *_values_to_str(node_values, rate)))
+        rows[-1] = rows[-1].replace("├─", "└─", 1)
+    return "\n".join(rows)
+
+
+def format_report(record, detailed=False):
+    """
+    Return the screen of the record for the simple or the detailed display mode
+    """
+    rate = record["rate"]
+    ex_locks, pr_locks = record["acquisitions"]
+    if rate:
+        what = TITLE_FORMAT.format(
+            "TYPE INO  ", "EX NUM/s", "EX TIME/s", "EX AVG(ns)",
+            "PR NUM/s", "PR TIME/s", "PR AVG(ns)")
+        acquisitions = " lock acquisitions/s: total {0:.1f}, EX {1:.1f}, PR {2:.1f}\n"
+    else:
+        what = TITLE_FORMAT.format(
+            "TYPE INO  ", "EX NUM", "EX TIME(ns)", "EX AVG(ns)",
+            "PR NUM", "PR TIME(ns)", "PR AVG(ns)")
+        acquisitions = " lock acquisitions: total {0}, EX {1}, PR {2}\n"
+    types = ""
+    total_value = 0
+    for key, value in record["lock_types"]:
+        types += "{0} {1}, ".format(key, value)
+        total_value += value
+    types = "total {0}, ".format(total_value) + types
+    types = types[:-2]
+    stale = ""
+    for node_name, age in record["stale_nodes"]:
+        stale += ", {0} {1}".format(
+            node_name if node_name is not None else "local",
+            "no data" if age is None else "{0}s ago".format(int(age)))
+    if stale:
+        stale = "; stale: " + stale[2:]
+    screen = record["time"] + acquisitions.format(ex_locks + pr_locks, ex_locks, pr_locks)
+    screen += "lock resources: {0}{1}\n\n".format(types, stale)
+    screen += what + "\n"
+
+    counters = record["counters"]
+    node_counters = record["node_counters"]
+    count = len(VALUES)
+    node_index = 0
+    rows = []
+    for i, short_name in enumerate(record["names"]):
+        nodes = None
+        node_names = record["node_names"][i]
+        if detailed:
+            nodes = [(node_name, node_counters[(node_index+j)*count : (node_index+j+1)*count])
+                     for j, node_name in enumerate(node_names)]
+        node_index += len(node_names)
+        rows.append(format_lock_set(short_name, counters[i*count : (i+1)*count], nodes, rate))
+    if rows:
+        screen += "\n".join(rows) + "\n"
+    return screen[:-1]
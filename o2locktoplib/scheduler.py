@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The sampling scheduler of o2locktop
+The ticks are on the boundaries of the interval on the monotonic clock, so the
+sampling doesn't drift with the time of collecting and reporting, and all the
+nodes are sampled at the same moment
+"""
+import time
+from o2locktoplib import util
+
+
+class Scheduler(object):
+    """
+    The drift-free ticks of the sampling, the first tick fires at once, the
+    next ones are on the multiples of the interval of the wall clock, which
+    are the same boundaries that the remote loops of the stream mode sleep to;
+    the second tick is at least one interval after the first one, so the
+    barrier of the first tick has a full interval
+    """
+    def __init__(self, interval):
+        """
+        Parameters:
+            interval(float): The seconds between two ticks
+        """
+        self._interval = interval
+        # the phase is taken from the wall clock once, the ticks are counted
+        # on the monotonic clock, so they don't jump with the wall clock
+        self._next = util.monotonic() + interval - time.time() % interval
+        self._first = True
+        # The count of the ticks that are skipped because the previous cycle
+        # was too slow
+        self.missed = 0
+
+    @property
+    def interval(self):
+        """
+        Return the seconds between two ticks
+        """
+        return self._interval
+
+    def next_tick(self):
+        """
+        Return the monotonic time of the next tick
+        """
+        return self._next
+
+    def wait(self):
+        """
+        Sleep until the next tick, if the tick is already passed, fire at once
+        on the latest passed boundary and skip the older ones
+        Returns:
+            float: The monotonic time of the tick
+        """
+        now = util.monotonic()
+        if self._first:
+            self._first = False
+            if self._next - now < self._interval:
+                self._next += self._interval
+            return now
+        if now < self._next:
+            util.sleep(self._next - now)
+            tick = self._next
+        else:
+            missed = int((now - self._next) // self._interval)
+            self.missed += missed
+            tick = self._next + missed * self._interval
+        self._next = tick + self._interval
+        return tick
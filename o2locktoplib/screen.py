@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The differential screen of o2locktop
+The screen keeps the previous frame, and only writes the changed cells of the
+changed rows to the terminal, so it doesn't flicker and costs less bandwidth
+over the slow ssh terminals than clearing and reprinting the whole screen
+"""
+import errno
+import os
+import select
+from o2locktoplib import util
+
+CLEAR = "\033[H\033[2J"
+# erase from the cursor to the end of the line
+ERASE_LINE = "\033[K"
+# erase from the cursor to the end of the screen
+ERASE_DOWN = "\033[J"
+# The unchanged cells between two changed spans are rewritten if they are
+# shorter than moving the cursor
+MERGE_GAP = 8
+
+
+def move(row, col):
+    """
+    Return the escape sequence to move the cursor, row and col start from 0
+    """
+    return "\033[{0};{1}H".format(row + 1, col + 1)
+
+
+def write_all(file_dec, data):
+    """
+    Write all the data to the file descriptor, the terminal may be non-blocking
+    because the keyboard sets O_NONBLOCK on the stdin which shares the file of
+    the tty with the stdout, so wait until it is writable instead of retrying
+    Returns:
+        int: The count of the bytes written
+    """
+    total = len(data)
+    while data:
+        try:
+            written = os.write(file_dec, data)
+        except OSError as expt:
+            if expt.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                raise
+            select.select([], [file_dec], [])
+            continue
+        data = data[written:]
+    return total
+
+
+def _changed_spans(old, line):
+    """
+    Return [(start, end)] of the changed cells of the line, the spans that are
+    nearer than a cursor movement are merged, the last span covers the tail of
+    the line if it is longer than the old one
+    """
+    spans = []
+    end = min(len(old), len(line))
+    col = 0
+    while col < end:
+        if line[col] == old[col]:
+            col += 1
+            continue
+        start = col
+        while col < end and line[col] != old[col]:
+            col += 1
+        if spans and start - spans[-1][1] <= MERGE_GAP:
+            spans[-1] = (spans[-1][0], col)
+        else:
+            spans.append((start, col))
+    if len(line) > end:
+        if spans and end - spans[-1][1] <= MERGE_GAP:
+            spans[-1] = (spans[-1][0], len(line))
+        else:
+            spans.append((end, len(line)))
+    return spans
+
+
+class Screen(object):
+    """
+    The screen of the terminal, the lines are of the single-width characters,
+    so the index of a character in the line is its column on the screen
+    """
+    def __init__(self, file_dec):
+        """
+        Parameters:
+            file_dec(int): The file descriptor of the terminal
+        """
+        self._file_dec = file_dec
+        # The lines of the previous frame, None means the whole screen must
+        # be redrawn
+        self._lines = None
+        self._size = None
+        # The count of the bytes written of the last frame and of all frames
+        self.last_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
+
+    def invalidate(self):
+        """
+        Redraw the whole screen in the next frame
+        """
+        self._lines = None
+
+    def diff(self, lines, size=None):
+        """
+        Return the escape sequences and the text that change the previous
+        frame to the lines, and take the lines as the previous frame
+        Parameters:
+            lines(list): The lines of the frame
+            size(tuple): (rows, columns) of the terminal, None if unknown,
+                         the lines are clipped to the terminal, so they
+                         don't wrap or scroll the screen
+        """
+        if util.PY2:
+            lines = [i.decode('utf-8') if isinstance(i, str) else i for i in lines]
+        if size is not None:
+            rows, cols = size
+            lines = [i[:cols] for i in lines[:rows]]
+        # park the cursor under the frame if there is room
+        park = size is None or len(lines) < size[0]
+        if self._lines is None or size != self._size:
+            self._lines = lines
+            self._size = size
+            return CLEAR + "\n".join(lines) + ("\n" if park else "")
+        out = []
+        prev = self._lines
+        for row, line in enumerate(lines):
+            old = prev[row] if row < len(prev) else ""
+            if line == old:
+                continue
+            spans = _changed_spans(old, line)
+            for start, end in spans:
+                out.append(move(row, start))
+                out.append(line[start:end])
+            if len(line) < len(old):
+                if not spans or spans[-1][1] != len(line):
+                    out.append(move(row, len(line)))
+                out.append(ERASE_LINE)
+        if len(lines) < len(prev):
+            out.append(move(len(lines), 0))
+            out.append(ERASE_DOWN)
+        elif out and park:
+            out.append(move(len(lines), 0))
+        self._lines = lines
+        return "".join(out)
+
+    def render(self, lines, size=None):
+        """
+        Write the changes of the frame to the terminal
+        Returns:
+            int: The count of the bytes written
+        """
+        data = self.diff(lines, size).encode('utf-8')
+        written = write_all(self._file_dec, data) if data else 0
+        self.last_bytes = written
+        self.total_bytes += written
+        self.frames += 1
+        return written
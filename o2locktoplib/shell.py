@@ -69,21 +69,26 @@ class Shell(object):
     Optionally accepts a ``strip_empty`` parameter, which should be a boolean.
     If set to ``True``, only non-empty lines from ``Shell.output`` or
     ``Shell.errors`` will be returned. (Default: ``True``)
+
+    Optionally accepts a ``universal_newlines`` parameter, which should be a
+    boolean. If set to ``False``, the output is recorded as bytes without
+    decoding. (Default: ``True``)
     """
     def __init__(self, has_input=False, record_output=True, record_errors=True,
-                 strip_empty=True):
+                 strip_empty=True, universal_newlines=True):
         self.has_input = has_input
         self.record_output = record_output
         self.record_errors = record_errors
         self.strip_empty = strip_empty
+        self.universal_newlines = universal_newlines
 
         self.last_command = ''
-        self.line_breaks = '\n'
+        self.line_breaks = '\n' if universal_newlines else b'\n'
         self.pid = None
         self.code = 0
         self._popen = None
-        self._stdout = ''
-        self._stderr = ''
+        self._stdout = '' if universal_newlines else b''
+        self._stderr = '' if universal_newlines else b''
 
     def _split_command(self, command):
         """
@@ -153,7 +158,7 @@ class Shell(object):
         kwargs = {
             'stdout': subprocess.PIPE,
             'stderr': subprocess.PIPE,
-            'universal_newlines': True,
+            'universal_newlines': self.universal_newlines,
         }
 
         if self.has_input:
@@ -283,7 +288,7 @@ class Shell(object):
 
 
 def shell(command, has_input=False, record_output=True, record_errors=True,
-          strip_empty=True):
+          strip_empty=True, universal_newlines=True):
     """
     A convenient shortcut for running commands.
 
@@ -307,6 +312,10 @@ def shell(command, has_input=False, record_output=True, record_errors=True,
     If set to ``True``, only non-empty lines from ``Shell.output`` or
     ``Shell.errors`` will be returned. (Default: ``True``)
 
+    Optionally accepts a ``universal_newlines`` parameter, which should be a
+    boolean. If set to ``False``, the output is recorded as bytes without
+    decoding. (Default: ``True``)
+
     Returns the ``Shell`` instance, which has been run with the given command.
 
     Example::
@@ -321,6 +330,7 @@ def shell(command, has_input=False, record_output=True, record_errors=True,
         has_input=has_input,
         record_output=record_output,
         record_errors=record_errors,
-        strip_empty=strip_empty
+        strip_empty=strip_empty,
+        universal_newlines=universal_newlines
     )
     return shell_obj.run(command)
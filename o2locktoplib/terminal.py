@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The terminal geometry of o2locktop
+The keyboard process owns the terminal, it reads the size by the ioctl at the
+start and on SIGWINCH, and shares it with the lockspace process and the
+printer process, so no one runs stty in every interval
+"""
+import fcntl
+import multiprocessing
+import struct
+import termios
+from o2locktoplib import config
+
+# The (rows, columns) of the terminal if its size is unknown
+DEFAULT_SIZE = (24, 80)
+
+
+def get_size(file_dec):
+    """
+    Return (rows, columns) of the terminal, None if the file descriptor is not
+    a terminal or its size is not set
+    """
+    try:
+        data = fcntl.ioctl(file_dec, termios.TIOCGWINSZ, b"\0" * 8)
+    except (IOError, OSError):
+        return None
+    rows, cols = struct.unpack("hhhh", data)[:2]
+    if rows <= 0 or cols <= 0:
+        return None
+    return rows, cols
+
+
+def top_n(size):
+    """
+    Return the count of the lock resources that fit the terminal
+    Parameters:
+        size(tuple): (rows, columns) of the terminal
+    """
+    rows, cols = size
+    # the rows wrap if the terminal is narrower than the report
+    if cols < config.COLUMNS:
+        return rows//2 - 4
+    return rows - 6
+
+
+class Geometry(object):
+    """
+    The size of the terminal that is shared between the processes, it is
+    updated by the keyboard process, and read by the others
+    """
+    def __init__(self):
+        self._size = multiprocessing.Array('i', 2)
+
+    def update(self, file_dec):
+        """
+        Read the size of the terminal
+        Returns:
+            bool: The size is changed
+        """
+        size = get_size(file_dec) or (0, 0)
+        with self._size.get_lock():
+            changed = tuple(self._size) != size
+            self._size[0], self._size[1] = size
+        return changed
+
+    @property
+    def size(self):
+        """
+        Return (rows, columns) of the terminal, None if it is unknown
+        """
+        with self._size.get_lock():
+            rows, cols = self._size
+        if rows == 0:
+            return None
+        return rows, cols
+
+    @property
+    def top_n(self):
+        """
+        Return the count of the lock resources that fit the terminal
+        """
+        return top_n(self.size or DEFAULT_SIZE)
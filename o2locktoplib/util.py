@@ -16,6 +16,10 @@ from o2locktoplib import config
 from o2locktoplib import shell
 
 PY2 = (sys.version_info[0] == 2)
+if PY2:
+    from pipes import quote
+else:
+    from shlex import quote
 LINUX = True if "linux" in platform.system().lower() else False
 
 def check_support_debug_v4_and_get_interval(lockspace, ip_addr):
@@ -125,6 +129,31 @@ def sleep(interval):
     """
     return time.sleep(interval)
 
+def monotonic():
+    """
+    Return the time of the monotonic clock, python2 has no monotonic clock,
+    the wall clock is used
+    """
+    if PY2:
+        return time.time()
+    return time.monotonic()
+
+def acquire(semaphore, timeout):
+    """
+    Acquire the semaphore, wait at most timeout seconds
+    Returns:
+        bool: True if the semaphore is acquired
+    """
+    if not PY2:
+        return semaphore.acquire(timeout=max(0, timeout))
+    # the acquire of python2 has no timeout, poll it
+    deadline = time.time() + timeout
+    while not semaphore.acquire(False):
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
 def uname_r(ip_addr=None):
     """
     Get the result of command "uname -r" on remote node
@@ -159,19 +188,46 @@ def prompt_sshkey_copy_id():
     return answer in ['Y', 'y']
 
 
-def get_one_cat(lockspace, ip_addr=None):
+def get_locking_state_path(lockspace):
     """
-    Cat the locking_state according to the fs uuid(lockspace) and ip
+    Return the path of the locking_state file according to the fs uuid(lockspace)
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
-    cmd = "cat /sys/kernel/debug/ocfs2/{lockspace}/locking_state".format(
-        lockspace=lockspace)
-    shell_obj = shell.shell(prefix + cmd)
-    ret = shell_obj.output()
+    return "/sys/kernel/debug/ocfs2/{lockspace}/locking_state".format(lockspace=lockspace)
+
+def get_one_cat(lockspace, ip_addr=None, ssh_options="", raw=False):
+    """
+    Cat the locking_state according to the fs uuid(lockspace) and ip
+    Parameters:
+        lockspace(str): the ocfs2 file system uuid
+        ip_addr(str): The node's ip, if None, cat the local file
+        ssh_options(str): The extra ssh options, e.g. the multiplexing options
+        raw(bool): If True, return the output as one bytes buffer instead of
+                   the list of lines
+    """
+    prefix = "ssh {0}root@{1} ".format(ssh_options, ip_addr) if ip_addr else ""
+    cmd = "cat {0}".format(get_locking_state_path(lockspace))
+    shell_obj = shell.shell(prefix + cmd, universal_newlines=not raw)
+    ret = shell_obj.output(raw=raw)
     if not ret and config.DEBUG:
         eprint("[DEBUG] {cmd} on {ip_addr} return len=0".format(cmd=cmd, ip_addr=ip_addr))
     return ret
 
+def get_one_cat_compressed(lockspace, ip_addr=None, ssh_options=""):
+    """
+    Cat the gzip compressed locking_state according to the fs uuid(lockspace) and ip
+    Parameters:
+        lockspace(str): the ocfs2 file system uuid
+        ip_addr(str): The node's ip, if None, compress the local file
+        ssh_options(str): The extra ssh options, e.g. the multiplexing options
+    Returns:
+        (int, bytes): The exit code and the compressed output, the exit code
+                      is 127 if there is no gzip command on the node
+    """
+    prefix = "ssh {0}root@{1} ".format(ssh_options, ip_addr) if ip_addr else ""
+    cmd = "gzip -1 -c {0}".format(get_locking_state_path(lockspace))
+    shell_obj = shell.shell(prefix + cmd, universal_newlines=False)
+    return shell_obj.code, shell_obj.output(raw=True)
+
 # fs_stat
 """
     Device => Id: 253,16  Uuid: 7635D31F539A483C8E2F4CC606D5D628  Gen: 0x6434F530  Label:
@@ -364,9 +420,10 @@ def device_to_mount_points(device, ip_addr=None):
 
 def clear_screen():
     """
-    Clear the screen
+    Clear the screen by the escape sequence instead of running clear, which
+    costs too much in the sub-second interval
     """
-    os.system("clear")
+    sys.stdout.write("\033[H\033[2J")
 
 
 def kill():
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+#encoding:utf-8
+"""
+The benchmark of o2locktop, it uses the synthetic locking_state,
+so it can run without the ocfs2 cluster
+
+usage: ./benchmark.py cat [--lines LINES] [--loops LOOPS]
+       ./benchmark.py parse [--lines LINES]
+       ./benchmark.py delta [--lines LINES] [--loops LOOPS]
+       ./benchmark.py interval [--lines LINES] [--changed CHANGED]
+       ./benchmark.py topn [--sizes SIZES] [--top TOP]
+       ./benchmark.py report [--lines LINES] [--nodes NODES] [--changed CHANGED]
+       ./benchmark.py processes [--lines LINES] [--nodes NODES] [--processes PROCESSES]
+       ./benchmark.py frequency [--lines LINES] [--nodes NODES] [--intervals INTERVALS]
+                                [--seconds SECONDS] [--changed CHANGED]
+       ./benchmark.py record [--lines LINES] [--nodes NODES] [--intervals INTERVALS]
+                             [--changed CHANGED]
+       ./benchmark.py replay [--lines LINES] [--nodes NODES] [--intervals INTERVALS]
+                             [--changed CHANGED]
+       ./benchmark.py capture [--lines LINES] [--nodes NODES] [--dumps DUMPS]
+                              [--changed CHANGED] [--processes PROCESSES]
+       ./benchmark.py screen [--locks LOCKS] [--nodes NODES] [--frames FRAMES]
+                             [--top TOP] [--changed CHANGED]
+"""
+import sys
+import os
+import gc
+import time
+import random
+import argparse
+import queue
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import multiprocessing
+from io import StringIO
+sys.path.append("../")
+from o2locktoplib import cat
+from o2locktoplib import pool
+from o2locktoplib import dlm
+from o2locktoplib import util
+from o2locktoplib import config
+from o2locktoplib import report
+from o2locktoplib import screen
+from o2locktoplib import recording
+from o2locktoplib import capture
+from synthetic import make_locking_state
+
+# There is no ocfs2 device in the benchmark
+util.lockspace_to_device = lambda uuid, ip_addr=None: (0, 0, "/mnt/benchmark")
+
+def timeit(func, loops):
+    """
+    Return the average seconds of running func
+    """
+    start = time.time()
+    for _ in range(loops):
+        func()
+    return (time.time() - start) / loops
+
+
+def bench_cat(args):
+    """
+    Compare running cat by the shell with reading the file in the process
+    """
+    tmp_dir = tempfile.mkdtemp()
+    locking_state = os.path.join(tmp_dir, "locking_state")
+    with open(locking_state, 'wb') as filp:
+        filp.write(make_locking_state(lines=args.lines))
+    util.get_locking_state_path = lambda lockspace: locking_state
+    local_cat = cat.LocalCat("benchmark")
+    assert util.get_one_cat("benchmark") == local_cat.get().decode().splitlines()
+    shell_time = timeit(lambda: util.get_one_cat("benchmark"), args.loops)
+    read_time = timeit(local_cat.get, args.loops)
+    print("{0} lines, {1} bytes".format(args.lines, os.path.getsize(locking_state)))
+    print("{0:24}{1:>12.2f} ms".format("cat by shell", shell_time * 1000))
+    print("{0:24}{1:>12.2f} ms".format("read in process", read_time * 1000))
+    os.remove(locking_state)
+    os.rmdir(tmp_dir)
+
+
+def make_lock_space(nodes=None):
+    """
+    Return a LockSpace for the benchmark, nodes is the list of node names,
+    None means the local mode
+    """
+    return dlm.LockSpace(nodes, "benchmark", 0, False, display_len=10)
+
+
+def measure(func):
+    """
+    Return the seconds and the peak memory(MB) of running func once,
+    the memory is measured in another run because tracemalloc slows it down
+    """
+    gc.collect()
+    start = time.time()
+    func()
+    seconds = time.time() - start
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def bench_parse(args):
+    """
+    Process one locking_state by Node, from the list of str lines and
+    from the bytes buffer
+    """
+    buf = make_locking_state(lines=args.lines)
+    text = buf.decode()
+
+    def process(get_raw):
+        node = make_lock_space()['local']
+        node.process_all_slot_worker(get_raw(), threading.Semaphore(0))
+
+    print("{0} lines, {1} bytes".format(args.lines, len(buf)))
+    print("{0:24}{1:>12}{2:>16}".format("input", "time(s)", "peak memory(MB)"))
+    for name, get_raw in (("list of str lines", lambda: text.splitlines()),
+                          ("bytes buffer", lambda: buf)):
+        seconds, peak = measure(lambda: process(get_raw))
+        print("{0:24}{1:>12.3f}{2:>16.1f}".format(name, seconds, peak))
+
+
+def bench_delta(args):
+    """
+    Compute the deltas of all the locks of one node, lock by lock and by numpy
+    """
+    node = make_lock_space()['local']
+    for seed in (0, 1):
+        node.process_all_slot_worker(make_locking_state(seed, args.lines),
+                                     threading.Semaphore(0))
+    locks = list(node.locks.values())
+
+    def get_all():
+        return [(lock.get_lock_level_info(dlm.LOCK_LEVEL_EX),
+                 lock.get_lock_level_info(dlm.LOCK_LEVEL_PR)) for lock in locks]
+
+    def compute():
+        if node.shot_table.compute_deltas():
+            get_all()
+
+    node.shot_table.deltas = None
+    expected = get_all()
+    lock_time = timeit(get_all, args.loops)
+    print("{0} locks".format(len(locks)))
+    print("{0:24}{1:>12.2f} ms".format("lock by lock", lock_time * 1000))
+    if dlm.numpy is None:
+        print("numpy is not installed")
+        return
+    node.shot_table.compute_deltas()
+    assert get_all() == expected
+    numpy_time = timeit(compute, args.loops)
+    print("{0:24}{1:>12.2f} ms".format("numpy", numpy_time * 1000))
+
+
+def bench_interval(args):
+    """
+    Process the locking_state of the next interval, in which only a part
+    of the locks are changed, with and without the unchanged lines
+    """
+    first = make_locking_state(lines=args.lines)
+    second = make_locking_state(1, args.lines, args.changed)
+    print("{0} lines, {1:.1%} changed".format(args.lines, args.changed))
+    for name, keep_lines in (("parse all the lines", False),
+                             ("skip unchanged lines", True)):
+        node = make_lock_space()['local']
+        node.process_all_slot_worker(first, threading.Semaphore(0))
+        if not keep_lines:
+            node._last_lines = {}
+        gc.collect()
+        start = time.time()
+        node.process_all_slot_worker(second, threading.Semaphore(0))
+        print("{0:24}{1:>12.2f} ms".format(name, (time.time() - start) * 1000))
+
+
+class FakeLockSet(dlm.LockSet):
+    """
+    The LockSet that has the given inode number and key_index, without any Lock
+    """
+    def __init__(self, inode_num, key_index):
+        dlm.LockSet.__init__(self)
+        self._inode_num = inode_num
+        self.key_index = key_index
+
+    @property
+    def inode_num(self):
+        return self._inode_num
+
+    def get_key_index(self):
+        return self.key_index
+
+
+def bench_topn(args):
+    """
+    Rank the LockSet(s) of the lock resources by LockSetGroup, 95% of the
+    lock resources are idle and 1% of them are the system inodes
+    """
+    lock_space = make_lock_space()
+    print("{0:>12}{1:>16}{2:>16}".format("locks", "append(ms)", "top n(ms)"))
+    for size in args.sizes:
+        random.seed(size)
+        lock_sets = [FakeLockSet(random.randint(1, 100) if random.random() < 0.01 else i + 100,
+                                 random.randint(1, 1000000) if random.random() < 0.05 else 0)
+                     for i in range(size)]
+        lsg = dlm.LockSetGroup(10, lock_space)
+        start = time.time()
+        for lock_set in lock_sets:
+            lsg.append(lock_set)
+        append_time = time.time() - start
+        start = time.time()
+        top = lsg.get_top_n_key_index(args.top)
+        top_time = time.time() - start
+        expected = sorted((i.key_index for i in lock_sets if i.inode_num > 10 and i.key_index),
+                          reverse=True)[:args.top]
+        assert [i.key_index for i in top] == expected
+        print("{0:>12}{1:>16.2f}{2:>16.3f}".format(size, append_time * 1000, top_time * 1000))
+        del lock_sets, lsg, top
+
+
+def bench_report(args):
+    """
+    Report the lockspace of the nodes, after an interval in which only
+    a part of the locks are changed
+    """
+    lock_space = make_lock_space(["node{0}".format(i) for i in range(args.nodes)])
+    for seed, changed in ((0, 1.0), (1, args.changed)):
+        buf = make_locking_state(seed, args.lines, changed)
+        for node in lock_space.node_list:
+            node.process_all_slot_worker(buf, threading.Semaphore(0))
+        if seed == 0:
+            lock_space.report_once()
+    print("{0} nodes, {1} lines, {2:.1%} changed".format(args.nodes, args.lines, args.changed))
+    # report_once resets the interval, so it is only measured once
+    gc.collect()
+    start = time.time()
+    lock_space.report_once()
+    print("{0:24}{1:>12.2f} ms".format("report", (time.time() - start) * 1000))
+
+
+def bench_processes(args):
+    """
+    Process one interval of all the nodes by the worker pool, parsing in the
+    threads and in the parse processes
+    """
+    nodes = ["node{0}".format(i) for i in range(args.nodes)]
+    bufs = [make_locking_state(i, args.lines) for i in range(args.nodes)]
+    print("{0} nodes, {1} lines, {2} cores".format(args.nodes, args.lines,
+                                                   multiprocessing.cpu_count()))
+    for processes in args.processes:
+        lock_space = make_lock_space(nodes)
+        if processes:
+            lock_space.parse_processes = processes
+            lock_space.parse_pool = dlm.create_parse_pool(processes)
+        worker_pool = pool.WorkerPool(len(nodes))
+        done = threading.Semaphore(0)
+        gc.collect()
+        start = time.time()
+        for node, buf in zip(lock_space.node_list, bufs):
+            worker_pool.submit(node.name, node.process_all_slot_worker, buf, done)
+        for _ in nodes:
+            done.acquire()
+        seconds = time.time() - start
+        worker_pool.stop()
+        lock_space.terminate_parse_pool()
+        name = "{0} processes".format(processes) if processes else "threads"
+        print("{0:24}{1:>12.3f} s".format(name, seconds))
+
+
+def bench_frequency(args):
+    """
+    Run the LockSpace with the local cats at every interval for some seconds,
+    and measure the cpu usage of collecting, processing and reporting
+    """
+    tmp_dir = tempfile.mkdtemp()
+    locking_state = os.path.join(tmp_dir, "locking_state")
+    # the locking_state is replaced by the links of the prepared files, so
+    # the writer doesn't count in the cpu usage
+    frames = []
+    for seed in range(4):
+        frame = os.path.join(tmp_dir, "frame{0}".format(seed))
+        with open(frame, 'wb') as filp:
+            filp.write(make_locking_state(seed, args.lines, args.changed))
+        frames.append(frame)
+    shutil.copy(frames[0], locking_state)
+    util.get_locking_state_path = lambda lockspace: locking_state
+    # every node reads the local file
+    cat.gen_cat = lambda which, lock_space, *args: cat.LocalCat(lock_space)
+    config.CLEAR = False
+    print("{0} nodes, {1} lines, {2:.1%} changed, {3} seconds".format(
+        args.nodes, args.lines, args.changed, args.seconds))
+    print("{0:>12}{1:>12}{2:>12}{3:>12}".format("interval", "reports", "missed", "cpu"))
+    for interval in args.intervals:
+        config.INTERVAL = interval
+        lock_space = make_lock_space(["node{0}".format(i) for i in range(args.nodes)])
+        printer_queue = queue.Queue()
+        thread = threading.Thread(target=lock_space.run, args=(printer_queue, interval))
+        thread.daemon = True
+        gc.collect()
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        thread.start()
+        index = 0
+        while time.time() - start < args.seconds:
+            index += 1
+            frame = frames[index % len(frames)]
+            if not os.path.samefile(frame, locking_state):
+                os.link(frame, locking_state + ".new")
+                os.rename(locking_state + ".new", locking_state)
+            time.sleep(interval)
+        lock_space.stop()
+        thread.join()
+        cpu = sum(os.times()[:2]) - cpu_start
+        seconds = time.time() - start
+        print("{0:>12}{1:>12}{2:>12}{3:>12.1%}".format(
+            interval, printer_queue.qsize(), lock_space._scheduler.missed, cpu / seconds))
+    shutil.rmtree(tmp_dir)
+
+
+def bench_record(args):
+    """
+    Compare the bytes of the recording with the text log of -o and the
+    locking_state, and measure the time of recording the samples
+    """
+    tmp_dir = tempfile.mkdtemp()
+    print("{0} nodes, {1} lines, {2:.1%} changed, {3} intervals".format(
+        args.nodes, args.lines, args.changed, args.intervals))
+    print("{0:24}{1:>16}{2:>16}".format("", "bytes/interval", "record ms"))
+    results = []
+    for compress in (False, True):
+        lock_space = make_lock_space(["node{0}".format(i) for i in range(args.nodes)])
+        recorder = recording.Recorder(os.path.join(tmp_dir, "recording"), compress=compress)
+        recorder.start({}, [node.name for node in lock_space.node_list])
+        text_bytes = 0
+        raw_bytes = 0
+        record_time = 0
+        for seed in range(args.intervals + 1):
+            buf = make_locking_state(seed, args.lines, 1.0 if seed == 0 else args.changed)
+            if seed == 1:
+                # the first interval has all the locks, it is not counted
+                written_bytes = recorder.written_bytes
+                record_time = 0
+            for node in lock_space.node_list:
+                changes = node._process_all_slot(buf)
+                start = time.time()
+                recorder.record_sample(node.record_sample(recorder, time.time(), *changes))
+                record_time += time.time() - start
+                raw_bytes += len(buf)
+            record = lock_space.report_once()
+            recorder.record_report(time.time(), list(range(args.nodes)))
+            text_bytes += len(report.format_report(record)) + 3
+        recorder.close()
+        results.append((compress, (recorder.written_bytes - written_bytes) / args.intervals,
+                        record_time * 1000 / args.intervals))
+    shutil.rmtree(tmp_dir)
+    print("{0:24}{1:>16.0f}".format("locking_state", raw_bytes / (args.intervals + 1)))
+    print("{0:24}{1:>16.0f}".format("text log(top 10)", text_bytes / (args.intervals + 1)))
+    for compress, size, record_ms in results:
+        print("{0:24}{1:>16.0f}{2:>16.2f}".format(
+            "recording" + (" compressed" if compress else ""), size, record_ms))
+
+
+def bench_replay(args):
+    """
+    Compare processing the locking_state and reporting every interval with
+    replaying the recording of it as fast as possible, the replay reports
+    the same, the first interval that has all the locks is not counted
+    """
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "recording")
+    nodes = ["node{0}".format(i) for i in range(args.nodes)]
+    lock_space = make_lock_space(nodes)
+    lock_space.recorder = recording.Recorder(path)
+    lock_space.recorder.start({}, nodes)
+    records = []
+    live_time = 0
+    for seed in range(args.intervals + 1):
+        buf = make_locking_state(seed, args.lines, 1.0 if seed == 0 else args.changed)
+        start = time.time()
+        for node in lock_space.node_list:
+            node.process_all_slot_worker(buf, threading.Semaphore(0))
+        records.append(lock_space.report_once(None, seed))
+        if seed:
+            live_time += time.time() - start
+        lock_space.recorder.record_report(seed, list(range(args.nodes)))
+    lock_space.recorder.close()
+    replayed = []
+    put_times = []
+    class ReplayQueue(object):
+        def put(self, msg):
+            replayed.append(msg["report"])
+            put_times.append(time.time())
+    replay_space = dlm.LockSpace(nodes, "benchmark", 0, False, display_len=10, offline=True)
+    start = time.time()
+    _, samples = replay_space.replay(ReplayQueue(), recording.read_frames(path), speed=0)
+    replay_time = time.time() - start
+    assert replayed == records
+    size = os.path.getsize(path)
+    shutil.rmtree(tmp_dir)
+    print("{0} nodes, {1} lines, {2:.1%} changed, {3} intervals, {4} bytes recorded".format(
+        args.nodes, args.lines, args.changed, args.intervals + 1, size))
+    print("{0:24}{1:>16}{2:>16}".format("", "ms/interval", "reports/s"))
+    for name, seconds in (("process and report", live_time),
+                          ("replay", put_times[-1] - put_times[0])):
+        print("{0:24}{1:>16.2f}{2:>16.1f}".format(
+            name, seconds * 1000 / args.intervals, args.intervals / seconds))
+    print("{0} samples replayed in {1:.2f} s with the first interval".format(
+        samples, replay_time))
+
+
+def bench_capture(args):
+    """
+    Analyze a synthetic capture of the dumps of every node by the parse
+    processes, and measure the throughput of the dumps
+    """
+    tmp_dir = tempfile.mkdtemp()
+    size = 0
+    for node in range(args.nodes):
+        node_dir = os.path.join(tmp_dir, "node{0}".format(node))
+        os.mkdir(node_dir)
+        for seed in range(args.dumps):
+            path = os.path.join(node_dir, "locking_state.{0}".format(1546300800 + seed * 5))
+            with open(path, "wb") as filp:
+                filp.write(make_locking_state(seed, args.lines,
+                                              1.0 if seed == 0 else args.changed))
+            size += os.path.getsize(path)
+    print("{0} nodes, {1} dumps, {2} lines, {3:.1%} changed, {4:.1f} MB, {5} cores".format(
+        args.nodes, args.dumps, args.lines, args.changed, size / 1e6,
+        multiprocessing.cpu_count()))
+    print("{0:24}{1:>12}{2:>12}".format("", "s", "MB/s"))
+    for processes in args.processes:
+        gc.collect()
+        start = time.time()
+        capture.analyze(tmp_dir, StringIO(), processes=processes or None)
+        seconds = time.time() - start
+        name = "{0} processes".format(processes) if processes else "no process"
+        print("{0:24}{1:>12.2f}{2:>12.1f}".format(name, seconds, size / 1e6 / seconds))
+    shutil.rmtree(tmp_dir)
+
+
+def bench_screen(args):
+    """
+    Compare the bytes written to the terminal by reprinting the whole screen
+    and by the differential screen, the numbers of the changed part of the
+    lock resources are random in every frame, so their ranks change too
+    """
+    random.seed(0)
+    nodes = ["node{0}".format(i) for i in range(args.nodes)]
+    values = {}
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    # only one display mode is shown in a run
+    screens = {False: screen.Screen(devnull), True: screen.Screen(devnull)}
+    full_bytes = {False: 0, True: 0}
+    diff_bytes = {False: 0, True: 0}
+    for frame in range(args.frames + 1):
+        for inode in range(args.locks):
+            if frame == 0 or random.random() < args.changed:
+                ex_num, pr_num = random.randint(1, 100), random.randint(1, 100)
+                ex_time, pr_time = ex_num * random.randint(1000, 9000), pr_num * random.randint(1000, 9000)
+                values[inode] = (ex_num, ex_time, ex_time // ex_num, pr_num, pr_time, pr_time // pr_num)
+        top = sorted(values, key=lambda inode: values[inode][1], reverse=True)[:args.top]
+        record = report.new_record(time.strftime("%Y-%m-%d %H:%M:%S"), False,
+                                   (sum(i[0] for i in values.values()),
+                                    sum(i[3] for i in values.values())),
+                                   [("M", args.locks)], [])
+        for inode in top:
+            report.append_lock_set(record, "M    {0}".format(inode), values[inode],
+                                   [(node, values[inode]) for node in nodes])
+        for detailed in (False, True):
+            lines = report.format_report(record, detailed).split("\n")
+            written = screens[detailed].render(lines)
+            if frame == 0:
+                continue
+            full_bytes[detailed] += len((screen.CLEAR + "\n".join(lines) + "\n").encode())
+            diff_bytes[detailed] += written
+    os.close(devnull)
+    print("{0} lock resources, {1:.1%} changed, top {2}, {3} nodes, {4} frames".format(
+        args.locks, args.changed, args.top, args.nodes, args.frames))
+    print("{0:24}{1:>16}{2:>16}".format("bytes/frame", "whole screen", "differential"))
+    for detailed in (False, True):
+        print("{0:24}{1:>16.0f}{2:>16.0f}".format(
+            "detailed" if detailed else "simple",
+            full_bytes[detailed] / args.frames, diff_bytes[detailed] / args.frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="The benchmark of o2locktop")
+    subparsers = parser.add_subparsers(dest="what")
+    parser_cat = subparsers.add_parser("cat", help="LocalCat against cat by the shell")
+    parser_cat.add_argument("--lines", type=int, default=100000)
+    parser_cat.add_argument("--loops", type=int, default=20)
+    parser_cat.set_defaults(func=bench_cat)
+    parser_parse = subparsers.add_parser("parse", help="Node parsing the locking_state")
+    parser_parse.add_argument("--lines", type=int, default=100000)
+    parser_parse.set_defaults(func=bench_parse)
+    parser_delta = subparsers.add_parser("delta", help="the deltas of all the locks")
+    parser_delta.add_argument("--lines", type=int, default=100000)
+    parser_delta.add_argument("--loops", type=int, default=10)
+    parser_delta.set_defaults(func=bench_delta)
+    parser_interval = subparsers.add_parser("interval", help="Node parsing the next interval")
+    parser_interval.add_argument("--lines", type=int, default=100000)
+    parser_interval.add_argument("--changed", type=float, default=0.05)
+    parser_interval.set_defaults(func=bench_interval)
+    parser_topn = subparsers.add_parser("topn", help="LockSetGroup ranking the lock resources")
+    parser_topn.add_argument("--sizes", type=int, nargs="+",
+                             default=[10000, 100000, 1000000, 5000000])
+    parser_topn.add_argument("--top", type=int, default=50)
+    parser_topn.set_defaults(func=bench_topn)
+    parser_report = subparsers.add_parser("report", help="LockSpace reporting an interval")
+    parser_report.add_argument("--lines", type=int, default=100000)
+    parser_report.add_argument("--nodes", type=int, default=3)
+    parser_report.add_argument("--changed", type=float, default=0.05)
+    parser_report.set_defaults(func=bench_report)
+    parser_processes = subparsers.add_parser("processes", help="parsing in the parse processes")
+    parser_processes.add_argument("--lines", type=int, default=300000)
+    parser_processes.add_argument("--nodes", type=int, default=8)
+    parser_processes.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser_processes.set_defaults(func=bench_processes)
+    parser_frequency = subparsers.add_parser("frequency", help="the cpu usage at every interval")
+    parser_frequency.add_argument("--lines", type=int, default=10000)
+    parser_frequency.add_argument("--nodes", type=int, default=3)
+    parser_frequency.add_argument("--intervals", type=float, nargs="+",
+                                  default=[0.1, 0.25, 1, 5])
+    parser_frequency.add_argument("--seconds", type=float, default=10)
+    parser_frequency.add_argument("--changed", type=float, default=0.05)
+    parser_frequency.set_defaults(func=bench_frequency)
+    parser_record = subparsers.add_parser("record", help="the bytes of the recording")
+    parser_record.add_argument("--lines", type=int, default=100000)
+    parser_record.add_argument("--nodes", type=int, default=3)
+    parser_record.add_argument("--intervals", type=int, default=10)
+    parser_record.add_argument("--changed", type=float, default=0.05)
+    parser_record.set_defaults(func=bench_record)
+    parser_replay = subparsers.add_parser("replay", help="replaying the recording")
+    parser_replay.add_argument("--lines", type=int, default=100000)
+    parser_replay.add_argument("--nodes", type=int, default=3)
+    parser_replay.add_argument("--intervals", type=int, default=10)
+    parser_replay.add_argument("--changed", type=float, default=0.05)
+    parser_replay.set_defaults(func=bench_replay)
+    parser_capture = subparsers.add_parser("capture", help="analyzing the captured dumps")
+    parser_capture.add_argument("--lines", type=int, default=100000)
+    parser_capture.add_argument("--nodes", type=int, default=3)
+    parser_capture.add_argument("--dumps", type=int, default=8)
+    parser_capture.add_argument("--changed", type=float, default=0.05)
+    parser_capture.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser_capture.set_defaults(func=bench_capture)
+    parser_screen = subparsers.add_parser("screen", help="the bytes written to the terminal")
+    parser_screen.add_argument("--locks", type=int, default=1000)
+    parser_screen.add_argument("--nodes", type=int, default=3)
+    parser_screen.add_argument("--frames", type=int, default=100)
+    parser_screen.add_argument("--top", type=int, default=40)
+    parser_screen.add_argument("--changed", type=float, default=0.05)
+    parser_screen.set_defaults(func=bench_screen)
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        sys.exit(0)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
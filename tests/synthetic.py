@@ -0,0 +1,40 @@
+"""
+The synthetic locking_state of the tests and the benchmark, so they can run
+without the ocfs2 cluster
+"""
+import os
+
+PATH = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(PATH, "locking_state_data.txt")) as fd:
+    TEMPLATE = fd.readline().rstrip('\n').split('\t')
+
+# The counters that a lock adds in every seed by default:
+# lock_num_prmode, lock_num_exmode, lock_total_prmode, lock_total_exmode
+DELTAS = (1, 2, 1000, 3000)
+
+
+def make_locking_state(seed=0, lines=20, changed=1.0, every=1, deltas=None):
+    """
+    Return the bytes of a synthetic locking_state which has 'lines' lock
+    resources, the lock i is the inode i + 100, and its counters grow with the seed
+    Parameters:
+        seed(int): The count of the steps of the counters
+        lines(int): The count of the lock resources
+        changed(float): Only the first 'changed' ratio of the locks use the seed
+        every(int): Only the lock i that i % every == every - 1 uses the seed,
+                    e.g. 2 for the odd locks
+        deltas(function): deltas(i) returns the counters that the lock i adds in
+                          every seed, DELTAS by default
+    """
+    ret = []
+    for i in range(lines):
+        steps = seed if i < lines * changed and i % every == every - 1 else 0
+        pr_num, ex_num, pr_time, ex_time = deltas(i) if deltas else DELTAS
+        fields = list(TEMPLATE)
+        fields[1] = "M000000{0:016x}{1:08x}".format(i + 100, i)
+        fields[74] = str(i + steps * pr_num)
+        fields[75] = str(i + steps * ex_num)
+        fields[78] = str(i * 100 + steps * pr_time)
+        fields[79] = str(i * 100 + steps * ex_time)
+        ret.append('\t'.join(fields))
+    return ('\n'.join(ret) + '\n').encode()
@@ -0,0 +1,117 @@
+"""
+unit test for capture.py
+"""
+import io
+import os
+import sys
+import gzip
+import time
+import shutil
+import tempfile
+sys.path.append("../")
+import pytest
+from o2locktoplib import dlm
+from o2locktoplib import report
+from o2locktoplib import capture
+from synthetic import make_locking_state
+
+NODES = ["node1", "node2"]
+START_TIME = 1546300800.0
+
+@pytest.fixture
+def tmp_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+def make_capture(directory, rounds=4):
+    """
+    Write the dumps of every node every 5 seconds, node2 dumps a second later,
+    the third dump of node1 is gzipped, and return {node name: [(time, bytes)]}
+    """
+    dumps = {}
+    for node_name in NODES:
+        os.mkdir(os.path.join(directory, node_name))
+        dumps[node_name] = []
+        for seed in range(rounds):
+            when = START_TIME + seed * 5 + NODES.index(node_name)
+            data = make_locking_state(seed, 15 if node_name == "node2" and seed == 2 else 20,
+                                      every=2)
+            path = os.path.join(directory, node_name, "locking_state.{0}".format(
+                time.strftime("%Y%m%d-%H%M%S", time.localtime(when))))
+            if node_name == "node1" and seed == 2:
+                with gzip.open(path + ".gz", 'wb') as filp:
+                    filp.write(data)
+            else:
+                with open(path, 'wb') as filp:
+                    filp.write(data)
+            dumps[node_name].append((when, data))
+    return dumps
+
+def test_dump_time(tmp_dir):
+    expected = time.mktime((2019, 1, 1, 8, 0, 5, 0, 0, -1))
+    assert capture.dump_time("locking_state.20190101-080005") == expected
+    assert capture.dump_time("/capture/node1/ls_2019-01-01_08:00:05.gz") == expected
+    assert capture.dump_time("locking_state.1546300800.5") == 1546300800.5
+    # the time is the modification time if the name has no time
+    path = os.path.join(tmp_dir, "locking_state")
+    open(path, 'w').close()
+    os.utime(path, (START_TIME, START_TIME))
+    assert capture.dump_time(path) == START_TIME
+
+def test_find_dumps(tmp_dir):
+    with pytest.raises(ValueError):
+        capture.find_dumps(tmp_dir)
+    make_capture(tmp_dir)
+    dumps = capture.find_dumps(tmp_dir)
+    assert sorted(dumps) == NODES
+    assert [i[0] for i in dumps["node2"]] == [START_TIME + i * 5 + 1 for i in range(4)]
+    # the directory of one node
+    assert list(capture.find_dumps(os.path.join(tmp_dir, "node1"))) == ["node1"]
+
+def test_split_rounds():
+    dumps = {"node1": [(0, "a0"), (5, "a1"), (10, "a2")],
+             "node2": [(1, "b0"), (11, "b2")]}
+    # node2 missed a dump, node1 is alone in the second round
+    assert capture.split_rounds(dumps) == [[("node1", 0, "a0"), ("node2", 1, "b0")],
+                                           [("node1", 5, "a1")],
+                                           [("node1", 10, "a2"), ("node2", 11, "b2")]]
+
+def test_min_hang_times():
+    dumps = {"node1": [(0, "a0"), (60, "a1"), (180, "a2")],
+             "node2": [(1, "b0"), (3, "b1")],
+             "node3": [(2, "c0")]}
+    # the dumps are minutes apart, a lock waiting for a few seconds is not hanged
+    assert capture.min_hang_times(dumps) == {"a0": 60, "a1": 60, "a2": 120,
+                                             "b0": 5, "b1": 5, "c0": 5}
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_analyze(tmp_dir, processes):
+    """
+    Test the intervals are reported the same as the LockSpace that processes
+    the dumps, and the whole capture sums the deltas of the intervals
+    """
+    dumps = make_capture(tmp_dir)
+    out = io.StringIO()
+    assert capture.analyze(tmp_dir, out, 5, processes=processes) == 3
+    sections = out.getvalue().split("\n\n\n")
+    lock_space = dlm.LockSpace(NODES, "test", 0, False, display_len=5, offline=True)
+    expected = []
+    for seed in range(4):
+        for node in lock_space.node_list:
+            when, data = dumps[node.name][seed]
+            node.process_all_slot_worker(data, None, when)
+        record = lock_space.report_once(None, START_TIME + seed * 5 + 1)
+        if seed:
+            expected.append(report.format_report(record))
+    assert [i.split("\n", 1)[1] if i.startswith("o2locktop") else i
+            for i in sections[:3]] == expected
+    whole = sections[3].split("\n")
+    assert whole[0] == "whole capture, 3 intervals"
+    # the odd locks change in every interval on both nodes, the locks that
+    # node2 missed once are cleared, they rank lower
+    row = whole[5].split()
+    assert int(row[1]) % 2 == 1 and int(row[1]) < 115
+    assert [float(i) for i in row[2:]] == [12, 18000, 1500, 6, 6000, 1000]
+    for node_row in whole[6:8]:
+        assert [float(i) for i in node_row.split()[1:]] == [6, 9000, 1500, 3, 3000, 1000]
@@ -39,3 +39,126 @@ def test_cat(lockspace, mode):
         else:
             cat_with_mode = cat.SshCat(lockspace, '127.0.0.1')
             assert cat.gen_cat('local', lockspace).get(), "test SshCat faild"
+
+def test_get_session():
+    session = cat.get_session('127.0.0.1')
+    assert session is cat.get_session('127.0.0.1'), "test get_session faild"
+    assert session is not cat.get_session('node2'), "test get_session faild"
+    assert "-oControlPath=" in session.options, "test SshSession options faild"
+    assert "-oControlMaster=auto" in session.options, "test SshSession options faild"
+
+def test_session_stats():
+    session = cat.get_session('node3')
+    assert cat.session_stats()['node3'] == \
+           {"connects":0, "reconnects":0, "reuses":0}, "test session_stats faild"
+    session.acquire()
+    assert session.connects == 1, "test SshSession acquire faild"
+    # there is no master connection, check should not count a reconnect
+    assert not session.check(), "test SshSession check faild"
+    assert session.reconnects == 0, "test SshSession check faild"
+
+def test_stream_cat():
+    import subprocess
+    stream_cat = cat.gen_cat('stream', config.lockspace, 'node3')
+    assert stream_cat.paced, "test StreamCat faild"
+    assert "locking_state" in stream_cat._remote_loop(), "test StreamCat faild"
+    # feed two frames by a local process instead of the remote loop
+    frames = "{0} 100.5\nline1\nline2\n{1}\n{0} 105.5\nline3\n{1}\n".format(
+        cat.FRAME_BEGIN.decode(), cat.FRAME_END.decode())
+    stream_cat._popen = subprocess.Popen(["printf", frames],
+                                         stdout=subprocess.PIPE)
+    stream_cat._start_reader()
+    # both frames arrive before the get, the old one is skipped
+    stream_cat._reader.join()
+    assert stream_cat.get() == b"line3", "test StreamCat faild"
+    assert stream_cat.timestamp == 105.5, "test StreamCat faild"
+    assert stream_cat.skipped_frames == 1, "test StreamCat faild"
+    assert stream_cat.frame_lines == 3, "test StreamCat faild"
+    # the stream is broken after the frames
+    assert stream_cat.get() == b"", "test StreamCat faild"
+    assert stream_cat._reader is None, "test StreamCat faild"
+
+def test_stream_cat_late_delta():
+    import subprocess
+    stream_cat = cat.gen_cat('stream', config.lockspace, 'node3', 5, True)
+    # the delta frames that are skipped are still applied in the order
+    frames = "{0} 100 delta\n+1 line1\n+2 line2\n{1}\n{0} 105 delta\n=1 line1b\n{1}\n" \
+             "{0} 110 delta\n-2\n+3 line3\n{1}\n".format(
+                 cat.FRAME_BEGIN.decode(), cat.FRAME_END.decode())
+    stream_cat._popen = subprocess.Popen(["printf", frames],
+                                         stdout=subprocess.PIPE)
+    stream_cat._start_reader()
+    stream_cat._reader.join()
+    assert stream_cat.get() == b"line1b\nline3", "test StreamCat delta mode faild"
+    assert stream_cat.timestamp == 110, "test StreamCat delta mode faild"
+    assert stream_cat.skipped_frames == 2, "test StreamCat delta mode faild"
+    stream_cat.stop()
+
+def test_stream_cat_delta(tmpdir, monkeypatch):
+    import subprocess
+    locking_state = tmpdir.join("locking_state")
+    monkeypatch.setattr(util, "get_locking_state_path", lambda lockspace: str(locking_state))
+    locking_state.write("0x4\tM0001\t1\n0x4\tM0002\t2\n")
+    stream_cat = cat.StreamCat(config.lockspace, 'node3', 0.2, delta=True)
+    # run the remote loop locally instead of through ssh
+    stream_cat._popen = subprocess.Popen(["sh", "-c", stream_cat._remote_loop()],
+                                         stdout=subprocess.PIPE)
+    stream_cat._start_reader()
+    try:
+        assert sorted(stream_cat.get().split(b'\n')) == [b"0x4\tM0001\t1", b"0x4\tM0002\t2"],\
+        "test StreamCat delta mode faild"
+        assert stream_cat.frame_lines == 2, "test StreamCat delta mode faild"
+        # replace the file atomically, so the remote loop never reads a half file
+        tmpdir.join("new").write("0x4\tM0001\t3\n0x4\tM0003\t4\n")
+        tmpdir.join("new").rename(locking_state)
+        lines = stream_cat.get()
+        # the first frame after the change may be read before the write
+        if stream_cat.frame_lines == 0:
+            lines = stream_cat.get()
+        assert sorted(lines.split(b'\n')) == [b"0x4\tM0001\t3", b"0x4\tM0003\t4"],\
+        "test StreamCat delta mode faild"
+        # changed M0001, added M0003 and removed M0002, the unchanged
+        # frames since the last get have no line
+        assert stream_cat.frame_lines == 3, "test StreamCat delta mode faild"
+        assert stream_cat.get() == lines, "test StreamCat delta mode faild"
+        assert stream_cat.frame_lines == 0, "test StreamCat delta mode faild"
+    finally:
+        stream_cat.stop()
+
+def test_ssh_cat_compress(tmpdir, monkeypatch):
+    locking_state = tmpdir.join("locking_state")
+    locking_state.write("line1\nline2\n" * 100)
+    monkeypatch.setattr(util, "get_locking_state_path", lambda lockspace: str(locking_state))
+    get_one_cat_compressed = util.get_one_cat_compressed
+    # compress the local file instead of the remote one
+    monkeypatch.setattr(util, "get_one_cat_compressed",
+                        lambda lockspace, ip_addr, ssh_options: \
+                        get_one_cat_compressed(lockspace, None))
+    ssh_cat = cat.gen_cat('ssh', config.lockspace, 'node3', True)
+    assert ssh_cat.get() == b"line1\nline2\n" * 100, "test SshCat compress faild"
+    assert 0 < ssh_cat.wire_bytes < ssh_cat.raw_bytes, "test SshCat compress faild"
+    assert ssh_cat._compress, "test SshCat compress faild"
+    # fall back to the plain cat if there is no gzip
+    monkeypatch.setattr(util, "get_one_cat_compressed",
+                        lambda lockspace, ip_addr, ssh_options: (127, b''))
+    monkeypatch.setattr(util, "get_one_cat",
+                        lambda lockspace, ip_addr, ssh_options, raw: b"plain")
+    assert ssh_cat.get() == b"plain", "test SshCat compress faild"
+    assert not ssh_cat._compress, "test SshCat compress faild"
+
+def test_local_cat_read(tmpdir, monkeypatch):
+    locking_state = tmpdir.join("locking_state")
+    monkeypatch.setattr(util, "get_locking_state_path", lambda lockspace: str(locking_state))
+    monkeypatch.setattr(cat.LocalCat, "BUFFER_SIZE", 16)
+    local_cat = cat.LocalCat(config.lockspace)
+    # the file is bigger than the buffer
+    locking_state.write("line1\nline2\n" * 10)
+    assert local_cat.get() == b"line1\nline2\n" * 10, "test LocalCat read faild"
+    buffer_size = len(local_cat._buffer)
+    assert buffer_size >= 120, "test LocalCat read faild"
+    # the buffer is reused
+    locking_state.write("line3\n")
+    assert local_cat.get() == b"line3\n", "test LocalCat read faild"
+    assert len(local_cat._buffer) == buffer_size, "test LocalCat read faild"
+    locking_state.remove()
+    assert local_cat.get() == b'', "test LocalCat read faild"
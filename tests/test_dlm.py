@@ -2,13 +2,18 @@
 unit test for dlm.py
 """
 import sys
+import time
+import array
 import os
+import threading
 import pytest
 import config
 sys.path.append("../")
 from o2locktoplib import dlm
 from o2locktoplib import util
+from o2locktoplib import pool
 import check_env
+from synthetic import make_locking_state
 
 PATH = os.path.dirname(os.path.abspath(__file__))
 with open(os.path.join(PATH, "locking_state_data.txt")) as fd:
@@ -82,14 +87,206 @@ def test_class_shot():
                            '0x00x00x00x00x00x00x00x00x00x00x00x0'\
                            '0x00x00x00x00x00x00x00x00x00x00x00x0'\
                            '0x00x00x00x0'
-    assert shot.lock_num_prmode == '1'
-    assert shot.lock_num_exmode == '0'
-    assert shot.lock_num_prmode_failed == '0'
-    assert shot.lock_num_exmode_failed == '0'
-    assert shot.lock_total_prmode == '21937'
-    assert shot.lock_total_exmode == '0'
-    assert shot.lock_max_exmode == '0'
-    assert shot.lock_refresh == '0'
+    assert shot.lock_num_prmode == 1
+    assert shot.lock_num_exmode == 0
+    assert shot.lock_num_prmode_failed == 0
+    assert shot.lock_num_exmode_failed == 0
+    assert shot.lock_total_prmode == 21937
+    assert shot.lock_total_exmode == 0
+    assert shot.lock_max_exmode == 0
+    assert shot.lock_refresh == 0
+
+def test_class_shot_bytes():
+    """
+    Test the Shot class in dlm.py with the bytes input
+    """
+    shot = dlm.Shot(LOCKING_STATE_STR0.encode())
+    shot_str = dlm.Shot(LOCKING_STATE_STR0)
+    assert shot.legal(), "got an ilegal shot"
+    assert shot.name == shot_str.name, "Shot bytes input test failed"
+    for key, _ in shot_str.debug_format:
+        assert getattr(shot, key) == getattr(shot_str, key), "Shot bytes input test failed"
+
+def test_parse_shot():
+    """
+    Test the parse_shot function in dlm.py
+    """
+    shot = dlm.Shot(LOCKING_STATE_STR1)
+    name, values = dlm.parse_shot(LOCKING_STATE_STR1)
+    assert name == shot.name, "parse_shot name test failed"
+    assert values == shot.values, "parse_shot values test failed"
+    name, values = dlm.parse_shot(LOCKING_STATE_STR1.encode())
+    assert name == shot.name, "parse_shot bytes input test failed"
+    assert values == shot.values, "parse_shot bytes input test failed"
+
+def test_parse_chunk():
+    """
+    Test the split_chunks and parse_chunk functions in dlm.py
+    """
+    buf = (LOCKING_STATE_STR1 + "\n" + LOCKING_STATE_STR2 + "\n").encode()
+    chunks = dlm.split_chunks(buf, 4)
+    assert b"".join(chunks) == buf, "split_chunks test failed"
+    names, counters, hang_times = dlm.parse_chunk(buf)
+    assert names.split("\n") == [dlm.parse_shot(LOCKING_STATE_STR1)[0],
+                                  dlm.parse_shot(LOCKING_STATE_STR2)[0]]
+    counters = array.array(dlm.COUNTER_TYPECODE, counters)
+    assert counters[0] == dlm.parse_shot(LOCKING_STATE_STR1)[1][0]
+    assert len(counters) == 2 * len(dlm.COUNTER_FIELDS)
+    assert len(array.array('d', hang_times)) == 2 * len(dlm.HANG_FIELDS)
+
+def test_get_hang_time(monkeypatch):
+    """
+    Test the get_hang_time function in dlm.py, the sub-second interval
+    doesn't shrink the hang time
+    """
+    now = 1546300800.5
+    lock_wait = int((now - 1.25) * 1000000)
+    monkeypatch.setattr(dlm.config, "INTERVAL", 0.1)
+    assert dlm.get_hang_time(lock_wait, 5, now) == (0, 0), "get_hang_time test failed"
+    assert dlm.get_hang_time(0, 5, now) == (0, 0), "get_hang_time test failed"
+    lock_wait = int((now - 6.25) * 1000000)
+    assert dlm.get_hang_time(lock_wait, 5, now) == (0, 6.25), "get_hang_time test failed"
+    assert dlm.get_hang_time(lock_wait, 3, now) == (6.25, 0), "get_hang_time test failed"
+    monkeypatch.setattr(dlm.config, "INTERVAL", 10)
+    assert dlm.get_hang_time(lock_wait, 5, now) == (0, 0), "get_hang_time test failed"
+    # the captured dumps are judged by their spacing instead of the interval
+    assert dlm.get_hang_time(lock_wait, 5, now, 6) == (0, 6.25), "get_hang_time test failed"
+    assert dlm.get_hang_time(lock_wait, 5, now, 60) == (0, 0), "get_hang_time test failed"
+
+def test_class_shot_table():
+    """
+    Test the ShotTable class in dlm.py
+    """
+    table = dlm.ShotTable()
+    lock_id = table.alloc()
+    assert len(table) == 1
+    assert table.get("lock_num_prmode", lock_id, -1) == None
+    values1 = list(dlm.Shot(LOCKING_STATE_STR1).values)
+    values2 = list(dlm.Shot(LOCKING_STATE_STR2).values)
+    table.push(lock_id, values1)
+    # like the list of Shot(es), the first Shot is kept in the first slot
+    assert table.get("lock_num_prmode", lock_id, 0) == 24
+    assert table.get("lock_num_prmode", lock_id, -1) == None
+    table.push(lock_id, values2)
+    assert table.get("lock_num_prmode", lock_id, -2) == 24
+    assert table.get("lock_num_prmode", lock_id, -1) == 34
+    table.push(lock_id, values1)
+    assert table.get("lock_num_prmode", lock_id, 0) == 34
+    assert table.get("lock_num_prmode", lock_id, 1) == 24
+    assert table.get("lock_total_prmode_suse", lock_id, 1) == None
+    # the unchanged lock keeps the counters, and the next push clears the mark
+    table.repeat(lock_id)
+    assert table.unchanged[lock_id] == 1
+    assert table.get("lock_num_prmode", lock_id, -1) == 24
+    table.push(lock_id, values2)
+    assert table.unchanged[lock_id] == 0
+    assert table.get("lock_num_prmode", lock_id, -2) == 24
+    table.clear(lock_id)
+    assert table.get("lock_num_prmode", lock_id, -1) == None
+
+def test_shot_table_push_many():
+    """
+    Test the push_many method of ShotTable is same as push
+    """
+    buf = (LOCKING_STATE_STR1 + LOCKING_STATE_STR2).encode()
+    _, counters, hang_times = dlm.parse_chunk(buf)
+    counters = array.array(dlm.COUNTER_TYPECODE, counters)
+    hang_times = array.array('d', hang_times)
+    values = [dlm.Shot(LOCKING_STATE_STR1).values, dlm.Shot(LOCKING_STATE_STR2).values]
+    table = dlm.ShotTable()
+    lock_ids = [table.alloc(), table.alloc()]
+    expected = dlm.ShotTable()
+    for _ in lock_ids:
+        expected.alloc()
+    for indexes in ([0, 1], [1, 0], [0, 1]):
+        table.push_many(lock_ids, indexes, counters, hang_times)
+        for lock_id, i in zip(lock_ids, indexes):
+            expected.push(lock_id, values[i])
+        for field in dlm.TABLE_FIELDS:
+            for lock_id in lock_ids:
+                for index in (0, 1):
+                    assert table.get(field, lock_id, index) == \
+                           expected.get(field, lock_id, index), "push_many test failed"
+
+def test_shot_table_compute_deltas():
+    """
+    Test the compute_deltas method of ShotTable, it only works with numpy
+    """
+    table = dlm.ShotTable()
+    lock_id = table.alloc()
+    table.push(lock_id, dlm.Shot(LOCKING_STATE_STR1).values)
+    table.push(lock_id, dlm.Shot(LOCKING_STATE_STR2).values)
+    if not table.compute_deltas():
+        assert dlm.numpy is None
+        assert table.deltas is None
+        return
+    delta_time, delta_num, key_index = table.deltas[dlm.LOCK_LEVEL_EX]
+    assert (delta_time[lock_id], delta_num[lock_id], key_index[lock_id]) == (100, 20, 5)
+    delta_time, delta_num, key_index = table.deltas[dlm.LOCK_LEVEL_PR]
+    assert (delta_time[lock_id], delta_num[lock_id], key_index[lock_id]) == (100, 10, 10)
+    # the deltas are dropped once the table is changed
+    table.push(lock_id, dlm.Shot(LOCKING_STATE_STR1).values)
+    assert table.deltas is None
+
+def test_lock_hang_latest_shot():
+    """
+    Test the lock is hanged only if its latest Shot is hanged, with numpy
+    and without it
+    """
+    # lock_num_prmode, lock_num_exmode, lock_total_prmode, lock_total_exmode,
+    # lock_prmode_hang_time, lock_exmode_hang_time
+    not_hanged = [1, 2, 1000, 3000, 0, 0]
+    hanged = [1, 2, 1000, 3000, 0, 7.5]
+    later = [2, 4, 2000, 6000, 0, 0]
+    hanged_later = [2, 4, 2000, 6000, 0, 7.5]
+    numpy = dlm.numpy
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    try:
+        for dlm.numpy in set([numpy, None]):
+            node = lock_space["node1"]
+            lock = dlm.Lock(node)
+            node.shot_table.push(lock.lock_id, hanged)
+            node.shot_table.push(lock.lock_id, later)
+            node.shot_table.compute_deltas()
+            # the older Shot was hanged, the lock is not waiting any more
+            assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (3000, 2, 1500), \
+            "Lock hang test failed"
+            node.shot_table.push(lock.lock_id, not_hanged)
+            node.shot_table.push(lock.lock_id, hanged_later)
+            node.shot_table.compute_deltas()
+            assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == \
+                   (float('inf'), 2, 7500000), "Lock hang test failed"
+            assert lock.get_lock_level_info(dlm.LOCK_LEVEL_PR) == (1000, 1, 1000), \
+            "Lock hang test failed"
+    finally:
+        dlm.numpy = numpy
+
+def test_shot_table_latest():
+    """
+    Test the latest method of ShotTable, with numpy and without it
+    """
+    values1 = list(dlm.Shot(LOCKING_STATE_STR1).values)
+    values2 = list(dlm.Shot(LOCKING_STATE_STR2).values)
+    table = dlm.ShotTable()
+    lock_ids = [table.alloc(), table.alloc(), table.alloc()]
+    table.push(lock_ids[0], values1)
+    table.push(lock_ids[0], values2)
+    table.push(lock_ids[1], values1)
+    counter_len = len(dlm.COUNTER_FIELDS)
+    numpy = dlm.numpy
+    try:
+        for dlm.numpy in set([numpy, None]):
+            counters, hang_times = table.latest(lock_ids)
+            assert counters.tolist() == values2[:counter_len] + values1[:counter_len] + \
+                   [0] * counter_len, "latest test failed"
+            assert hang_times.tolist() == values2[counter_len:] + values1[counter_len:] + \
+                   [0] * len(dlm.HANG_FIELDS), "latest test failed"
+            counters, hang_times = table.latest(lock_ids[:1], deltas=True)
+            assert counters.tolist() == [j - i for i, j in zip(values1, values2)][:counter_len], \
+                   "latest test failed"
+            assert hang_times.tolist() == values2[counter_len:], "latest test failed"
+    finally:
+        dlm.numpy = numpy
 
 # In this test, I insert two diff kind of lock in Lock object
 # and it should throw AssertionError
@@ -179,26 +376,26 @@ def test_class_lock_2():
     shot2 = dlm.Shot(LOCKING_STATE_STR2)
     assert shot1.name == shot2.name
     lock.append(shot2)
-    shot = lock._shots[-1]
+    shot = shot2
     # 34      22      0       0           21278   15984   36      15      1       22484   22484
-    assert shot.lock_num_prmode == '34'
-    assert shot.lock_num_exmode == '22'
-    assert shot.lock_num_prmode_failed == '0'
-    assert shot.lock_num_exmode_failed == '0'
-    assert shot.lock_total_prmode == '21278'
-    assert shot.lock_total_exmode == '15984'
-    assert shot.lock_max_exmode == '15'
-    assert shot.lock_refresh == '1'
+    assert shot.lock_num_prmode == 34
+    assert shot.lock_num_exmode == 22
+    assert shot.lock_num_prmode_failed == 0
+    assert shot.lock_num_exmode_failed == 0
+    assert shot.lock_total_prmode == 21278
+    assert shot.lock_total_exmode == 15984
+    assert shot.lock_max_exmode == 15
+    assert shot.lock_refresh == 1
     total_time_field, total_num_field = lock._lock_level_2_field(dlm.LOCK_LEVEL_EX)
     assert total_time_field == 'lock_total_exmode'
     assert total_num_field == 'lock_num_exmode'
-    assert lock._get_data_field_indexed(total_time_field, -1) == "15984"
-    assert lock._get_data_field_indexed(total_num_field, -1) == "22"
+    assert lock._get_data_field_indexed(total_time_field, -1) == 15984
+    assert lock._get_data_field_indexed(total_num_field, -1) == 22
     total_time_field, total_num_field = lock._lock_level_2_field(dlm.LOCK_LEVEL_PR)
     assert total_time_field == 'lock_total_prmode'
     assert total_num_field == 'lock_num_prmode'
-    assert lock._get_data_field_indexed(total_time_field, -1) == "21278"
-    assert lock._get_data_field_indexed(total_num_field, -1) == "34"
+    assert lock._get_data_field_indexed(total_time_field, -1) == 21278
+    assert lock._get_data_field_indexed(total_num_field, -1) == 34
     #lock._get_latest_data_field_delta(total_time_field)
     assert lock.name == shot2.name
     assert node is lock.node
@@ -217,15 +414,15 @@ def test_class_lock_2():
     assert lock._get_latest_data_field_delta(total_time_field) == -100
     assert lock._get_latest_data_field_delta(total_num_field) == -10
     assert lock._get_latest_data_field_delta_abs(total_time_field) == \
-           int(getattr(lock._shots[-1], total_time_field))
+           int(getattr(shot1, total_time_field))
     assert lock._get_latest_data_field_delta_abs(total_num_field) == \
-           int(getattr(lock._shots[-1], total_num_field))
+           int(getattr(shot1, total_num_field))
 
 
     # test for _get_data_field_indexed in class Lock
-    assert lock._get_data_field_indexed('lock_num_prmode', -2) == '34'
-    assert lock._get_data_field_indexed('lock_total_exmode', -2) == '15984'
-    assert lock._get_data_field_indexed('lock_total_exmode', -1) == '15884'
+    assert lock._get_data_field_indexed('lock_num_prmode', -2) == 34
+    assert lock._get_data_field_indexed('lock_total_exmode', -2) == 15984
+    assert lock._get_data_field_indexed('lock_total_exmode', -1) == 15884
     assert lock._get_data_field_indexed('lock_total_exmode_suse', -1) == None
     assert lock._get_data_field_indexed('lock_total_exmode_suse', -2) == None
     assert lock._get_data_field_indexed('lock_total_exmode_suse', 100) == None
@@ -275,6 +472,43 @@ def complete_lockset(data):
     return lockset
 
 
+def test_lock_set_report_once_rate():
+    """
+    Test the report_once method of LockSet shows the per-second rates of the
+    sample window of every node
+    """
+    lock_space = dlm.LockSpace(["node1", "node2"], "test", 0, False, display_len=5,
+                               offline=True)
+    # the odd locks wait 2 times in EX(3000ns) and once in PR(1000ns) on both
+    # nodes, in the windows of 2s and 4s
+    for node, window in zip(lock_space.node_list, [2.0, 4.0]):
+        node.process_all_slot_worker(make_locking_state(0, every=2), None, 100.0)
+        node.process_all_slot_worker(make_locking_state(1, every=2), None, 100.0 + window)
+        assert node.sample_window() == window, "Node sample_window test error"
+    lock_set = dlm.LockSet()
+    for node in lock_space.node_list:
+        lock_set.append([i for i in node.locks.values() if i.name.inode_num == 101][0])
+    acquisitions = (dlm.config.ex_locks, dlm.config.pr_locks)
+    dlm.config.RATE = True
+    try:
+        values, nodes = lock_set.report_values()
+        ret = lock_set.report_once()
+    finally:
+        dlm.config.RATE = False
+        dlm.config.ex_locks, dlm.config.pr_locks = acquisitions
+    assert values == (1.5, 2250, 1500, 0.75, 750, 1000), "LockSet report_values test error"
+    assert sorted(nodes) == [("node1", (1.0, 1500, 1500, 0.5, 500, 1000)),
+                             ("node2", (0.5, 750, 1500, 0.25, 250, 1000))], \
+    "LockSet report_values test error"
+    # the AVG doesn't change with the window
+    assert ret['simple'].split()[2:] == ["1.5", "2250", "1500", "0.8", "750", "1000"], \
+    "LockSet report_once function test error"
+    dlm.config.RATE = False
+    values, _ = lock_set.report_values()
+    dlm.config.ex_locks, dlm.config.pr_locks = acquisitions
+    assert values == (4, 6000, 1500, 2, 2000, 1000), "LockSet report_values test error"
+
+
 class TestLockSet:
     """
     Test the LockSet clasin dlm.py
@@ -390,7 +624,6 @@ class TestLockSetGroup():
         assert lsg._max_sys_inode_num == 10, "LockSetGroup __init__ function test error"
         assert lsg.lock_space == lockspace, "LockSetGroup __init__ function test error"
         assert lsg._debug == lockspace._debug, "LockSetGroup __init__ function test error"
-        assert not lsg._sort_flag, "LockSetGroup __init__ function test error"
         assert lsg._max_length == 100, "LockSetGroup __init__ function test error"
 
     def test_LockSetGroup_append(self, complete_lockset):
@@ -524,20 +757,22 @@ class TestNode():
         shot = dlm.Shot(data[0])
         assert node["node"]._locks[shot.name] != None,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_names) == 1,\
+        assert len(node["node"]._new_locks) == 1,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_types) == 0,\
+        assert len(node["node"]._lock_types) == 0,\
         "Node process_one_shot method test error"
         node["node"].process_one_shot(data[0])
         assert len(node["node"]._locks) == 1,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_names) == len(config.nodelist),\
+        assert len(node["node"]._new_locks) == 1,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_types) == 0,\
-        "Node process_one_shot method test error"
-        node["node"]._lock_space.reduce_lock_name()
-        assert len(node["node"]._lock_space._lock_names) == 1,\
-        "LockSpace reduce_lock_name method test error"
+        new_locks, changed_lock_names, lock_types = node["node"].pop_accounting()
+        assert new_locks == [node["node"]._locks[shot.name]],\
+        "Node pop_accounting method test error"
+        assert not changed_lock_names and not lock_types,\
+        "Node pop_accounting method test error"
+        assert not node["node"]._new_locks,\
+        "Node pop_accounting method test error"
 
     def test_contains(self, node, data):
         """
@@ -587,7 +822,9 @@ class TestLockSpace:
         "LockSpace __init__ method test error"
         assert lockspace.name == config.lockspace,\
         "LockSpace name method test error"
-        assert not lockspace._lock_names,\
+        assert not lockspace._lock_sets,\
+        "LockSpace __init__ method test error"
+        assert not lockspace._changed_lock_names,\
         "LockSpace __init__ method test error"
         assert not lockspace._lock_types,\
         "LockSpace __init__ method test error"
@@ -647,6 +884,315 @@ class TestLockSpace:
             node = lockspace[node]
             node.process_one_shot(data[0])
             node.process_one_shot(data[1])
+        lockspace.merge_nodes()
         lockset = lockspace.lock_name_to_lock_set(dlm.Shot(data[0]).name)
         assert lockset.name == dlm.Shot(data[0]).name
         assert len(lockset._lock_list) == len(config.nodelist)
+
+class FakeCat(object):
+    """
+    The cat of a node that returns the synthetic locking_state, the third
+    get of node2 calls hang first
+    """
+    paced = False
+
+    def __init__(self, node_name, hang):
+        self.node_name = node_name
+        self.hang = hang
+        self.seed = 0
+
+    def get(self):
+        if self.node_name == "node2" and self.seed == 2:
+            self.hang()
+        self.seed += 1
+        return make_locking_state(self.seed - 1, every=2)
+
+def run_lock_space(monkeypatch, reports, hang=lambda: None, slow_node=None,
+                   nodes=("node1", "node2")):
+    """
+    Run an offline LockSpace of the nodes with the fake cats at the
+    interval of 0.2s, and return [(record, the monotonic time it is put)]
+    of the reports
+    """
+    lock_space = dlm.LockSpace(list(nodes), "test", 0, False, display_len=5,
+                               offline=True)
+    monkeypatch.setattr(dlm.cat, "gen_cat", lambda which, lockspace, node_name, *args:
+                        FakeCat(node_name, hang))
+    put = []
+    class PrinterQueue(object):
+        def put(self, msg):
+            put.append((msg["report"], util.monotonic()))
+            if len(put) == reports:
+                lock_space.stop()
+    if slow_node is not None:
+        slow_node(lock_space["node2"])
+    thread = threading.Thread(target=lock_space.run, args=(PrinterQueue(), 0.2))
+    thread.daemon = True
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "LockSpace run test failed"
+    return lock_space, put
+
+def test_lock_space_late_node(monkeypatch):
+    """
+    Test the node that hangs in the cat misses the deadline, the others are
+    still reported in every interval, and the late node is reported with its
+    last data and its age until it finishes
+    """
+    hung = threading.Event()
+    lock_space, put = run_lock_space(monkeypatch, 5, hung.wait)
+    hung.set()
+    records = [i[0] for i in put]
+    # the first barrier has a full interval, every node has data
+    assert records[0]["stale_nodes"] == [], "LockSpace run test failed"
+    assert records[1]["stale_nodes"] == [], "LockSpace run test failed"
+    for record in records[2:4]:
+        assert [i[0] for i in record["stale_nodes"]] == ["node2"], "LockSpace run test failed"
+        assert record["stale_nodes"][0][1] > 0, "LockSpace run test failed"
+        # the last deltas of node2 are still in the report
+        assert any("node2" in i for i in record["node_names"]), "LockSpace run test failed"
+    assert records[3]["stale_nodes"][0][1] > records[2]["stale_nodes"][0][1], \
+    "LockSpace run test failed"
+    assert lock_space["node2"].mutex.acquire(False), "LockSpace run test failed"
+
+def test_lock_space_worker_threads(monkeypatch):
+    """
+    Test the nodes are collected by the fixed count of workers, there is no
+    thread per node
+    """
+    monkeypatch.setattr(dlm.config, "WORKERS", 2)
+    threads = threading.active_count()
+    nodes = ["node{0}".format(i) for i in range(8)]
+    lock_space, put = run_lock_space(monkeypatch, 3, nodes=nodes)
+    # the workers and the thread of LockSpace.run, which is stopped
+    assert threading.active_count() <= threads + 2, "LockSpace run test failed"
+    assert lock_space._worker_pool.workers == 2, "LockSpace run test failed"
+    # every node is collected in every interval
+    for record, _ in put:
+        assert record["stale_nodes"] == [], "LockSpace run test failed"
+    assert sorted(put[-1][0]["node_names"][0]) == nodes, "LockSpace run test failed"
+
+def test_lock_space_slow_node(monkeypatch):
+    """
+    Test the report doesn't wait for the node that is late in processing,
+    the node is reported from the snapshot of its last locking_state, and
+    its data is merged once it finishes
+    """
+    done = []
+    def slow_node(node):
+        process = node._process_all_slot
+        def slow_process(raw_slot_strs):
+            if len(node.sample_times) == 2 and not done:
+                time.sleep(0.3)
+                done.append(util.monotonic())
+            return process(raw_slot_strs)
+        node._process_all_slot = slow_process
+    lock_space, put = run_lock_space(monkeypatch, 4, slow_node=slow_node)
+    assert [i[0] for i in put[2][0]["stale_nodes"]] == ["node2"], "LockSpace run test failed"
+    assert put[2][1] < done[0], "LockSpace run test failed"
+    # the last deltas of node2 are still in the report
+    assert all("node2" in i for i in put[2][0]["node_names"]), "LockSpace run test failed"
+    assert put[3][0]["stale_nodes"] == [], "LockSpace run test failed"
+    assert lock_space["node2"].busy_snapshot is None, "LockSpace run test failed"
+    assert lock_space["node2"].mutex.acquire(False), "LockSpace run test failed"
+
+def test_node_busy_snapshot():
+    """
+    Test the Lock(s) of a busy node are read from the snapshot of its last
+    locking_state while its worker changes the ShotTable, and the worker
+    still accounts its own deltas
+    """
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    node = lock_space["node1"]
+    node.process_all_slot_worker(make_locking_state(0, every=2), None, 100.0)
+    node.process_all_slot_worker(make_locking_state(1, every=2), None, 105.0)
+    node.pop_accounting()
+    lock = [i for i in node.locks.values() if i.name.inode_num == 101][0]
+    expected = (lock.get_lock_level_info(dlm.LOCK_LEVEL_EX), lock.get_key_index(), 5.0)
+    node.busy_snapshot = node.snapshot
+    node.process_all_slot_worker(make_locking_state(3, every=2), None, 106.0)
+    assert len(node.pop_accounting()[1]) == 10, "Node busy snapshot test failed"
+    if dlm.numpy is not None:
+        assert (lock.get_lock_level_info(dlm.LOCK_LEVEL_EX), lock.get_key_index(),
+                node.sample_window()) == expected, "Node busy snapshot test failed"
+    node.busy_snapshot = None
+    assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (6000, 4, 1500), \
+    "Node busy snapshot test failed"
+    assert node.sample_window() == 1.0, "Node busy snapshot test failed"
+
+def test_node_unchanged_lines(monkeypatch):
+    """
+    Test the lines that are same as the previous locking_state are not parsed
+    again, their Lock(s) are marked unchanged and have no delta, and the lines
+    of the waiting locks are always parsed
+    """
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    node = lock_space["node1"]
+    lines = make_locking_state(0, every=2).split(b"\n")
+    # lock 0 waits since 800s before the dump
+    fields = lines[0].split(b"\t")
+    fields[len(fields) - dlm.Shot.tail_len_v4 - 1 + 12] = b"1546300000000000"
+    lines[0] = b"\t".join(fields)
+    node.process_all_slot_worker(b"\n".join(lines), None, 1546300800.0)
+    assert len(node._last_lines) == 19, "Node unchanged lines test failed"
+    parsed = []
+    parse_shot = dlm._parse_shot
+    def counted_parse_shot(source, *args):
+        parsed.append(source)
+        return parse_shot(source, *args)
+    monkeypatch.setattr(dlm, "_parse_shot", counted_parse_shot)
+    lines[1:] = make_locking_state(1, every=2).split(b"\n")[1:]
+    node.process_all_slot_worker(b"\n".join(lines), None, 1546300805.0)
+    # the waiting lock 0 and the odd locks are parsed
+    assert [int(i.split(b"\t")[1][-8:], 16) for i in parsed] == [0] + list(range(1, 20, 2)), \
+    "Node unchanged lines test failed"
+    for lock_name, lock in node.locks.items():
+        unchanged = lock_name.inode_num % 2 == 0 and lock_name.inode_num != 100
+        assert node.shot_table.unchanged[lock.lock_id] == unchanged, \
+        "Node unchanged lines test failed"
+        assert lock.has_delta() != unchanged, "Node unchanged lines test failed"
+        if lock_name.inode_num % 2:
+            assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (3000, 2, 1500), \
+            "Node unchanged lines test failed"
+    # the lock 0 is still waiting, it is hanged
+    lock = [i for i in node.locks.values() if i.name.inode_num == 100][0]
+    assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX)[0] == float('inf'), \
+    "Node unchanged lines test failed"
+
+class CollidedLine(bytes):
+    """
+    The line whose hash collides with all the other lines
+    """
+    def __hash__(self):
+        return 0
+
+def test_node_line_hash_collision():
+    """
+    Test the line whose hash is same as a line of the previous locking_state
+    is parsed, instead of repeating the Lock of that line
+    """
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    node = lock_space["node1"]
+    for seed in range(2):
+        lines = make_locking_state(seed, every=2).splitlines(True)
+        node.process_all_slot_worker([CollidedLine(i) for i in lines], None, 100.0 + seed * 5)
+    assert len(node.locks) == 20, "Node line hash collision test failed"
+    # the odd locks are changed, and no lock repeats the Lock of another line
+    for lock_name, lock in node.locks.items():
+        expected = (3000, 2, 1500) if lock_name.inode_num % 2 else (0, 0, 0)
+        assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == expected, \
+        "Node line hash collision test failed"
+
+def test_node_worker_parse_error(monkeypatch):
+    """
+    Test the node worker releases the semaphore if the parsing raises, so the
+    node isn't late forever, and its next locking_state is processed
+    """
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    node = lock_space["node1"]
+    parse_shot = dlm._parse_shot
+    def bad_parse_shot(source, *args):
+        raise ValueError("malformed line")
+    monkeypatch.setattr(dlm, "_parse_shot", bad_parse_shot)
+    worker_pool = pool.WorkerPool(1)
+    finished = threading.Semaphore(0)
+    worker_pool.submit("node1", node.process_all_slot_worker,
+                       make_locking_state(0), finished, 100.0)
+    assert util.acquire(finished, 5), "Node worker parse error test failed"
+    monkeypatch.setattr(dlm, "_parse_shot", parse_shot)
+    worker_pool.submit("node1", node.process_all_slot_worker,
+                       make_locking_state(1), finished, 105.0)
+    assert util.acquire(finished, 5), "Node worker parse error test failed"
+    worker_pool.stop()
+    assert len(node.locks) == 20, "Node worker parse error test failed"
+    assert node.sample_times[-1] == 105.0, "Node worker parse error test failed"
+
+def ex_deltas(i):
+    """
+    The lock i acquires EX once more in every seed, and waits (i + 1) * 100ns for it
+    """
+    return 0, 1, 0, (i + 1) * 100
+
+def test_lock_set_group_top_n():
+    """
+    Test the bounded min-heap of LockSetGroup keeps the LockSet(s) that have
+    the biggest key_index, the same as sorting all of them
+    """
+    lock_space = dlm.LockSpace(["node1"], "test", 0, False, offline=True)
+    node = lock_space["node1"]
+    node.process_all_slot_worker(make_locking_state(0, deltas=ex_deltas), None, 100.0)
+    node.process_all_slot_worker(make_locking_state(1, deltas=ex_deltas), None, 105.0)
+    lock_space.merge_nodes()
+    lock_sets = list(lock_space._lock_sets.values())
+    # the lock sets are appended in a mixed order
+    lock_sets = lock_sets[7:] + lock_sets[:7]
+    for max_length in (1, 5, 20, 600):
+        lsg = dlm.LockSetGroup(0, lock_space, max_length=max_length)
+        for lock_set in lock_sets:
+            lsg.append(lock_set)
+        assert len(lsg.lock_set_list) == min(max_length, 20), "LockSetGroup heap test failed"
+        top = lsg.get_top_n_key_index(min(max_length, 3))
+        # the key_index of the lock i is its EX AVG / 2
+        assert [i.key_index for i in top] == [(20 - i) * 50 for i in range(len(top))], \
+        "LockSetGroup top n test failed"
+    record = lsg.report_record(3, 105.5)
+    assert [i.split() for i in record["names"]] == [["M", str(i)] for i in (119, 118, 117)], \
+    "LockSetGroup report_record test failed"
+    # the system inodes are not ranked
+    lsg = dlm.LockSetGroup(117, lock_space, max_length=5)
+    for lock_set in lock_sets:
+        lsg.append(lock_set)
+    assert [i.inode_num for i in lsg.get_top_n_key_index(5)] == [119, 118], \
+    "LockSetGroup top n test failed"
+
+def test_lock_space_merge_nodes():
+    """
+    Test the LockSet(s) of the LockSpace are kept across the intervals, only
+    the new locks are added at the barrier, and only the changed names are
+    ranked
+    """
+    lock_space = dlm.LockSpace(["node1", "node2"], "test", 0, False, offline=True)
+    for node in lock_space.node_list:
+        node.process_all_slot_worker(make_locking_state(0, every=2), None, 100.0)
+    lock_space.merge_nodes()
+    lock_sets = dict(lock_space._lock_sets)
+    assert len(lock_sets) == 20, "LockSpace merge_nodes test failed"
+    assert all(len(i._lock_list) == 2 for i in lock_sets.values()), \
+    "LockSpace merge_nodes test failed"
+    # the first sample has no delta
+    assert not lock_space._changed_lock_names, "LockSpace merge_nodes test failed"
+    lock_space.report_once(None, 100.5)
+    for node in lock_space.node_list:
+        node.process_all_slot_worker(make_locking_state(1, 21, every=2), None, 105.0)
+    lock_space.merge_nodes()
+    assert len(lock_space._lock_sets) == 21, "LockSpace merge_nodes test failed"
+    for lock_name, lock_set in lock_sets.items():
+        assert lock_space._lock_sets[lock_name] is lock_set, "LockSpace merge_nodes test failed"
+        assert len(lock_set._lock_list) == 2, "LockSpace merge_nodes test failed"
+    assert sorted(i.inode_num for i in lock_space._changed_lock_names) == \
+           list(range(101, 120, 2)), "LockSpace merge_nodes test failed"
+    record = lock_space.report_once(None, 105.5)
+    assert len(record["names"]) == 10, "LockSpace report_once test failed"
+    assert not lock_space._changed_lock_names, "LockSpace report_once test failed"
+
+def test_lock_space_per_node_accounting():
+    """
+    Test the accounting of every node is merged at the barrier it finishes, a
+    node that misses the barrier keeps its accounting until the next one
+    """
+    lock_space = dlm.LockSpace(["node1", "node2"], "test", 0, False, offline=True)
+    node1, node2 = lock_space["node1"], lock_space["node2"]
+    records = []
+    for seed in range(3):
+        for node in lock_space.node_list:
+            node.process_all_slot_worker(make_locking_state(seed, every=2), None, 100.0 + seed)
+        # node2 misses the barrier of the seed 1
+        records.append(lock_space.report_once([node1] if seed == 1 else None, 100.5 + seed))
+    assert records[0]["lock_types"] == [], "LockSpace accounting test failed"
+    # only the 10 changed locks of node1 are counted
+    assert records[1]["lock_types"] == [("M", 10)], "LockSpace accounting test failed"
+    assert records[1]["stale_nodes"] == [("node2", 0.5)], "LockSpace accounting test failed"
+    # node2 brings the accounting of both seeds
+    assert records[2]["lock_types"] == [("M", 30)], "LockSpace accounting test failed"
+    assert records[2]["stale_nodes"] == [], "LockSpace accounting test failed"
+    assert node2.pop_accounting() == ([], [], {}), "Node pop_accounting test failed"
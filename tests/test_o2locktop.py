@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 from queue import Queue
 import pytest
 import config
@@ -75,6 +76,83 @@ def test_parse_args():
            not args["display_len"]and \
            not args["debug"]
 
+def test_parse_args_interval():
+    from o2locktoplib import config as o2locktop_config
+    try:
+        o2locktop.parse_args(['-i', '0.25', '-n', '127.0.0.1', '/mnt/ocfs2'])
+        assert o2locktop_config.INTERVAL == 0.25, "o2locktop parse_args test error"
+        # the remote nodes are streamed in the sub-second interval
+        assert o2locktop_config.STREAM, "o2locktop parse_args test error"
+        o2locktop.parse_args(['-i', '2', '/mnt/ocfs2'])
+        assert o2locktop_config.INTERVAL == 2, "o2locktop parse_args test error"
+        assert not o2locktop_config.STREAM, "o2locktop parse_args test error"
+        with pytest.raises(SystemExit):
+            o2locktop.parse_args(['-i', '0.05', '/mnt/ocfs2'])
+    finally:
+        o2locktop.parse_args(['/mnt/ocfs2'])
+
+def test_parse_args_record():
+    from o2locktoplib import config as o2locktop_config
+    try:
+        o2locktop.parse_args(['--record', '/tmp/o2locktop.rec', '--record-size', '0.5',
+                              '--record-compress', '/mnt/ocfs2'])
+        assert o2locktop_config.RECORD == '/tmp/o2locktop.rec', "o2locktop parse_args test error"
+        assert o2locktop_config.RECORD_SIZE == 512 * 1024, "o2locktop parse_args test error"
+        assert o2locktop_config.RECORD_COMPRESS, "o2locktop parse_args test error"
+        with pytest.raises(SystemExit):
+            o2locktop.parse_args(['--record-size', '-1', '/mnt/ocfs2'])
+    finally:
+        o2locktop.parse_args(['/mnt/ocfs2'])
+    assert o2locktop_config.RECORD is None, "o2locktop parse_args test error"
+
+def test_parse_args_replay(tmp_path):
+    from o2locktoplib import config as o2locktop_config
+    from o2locktoplib import recording
+    path = str(tmp_path / "o2locktop.rec")
+    recorder = recording.Recorder(path)
+    recorder.start({"lockspace": "test"}, ["node1"])
+    recorder.record_report(1546300800.0, [0])
+    recorder.close()
+    try:
+        args = o2locktop.parse_args(['--replay', path, '--speed', '0', '--seek', '+2.5', '-l', '5'])
+        assert args["mode"] == "replay", "o2locktop parse_args test error"
+        assert args["display_len"] == 5, "o2locktop parse_args test error"
+        assert o2locktop_config.REPLAY == path, "o2locktop parse_args test error"
+        assert o2locktop_config.SPEED == 0, "o2locktop parse_args test error"
+        assert o2locktop_config.SEEK == 1546300802.5, "o2locktop parse_args test error"
+        o2locktop.parse_args(['--replay', path, '--seek', '2019-01-01 08:00:00'])
+        assert o2locktop_config.SEEK == time.mktime((2019, 1, 1, 8, 0, 0, 0, 0, -1)), \
+        "o2locktop parse_args test error"
+        for wrong_args in (['--replay', path, '--speed', '-1'],
+                           ['--replay', path, '--seek', 'yesterday'],
+                           ['--replay', str(tmp_path / "missing.rec")],
+                           ['--seek', '+2', '/mnt/ocfs2']):
+            with pytest.raises(SystemExit):
+                o2locktop.parse_args(wrong_args)
+    finally:
+        o2locktop.parse_args(['/mnt/ocfs2'])
+    assert o2locktop_config.REPLAY is None, "o2locktop parse_args test error"
+    assert o2locktop_config.SEEK is None, "o2locktop parse_args test error"
+
+def test_parse_args_analyze(tmp_path):
+    from o2locktoplib import config as o2locktop_config
+    node_dir = tmp_path / "node1"
+    node_dir.mkdir()
+    (node_dir / "locking_state.20190101-080000").write_text(u"")
+    try:
+        args = o2locktop.parse_args(['--analyze', str(tmp_path), '-l', '5', '-o', 'top.log'])
+        assert args["mode"] == "analyze", "o2locktop parse_args test error"
+        assert args["display_len"] == 5, "o2locktop parse_args test error"
+        assert args["log"] == 'top.log', "o2locktop parse_args test error"
+        assert o2locktop_config.ANALYZE == str(tmp_path), "o2locktop parse_args test error"
+        for wrong_args in (['--analyze', str(tmp_path / "missing")],
+                           ['--analyze', str(tmp_path / "node2")]):
+            with pytest.raises(SystemExit):
+                o2locktop.parse_args(wrong_args)
+    finally:
+        o2locktop.parse_args(['/mnt/ocfs2'])
+    assert o2locktop_config.ANALYZE is None, "o2locktop parse_args test error"
+
 def test_parse_args_full_function(mount_point, node, lines, debug, log, version, wrong_arg):
     raw_args = mount_point + node + lines + debug + log + version + wrong_arg
     while '' in raw_args:
@@ -0,0 +1,44 @@
+"""
+unit test for pool.py
+"""
+import sys
+import threading
+sys.path.append("../")
+from o2locktoplib import pool
+
+def test_worker_pool():
+    """
+    Test the tasks are processed by the fixed count of workers
+    """
+    worker_pool = pool.WorkerPool(2)
+    assert worker_pool.workers == 2
+    done = threading.Semaphore(0)
+    threads = set()
+    def task():
+        threads.add(threading.current_thread())
+        done.release()
+    for i in range(10):
+        worker_pool.submit("node{0}".format(i % 3), task)
+    for _ in range(10):
+        done.acquire()
+    worker_pool.stop()
+    assert len(threads) <= 2
+    stats = worker_pool.stats()
+    assert stats["depth"] == 0
+    assert stats["max_depth"] >= 1
+    assert sorted(stats["keys"].keys()) == ["node0", "node1", "node2"]
+    assert sum(i["count"] for i in stats["keys"].values()) == 10
+
+def test_worker_pool_exception():
+    """
+    Test the worker keeps working after a task raises an exception
+    """
+    worker_pool = pool.WorkerPool(1)
+    done = threading.Semaphore(0)
+    def bad_task():
+        raise ValueError("test")
+    worker_pool.submit("node", bad_task)
+    worker_pool.submit("node", done.release)
+    assert done.acquire(timeout=5)
+    worker_pool.stop()
+    assert worker_pool.stats()["keys"]["node"]["count"] == 2
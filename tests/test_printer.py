@@ -1,12 +1,18 @@
 """
 Unit test for printer.py
 """
+import os
 import sys
+import time
+import threading
 sys.path.append("../")
 import pytest
 from o2locktoplib.printer import Printer
 from o2locktoplib.printer import SIMPLE_DISPLAY
 from o2locktoplib.printer import DETAILED_DISPLAY
+from o2locktoplib.printer import PrinterQueue
+from o2locktoplib import report
+from o2locktoplib import screen
 import config
 import check_env
 
@@ -61,3 +67,107 @@ class TestPrinter():
         "Printer set_display_mode method test error"
         with pytest.raises(AssertionError):
             printer.set_display_mode(3)
+
+    def test_activate_report(self):
+        printer = Printer(None)
+        record = report.new_record("2019-01-01 00:00:00", False, (3.0, 1.0), [("M", 1)], [])
+        report.append_lock_set(record, "M    5", (3, 30, 10, 1, 20, 20),
+                               [("node1", (3, 30, 10, 1, 20, 20))])
+        printer.activate_report(record)
+        assert printer.content == [None, None],\
+        "Printer activate_report method test error"
+        assert "node1" not in printer.get_content(),\
+        "Printer get_content method test error"
+        # the detailed mode is formatted when it is shown
+        assert printer.content[DETAILED_DISPLAY] is None,\
+        "Printer get_content method test error"
+        printer.toggle_display_mode()
+        assert "└─node1" in printer.get_content(),\
+        "Printer get_content method test error"
+        assert printer.content[DETAILED_DISPLAY] is not None,\
+        "Printer get_content method test error"
+
+    def test_refresh_screen(self):
+        read_end, write_end = os.pipe()
+        printer = Printer(None)
+        printer.screen = screen.Screen(write_end)
+        printer.prelude = "prelude"
+        printer.activate("title\nline1", "title\nline1\n└─node1")
+        printer._refresh(0)
+        assert printer.frame_bytes == len(screen.CLEAR + "prelude\ntitle\nline1\n"),\
+        "Printer _refresh method test error"
+        printer._refresh(0)
+        assert printer.frame_bytes == 0,\
+        "Printer _refresh method test error"
+        # only the node row is written after toggling the display mode
+        printer.toggle_display_mode()
+        printer._refresh(0)
+        assert os.read(read_end, 1024).endswith(
+            (screen.move(3, 0) + "└─node1" + screen.move(4, 0)).encode('utf-8')),\
+        "Printer _refresh method test error"
+        os.close(read_end)
+        os.close(write_end)
+
+def make_record(i):
+    record = report.new_record("2019-01-01 00:00:0{0}".format(i), False, (3.0, 1.0),
+                               [("M", 1)], [])
+    report.append_lock_set(record, "M    {0}".format(i), (3, 30, 10, 1, 20, 20),
+                           [("node1", (3, 30, 10, 1, 20, 20))])
+    return record
+
+def report_times(messages):
+    return [(i[0]['report']['time'][-1], i[1]) for i in messages]
+
+def test_printer_queue(tmp_path):
+    printer_queue = PrinterQueue(backlog=2)
+    for i in range(5):
+        printer_queue.put({'msg_type':'new_report', 'report':make_record(i), 'rows':0})
+    # the reports 0 and 1 are in the queue, the report 4 replaced 2 and 3
+    # in the pending slot
+    assert printer_queue.replaced == 2, "PrinterQueue put test error"
+    # the messages are sent to the pipe by the feeder thread of the queue
+    time.sleep(0.2)
+    messages = printer_queue.get_messages()
+    assert report_times(messages) == [("0", False), ("1", True)],\
+    "PrinterQueue get_messages test error"
+    assert printer_queue.dropped == 3, "PrinterQueue get_messages test error"
+    # the pending report is delivered once the printer takes the reports
+    time.sleep(0.2)
+    latest = printer_queue.get_messages()
+    assert report_times(latest) == [("4", True)], "PrinterQueue get_messages test error"
+    printer_queue.put({'msg_type':'kb_hit', 'what':'detial', 'rows':0})
+    assert printer_queue.get_messages() == [({'msg_type':'kb_hit', 'what':'detial', 'rows':0},
+                                             True)], "PrinterQueue get_messages test error"
+    # every report that the printer takes is written to the log, the replaced
+    # ones are noted
+    log = str(tmp_path / "o2locktop.log")
+    printer = Printer(log)
+    printer.printer_queue = printer_queue
+    for obj, shown in messages + latest:
+        assert printer._handle(obj, shown), "Printer _handle method test error"
+    printer.log.close()
+    assert printer.report["time"][-1] == "4", "Printer _handle method test error"
+    with open(log) as filp:
+        logged = filp.read()
+    assert [i for i in range(5) if "M    {0}".format(i) in logged] == [0, 1, 4],\
+    "Printer _handle method test error"
+    assert "2 reports are replaced" in logged, "Printer _handle method test error"
+
+def test_printer_queue_flush():
+    printer_queue = PrinterQueue(backlog=1)
+    for i in range(2):
+        printer_queue.put({'msg_type':'new_report', 'report':make_record(i), 'rows':0})
+    # the report 1 waits in the pending slot until the printer takes the report 0
+    flushed = threading.Event()
+    def flush():
+        printer_queue.flush()
+        flushed.set()
+    thread = threading.Thread(target=flush)
+    thread.daemon = True
+    thread.start()
+    assert not flushed.wait(0.2), "PrinterQueue flush test error"
+    assert report_times(printer_queue.get_messages()) == [("0", True)],\
+    "PrinterQueue flush test error"
+    assert flushed.wait(5), "PrinterQueue flush test error"
+    assert report_times(printer_queue.get_messages()) == [("1", True)],\
+    "PrinterQueue flush test error"
@@ -0,0 +1,159 @@
+"""
+unit test for recording.py
+"""
+import os
+import sys
+import array
+import shutil
+import tempfile
+import threading
+sys.path.append("../")
+import pytest
+from o2locktoplib import dlm
+from o2locktoplib import util
+from o2locktoplib import recording
+from synthetic import make_locking_state
+
+NODES = ["node1", "node2"]
+START_TIME = 1546300800.0
+
+def make_sample(node_id=1):
+    sample = recording.Sample(node_id, 1546300800.5, 3, ["M000000000000000000000500000000",
+                                                         "N000000000000000000000600000000"])
+    sample.new_counters = array.array(recording.COUNTER_TYPECODE, range(8))
+    sample.new_hangs = array.array('d', [0, 0, 1.5, 0])
+    sample.abs_ids = array.array(recording.ID_TYPECODE, [0])
+    sample.abs_counters = array.array(recording.COUNTER_TYPECODE, [10, 20, 30, 40])
+    sample.abs_hangs = array.array('d', [0, 0])
+    sample.delta_ids = array.array(recording.ID_TYPECODE, [1, 2])
+    sample.delta_counters = array.array(recording.COUNTER_TYPECODE, [1, -2, 3, 4, 5, 6, 7, 8])
+    sample.delta_hangs = array.array('d', [0, 0, 0, 2.0])
+    sample.cleared_ids = array.array(recording.ID_TYPECODE, [5])
+    return sample
+
+def assert_same_sample(sample, expected):
+    for name in recording.Sample.__slots__:
+        assert getattr(sample, name) == getattr(expected, name), \
+        "recording Sample test error: {0}".format(name)
+
+@pytest.fixture
+def tmp_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+def test_sample():
+    sample = make_sample()
+    payload = sample.encode()
+    assert payload[0:1] == recording.FRAME_TYPE.pack(recording.FRAME_SAMPLE)
+    assert_same_sample(recording.Sample.decode(payload), sample)
+    empty = recording.Sample(0, 0)
+    assert_same_sample(recording.Sample.decode(empty.encode()), empty)
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_recorder(tmp_dir, compress):
+    path = os.path.join(tmp_dir, "o2locktop.rec")
+    # the rotated file of an old recording is removed
+    open(recording.rotated_path(path, 3), 'w').close()
+    recorder = recording.Recorder(path, max_size=1, compress=compress)
+    recorder.start({"lockspace": "test"}, [None, "node1"])
+    assert recorder.node_ids == {None: 0, "node1": 1}
+    recorder.record_sample(make_sample())
+    # a node is processing, the rotation waits for the next report
+    recorder.record_report(1546300800.5, [0], lambda: [make_sample(0)], rotate=False)
+    assert recorder.path == path
+    recorder.record_report(1546300801.0, [0, 1], lambda: [make_sample(0)])
+    recorder.record_sample(make_sample())
+    recorder.close()
+    assert recorder.path == recording.rotated_path(path, 1)
+    assert not os.path.exists(recording.rotated_path(path, 3))
+    # a truncated frame at the end is dropped
+    with open(recorder.path, 'ab') as filp:
+        filp.write(recording.FRAME_HEADER.pack(100, 0) + b"\0")
+    frames = list(recording.read_frames(path))
+    assert [i[0] for i in frames] == [
+        recording.FRAME_INFO, recording.FRAME_SAMPLE, recording.FRAME_REPORT,
+        recording.FRAME_REPORT, recording.FRAME_INFO, recording.FRAME_KEYFRAME,
+        recording.FRAME_SAMPLE]
+    assert recording.decode_info(frames[0][1]) == {"lockspace": "test", "nodes": ["", "node1"]}
+    assert_same_sample(recording.Sample.decode(frames[1][1]), make_sample())
+    assert recording.decode_report(frames[2][1]) == (1546300800.5, [0])
+    assert recording.decode_report(frames[3][1]) == (1546300801.0, [0, 1])
+    assert_same_sample(recording.Sample.decode(frames[5][1]), make_sample(0))
+    assert recorder.written_bytes == sum(os.path.getsize(recording.rotated_path(path, i))
+                                         for i in (0, 1)) - len(recording.FRAME_HEADER.pack(100, 0) + b"\0")
+    if compress:
+        assert recorder.written_bytes < recorder.payload_bytes
+
+def test_read_frames_not_recording(tmp_dir):
+    path = os.path.join(tmp_dir, "o2locktop.log")
+    with open(path, 'w') as filp:
+        filp.write("o2locktop 1.0.10 /mnt/ocfs2 lockspace: 0123\n")
+    with pytest.raises(ValueError):
+        list(recording.read_frames(path))
+
+class ListQueue(list):
+    """
+    The printer queue of the replay
+    """
+    put = list.append
+
+def record_lock_space(path, rounds, max_size=0):
+    """
+    Record the samples of the LockSpace, and return the records of its reports
+    """
+    lock_space = dlm.LockSpace(NODES, "test", 0, False, display_len=5, offline=True)
+    lock_space.recorder = recording.Recorder(path, max_size)
+    lock_space.recorder.start({"lockspace": "test", "max_sys_inode_num": 0, "debug": False},
+                              NODES)
+    records = []
+    for seed in range(rounds):
+        for node in lock_space.node_list:
+            # some locks of node2 are gone and back
+            lines = 15 if node.name == "node2" and seed == 2 else 20
+            node.process_all_slot_worker(make_locking_state(seed, lines, every=2),
+                                         threading.Semaphore(0), START_TIME + seed)
+        records.append(lock_space.report_once(None, START_TIME + seed + 0.5))
+        lock_space.recorder.record_report(START_TIME + seed + 0.5, [0, 1],
+                                          lock_space.keyframes)
+    lock_space.recorder.close()
+    return records
+
+def replay_lock_space(path, index=0, speed=0, seek=None):
+    """
+    Return the records of the reports of the replay
+    """
+    lock_space = dlm.LockSpace(NODES, "test", 0, False, display_len=5, offline=True)
+    printer_queue = ListQueue()
+    reports, _ = lock_space.replay(printer_queue, recording.read_frames(path, index),
+                                   speed=speed, seek=seek)
+    assert reports == len(printer_queue)
+    return [i['report'] for i in printer_queue]
+
+def test_replay(tmp_dir):
+    """
+    Test the replay reports the same as the LockSpace that is recorded
+    """
+    path = os.path.join(tmp_dir, "o2locktop.rec")
+    records = record_lock_space(path, 5)
+    assert all(record["names"] for record in records[1:])
+    assert replay_lock_space(path) == records
+    # the reports are paced by the time of the recording
+    start = util.monotonic()
+    assert replay_lock_space(path, speed=100) == records
+    assert util.monotonic() - start >= 4 / 100.0
+    assert replay_lock_space(path, seek=START_TIME + 3) == records[3:]
+
+def test_replay_seek_rotated(tmp_dir):
+    """
+    Test the replay that seeks starts from the keyframes of a rotated file
+    """
+    path = os.path.join(tmp_dir, "o2locktop.rec")
+    records = record_lock_space(path, 5, max_size=1)
+    assert recording.first_report_time(recording.rotated_path(path, 3)) == START_TIME + 3.5
+    index = recording.seek_index(path, START_TIME + 3.5)
+    assert index == 3
+    assert recording.seek_index(path, START_TIME) == 0
+    assert replay_lock_space(path, index, seek=START_TIME + 3.5) == records[3:]
+    assert recording.read_info(path) == {"lockspace": "test", "max_sys_inode_num": 0,
+                                         "debug": False, "nodes": NODES}
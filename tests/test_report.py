@@ -0,0 +1,56 @@
+"""
+unit test for report.py
+"""
+import sys
+sys.path.append("../")
+from o2locktoplib import report
+
+def make_record(rate=False):
+    """
+    Return a record of two lock resources
+    """
+    record = report.new_record("2019-01-01 00:00:00", rate, (4.0, 6.0),
+                               [("M", 2), ("W", 1)], [("node3", 12.5), (None, None)])
+    report.append_lock_set(record, "M    5", (3, 30, 10, 4, 40, 10),
+                           [("node1", (1, 10, 10, 4, 40, 10)),
+                            ("node2", (2, 20, 10, 0, 0, 0))])
+    report.append_lock_set(record, "W    6", (1, float('inf'), 3000000000, 2, 8, 4),
+                           [("node1", (1, float('inf'), 3000000000, 2, 8, 4))])
+    return record
+
+def test_format_report():
+    """
+    Test the simple and the detailed screens of a record
+    """
+    record = make_record()
+    simple = report.format_report(record).split("\n")
+    assert simple[0] == "2019-01-01 00:00:00 lock acquisitions: total 10.0, EX 4.0, PR 6.0"
+    assert simple[1] == "lock resources: total 3, M 2, W 1; stale: node3 12s ago, local no data"
+    assert simple[2] == ""
+    assert simple[3].split()[:3] == ["TYPE", "INO", "EX"]
+    assert [i.split() for i in simple[4:]] == \
+           [["M", "5", "3", "30", "10", "4", "40", "10"],
+            ["W", "6", "1", "3000s(hang)", "--", "2", "8", "4"]]
+    detailed = report.format_report(record, detailed=True).split("\n")
+    assert [i.split()[0] for i in detailed[4:]] == \
+           ["M", "├─node1", "└─node2", "W", "└─node1"]
+    assert detailed[5].split()[1:] == ["1", "10", "10", "4", "40", "10"]
+
+def test_format_report_rate():
+    """
+    Test the rates keep one decimal
+    """
+    record = make_record(rate=True)
+    simple = report.format_report(record).split("\n")
+    assert simple[0] == "2019-01-01 00:00:00 lock acquisitions/s: total 10.0, EX 4.0, PR 6.0"
+    assert "EX NUM/s" in simple[3]
+    assert simple[4].split() == ["M", "5", "3.0", "30", "10", "4.0", "40", "10"]
+
+def test_format_report_empty():
+    """
+    Test the record without any lock resource
+    """
+    record = report.new_record("2019-01-01 00:00:00", False, (0, 0), [], [])
+    screen = report.format_report(record, detailed=True).split("\n")
+    assert len(screen) == 4
+    assert screen[1] == "lock resources: total 0"
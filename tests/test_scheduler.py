@@ -0,0 +1,42 @@
+"""
+unit test for scheduler.py
+"""
+import sys
+import time
+sys.path.append("../")
+from o2locktoplib import scheduler
+from o2locktoplib import util
+
+def test_scheduler():
+    """
+    Test the ticks are on the boundaries of the interval
+    """
+    sched = scheduler.Scheduler(0.2)
+    assert sched.interval == 0.2
+    start = util.monotonic()
+    first = sched.wait()
+    assert first - start < 0.1, "the first tick should fire at once"
+    # the next boundary may be close, the barrier of the first tick still has
+    # a full interval
+    assert sched.next_tick() - first >= 0.2, "the first barrier should be a full interval"
+    ticks = [sched.wait() for _ in range(3)]
+    for prev, tick in zip(ticks, ticks[1:]):
+        assert abs(tick - prev - 0.2) < 1e-6, "the ticks should not drift"
+    # the phase is on the multiples of the interval of the wall clock
+    phase = (time.time() - (util.monotonic() - ticks[-1])) % 0.2
+    assert min(phase, 0.2 - phase) < 0.05
+    assert sched.next_tick() == ticks[-1] + 0.2
+    assert sched.missed == 0
+
+def test_scheduler_missed():
+    """
+    Test the passed ticks are skipped
+    """
+    sched = scheduler.Scheduler(0.1)
+    sched.wait()
+    tick = sched.wait()
+    time.sleep(0.35)
+    late = sched.wait()
+    assert sched.missed >= 2
+    assert abs((late - tick) / 0.1 - round((late - tick) / 0.1)) < 1e-6
+    assert util.monotonic() - late < 0.1
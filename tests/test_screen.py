@@ -0,0 +1,54 @@
+"""
+unit test for screen.py
+"""
+import os
+import sys
+sys.path.append("../")
+from o2locktoplib import screen
+
+def test_diff():
+    """
+    Test only the changed cells are written after the first frame
+    """
+    scr = screen.Screen(None)
+    lines = ["title", "M    1  100  2", "M    2  300  4"]
+    assert scr.diff(lines) == screen.CLEAR + "title\nM    1  100  2\nM    2  300  4\n"
+    assert scr.diff(lines) == ""
+    # the near changes are merged, the far ones are written apart
+    assert scr.diff(["title", "N    1  100  3", "M    2  301  5"]) == \
+        screen.move(1, 0) + "N" + screen.move(1, 13) + "3" + \
+        screen.move(2, 10) + "1  5" + screen.move(3, 0)
+    # the longer line writes its tail, the shorter one erases its tail
+    assert scr.diff(["title", "N    1  100  3000000000000", "M    2"]) == \
+        screen.move(1, 14) + "000000000000" + screen.move(2, 6) + \
+        screen.ERASE_LINE + screen.move(3, 0)
+    # the rows that are gone are erased
+    assert scr.diff(["title"]) == screen.move(1, 0) + screen.ERASE_DOWN
+
+def test_diff_size():
+    """
+    Test the lines are clipped to the terminal, and the resized terminal
+    is redrawn
+    """
+    scr = screen.Screen(None)
+    assert scr.diff(["title", "line1", "line2"], (2, 3)) == screen.CLEAR + "tit\nlin"
+    assert scr.diff(["title", "line1", "line3"], (2, 3)) == ""
+    assert scr.diff(["title", "line1"], (3, 4)) == screen.CLEAR + "titl\nline\n"
+    scr.invalidate()
+    assert scr.diff(["title", "line1"], (3, 4)) == screen.CLEAR + "titl\nline\n"
+
+def test_render():
+    """
+    Test the bytes written of the frames are counted
+    """
+    read_end, write_end = os.pipe()
+    scr = screen.Screen(write_end)
+    assert scr.render(["a", "b"]) == len(screen.CLEAR) + 4
+    assert scr.render(["a", "b"]) == 0
+    assert scr.render(["a", "c"]) == len(screen.move(1, 0)) + 1 + len(screen.move(2, 0))
+    assert scr.frames == 3
+    data = os.read(read_end, 1024)
+    assert len(data) == scr.total_bytes
+    assert data.endswith(b"c" + screen.move(2, 0).encode())
+    os.close(read_end)
+    os.close(write_end)
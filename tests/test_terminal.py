@@ -0,0 +1,51 @@
+"""
+unit test for terminal.py
+"""
+import os
+import sys
+import fcntl
+import struct
+import termios
+sys.path.append("../")
+from o2locktoplib import terminal
+
+def set_size(file_dec, rows, cols):
+    fcntl.ioctl(file_dec, termios.TIOCSWINSZ, struct.pack("hhhh", rows, cols, 0, 0))
+
+def test_get_size():
+    """
+    Test the size is read from the terminal, and None from the others
+    """
+    master, slave = os.openpty()
+    set_size(slave, 40, 120)
+    assert terminal.get_size(slave) == (40, 120)
+    set_size(slave, 0, 0)
+    assert terminal.get_size(slave) is None
+    read_end, write_end = os.pipe()
+    assert terminal.get_size(write_end) is None
+    for file_dec in (master, slave, read_end, write_end):
+        os.close(file_dec)
+
+def test_top_n():
+    assert terminal.top_n((40, 120)) == 34
+    # the rows wrap in the narrow terminal
+    assert terminal.top_n((40, 80)) == 16
+
+def test_geometry():
+    """
+    Test the geometry is only changed when the terminal is resized
+    """
+    master, slave = os.openpty()
+    geometry = terminal.Geometry()
+    assert geometry.size is None
+    assert geometry.top_n == terminal.top_n(terminal.DEFAULT_SIZE)
+    set_size(slave, 40, 120)
+    assert geometry.update(slave)
+    assert not geometry.update(slave)
+    assert geometry.size == (40, 120)
+    assert geometry.top_n == 34
+    set_size(slave, 50, 120)
+    assert geometry.update(slave)
+    assert geometry.top_n == 44
+    os.close(master)
+    os.close(slave)
@@ -126,3 +126,25 @@ def test_trans_uuid():
     util._trans_uuid("DAF3F5B6F1C04B15B9ED8FAAF109E895"),\
     "get_one_cat test faild"
     assert not util._trans_uuid(""), "get_one_cat test faild in None branch"
+
+def test_get_one_cat_compressed(tmpdir, monkeypatch):
+    import zlib
+    locking_state = tmpdir.join("locking_state")
+    locking_state.write("line1\nline2\n" * 100)
+    monkeypatch.setattr(util, "get_locking_state_path", lambda lockspace: str(locking_state))
+    code, data = util.get_one_cat_compressed(config.lockspace)
+    assert code == 0, "get_one_cat_compressed test faild"
+    assert len(data) < len("line1\nline2\n" * 100), "get_one_cat_compressed test faild"
+    assert zlib.decompress(data, 16 + zlib.MAX_WBITS) == b"line1\nline2\n" * 100,\
+    "get_one_cat_compressed test faild"
+
+def test_acquire():
+    import threading
+    import time
+    semaphore = threading.Semaphore(0)
+    start = time.time()
+    assert not util.acquire(semaphore, 0.1), "acquire test faild"
+    assert time.time() - start >= 0.05, "acquire test faild"
+    semaphore.release()
+    assert util.acquire(semaphore, 0.1), "acquire test faild"
+    assert not util.acquire(semaphore, -1), "acquire test faild"